@@ -0,0 +1,91 @@
+"""
+async_engine.py — Shared asyncio event loop and pooled HTTP client for the async pipeline.
+
+Flask handles requests on ordinary threads, so the async pipeline runs on one
+long-lived event loop in a background thread. Request threads hand it coroutines with
+AsyncEngine.run(); every coroutine shares one httpx.AsyncClient (HTTP/2 when the `h2`
+package is installed, keep-alive pool otherwise), so hundreds of in-flight page
+generations cost coroutines and a handful of connections rather than OS threads.
+
+Enabled with GENERATION_ENGINE=async (see main.py); requires `httpx`.
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from typing import Optional
+
+try:
+    import httpx
+except ImportError:  # only needed when GENERATION_ENGINE=async
+    httpx = None
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", 60))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class AsyncEngine:
+    def __init__(self):
+        if httpx is None:
+            raise RuntimeError("GENERATION_ENGINE=async requires the 'httpx' package")
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="async-engine", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        self.client = self.run(self._make_client())
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    async def _make_client(self):
+        http2 = _http2_available()
+        logging.info("Async engine: HTTP/%s client, %d max connections", "2" if http2 else "1.1",
+                     HTTP_MAX_CONNECTIONS)
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+
+    def run(self, coro, timeout: float = None):
+        """Run `coro` on the engine loop from any other thread and return its result."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def close(self) -> None:
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+_engine: Optional[AsyncEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> AsyncEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AsyncEngine()
+        return _engine
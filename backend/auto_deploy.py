@@ -2,127 +2,226 @@ from flask import Flask, request, jsonify
 import json
 import os
 import re
-import base64
 import requests
 from pathlib import Path
+from collections import OrderedDict, namedtuple
 from bs4 import BeautifulSoup
 import time
+import threading
+from workspaces import latest_workspace, workspace_path
+from site_artifact import SiteArtifact
+from site_optimizer import SITE_OPTIMIZE, is_hashed_asset, optimize_site
+from deploy_coordinator import DEPLOY_DEBOUNCE, DeployCoordinator
+from github_client import GitHubClient
+from deploy_tracker import DeployFailed, deploy_url, get_tracker
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from telemetry import span
 
 
 build_hook_url = os.environ.get("NETLIFY_HOOK_URL")
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
 GITHUB_REPO = os.environ.get("GITHUB_REPO")
+SITE_ROOT_URL = os.environ.get("NETLIFY_SITE_URL", "https://auto-deploy-site.netlify.app")
+DEPLOY_WAIT = float(os.environ.get("DEPLOY_WAIT", 120))
 
 
 
-HEADERS = {
-    "Authorization": f"token {GITHUB_TOKEN}",
-    "Accept": "application/vnd.github.v3+json"
-}
+def start_deploy(site_dir: str = None, artifact: SiteArtifact = None):
+    """
+    Push a generated site (the in-memory `artifact` if given, else `site_dir`, default: the
+    most recently published workspace), trigger a build if anything changed, and return
+    (commit_sha, future) without waiting; the future resolves with the Netlify deploy of
+    that commit. Returns None on failure. What is pushed is the optimized site
+    (site_optimizer) unless SITE_OPTIMIZE=0.
+    Requests within DEPLOY_DEBOUNCE seconds of each other share one commit and one build
+    (deploy_coordinator); DEPLOY_DEBOUNCE=0 pushes every request on its own.
+    """
+    if artifact is None:
+        site_dir = os.path.abspath(site_dir or latest_workspace() or workspace_path("site"))
+        artifact = SiteArtifact.from_directory(site_dir)
+    if SITE_OPTIMIZE:
+        artifact = optimize_site(artifact)
+
+    if DEPLOY_DEBOUNCE <= 0:
+        return push_and_build(artifact)
+    try:
+        return _coordinator.submit(artifact).result()
+    except Exception as e:
+        print(f"❌ Deploy failed: {e}")
+        return None
+
+
+def push_and_build(artifact: SiteArtifact, requests_merged: int = 1):
+    """Push one artifact, trigger the build if anything changed; start_deploy's result."""
+    message = "Auto-deploy: update site"
+    if requests_merged > 1:
+        message += f" ({requests_merged} deploy requests)"
+    with span("deploy.push", site=artifact.workspace) as push_span:
+        pushed = push_artifact(artifact, GITHUB_REPO, branch="main", commit_message=message)
+        if pushed:
+            push_span.set(commit_sha=pushed.commit_sha, uploaded=pushed.uploaded)
+    if not pushed:
+        return None
+    # an unchanged site needs no build; its commit's existing deploy is reported
+    if pushed.changed:
+        with span("deploy.build_hook"):
+            triggered = trigger_netlify_build_hook()
+        if not triggered:
+            return None
+
+    tracker = get_tracker()
+    if tracker is None:
+        print("[!] Missing NETLIFY_AUTH_TOKEN or NETLIFY_SITE_ID.")
+        future = Future()
+        future.set_result({"commit_ref": pushed.commit_sha, "state": "unknown", "deploy_url": SITE_ROOT_URL})
+        return pushed.commit_sha, future
+    return pushed.commit_sha, tracker.track(pushed.commit_sha)
+
+
+_coordinator = DeployCoordinator(push_and_build)
+
 
+def deploy(site_dir: str = None, timeout: float = DEPLOY_WAIT, artifact: SiteArtifact = None):
+    """Push and build a site, then wait for the deploy of the pushed commit; returns its URL."""
+    with span("deploy"):
+        started = start_deploy(site_dir, artifact)
+        if not started:
+            return None
+        commit_sha, future = started
+        return wait_for_deploy(commit_sha, future, timeout)
 
-def deploy():  
-    site_dir = os.path.abspath(os.path.join("generated_site", "site"))
-    
-    ok = push_directory_single_commit(site_dir, GITHUB_REPO, branch="main",
-                                      commit_message="Auto-deploy: update site")
-    if ok:
-        # 3. trigger Netlify build
-        link = trigger_netlify_build_hook()
-        print(link)
-        return link
 
-    return None   
+def wait_for_deploy(commit_sha: str, future: Future, timeout: float = DEPLOY_WAIT) -> str:
+    """Block on a start_deploy() future; falls back to the site root on timeout or failure."""
+    try:
+        with span("deploy.wait", commit_sha=commit_sha):
+            deployed = future.result(timeout)
+    except FutureTimeout:
+        print(f"⚠️ Timeout waiting for deploy of {commit_sha[:7]}: returning site root")
+        return SITE_ROOT_URL
+    except (DeployFailed, TimeoutError) as e:
+        print(f"❌ Deploy of {commit_sha[:7]} failed: {e}")
+        return SITE_ROOT_URL
+    link = deploy_url(deployed) or SITE_ROOT_URL
+    print(f"✅ Deploy of {commit_sha[:7]} is live: {link}")
+    return link
 
 
+PushResult = namedtuple("PushResult", ["commit_sha", "changed", "uploaded", "timings"])
+
+
+def github_client(repo: str = None) -> GitHubClient:
+    return GitHubClient(GITHUB_TOKEN, repo or GITHUB_REPO)
 
 
 def push_directory_single_commit(local_dir: str,
                                  repo: str,
                                  branch: str = "main",
                                  commit_message: str = None):
+    """Push local_dir contents to GitHub repo root as ONE commit (see push_artifact)."""
+    return push_artifact(SiteArtifact.from_directory(local_dir), repo, branch, commit_message)
+
+
+def push_artifact(artifact: SiteArtifact,
+                  repo: str,
+                  branch: str = "main",
+                  commit_message: str = None):
     """
-    Push entire local_dir contents to GitHub repo root as ONE commit.
-    Overwrites previous contents (clean snapshot style).
+    Push a SiteArtifact to GitHub repo root as ONE commit, on top of the current tree.
+    Only files whose git blob SHA (precomputed by the artifact) differs from the remote
+    tree are uploaded (concurrently); if nothing differs no commit is made. Content-hashed
+    assets of earlier deploys that the artifact no longer has are deleted once no page
+    left in the tree refers to them (see stale_assets).
+    Returns PushResult(commit_sha, changed, uploaded, timings) with seconds per stage.
     """
     commit_message = commit_message or f"Auto site update {int(time.time())}"
+    gh = github_client(repo)
 
     # 1. Get latest commit sha and base tree
-    url = f"https://api.github.com/repos/{repo}/git/refs/heads/{branch}"
-    r = requests.get(url, headers=HEADERS)
-    if r.status_code != 200:
-        raise Exception(f"Failed to get branch ref: {r.text}")
-    ref_info = r.json()
-    latest_commit_sha = ref_info["object"]["sha"]
-
-    url = f"https://api.github.com/repos/{repo}/git/commits/{latest_commit_sha}"
-    r = requests.get(url, headers=HEADERS)
-    if r.status_code != 200:
-        raise Exception(f"Failed to get latest commit: {r.text}")
-    commit_info = r.json()
-    base_tree_sha = commit_info["tree"]["sha"]
-
-    # 2. Collect local files for new tree
-    tree_items = []
-    for root, _, files in os.walk(local_dir):
-        for fname in files:
-            abs_path = os.path.join(root, fname)
-            rel_path = os.path.relpath(abs_path, local_dir).replace(os.path.sep, "/")
-
-            with open(abs_path, "rb") as f:
-                content = f.read()
-
-            blob_url = f"https://api.github.com/repos/{repo}/git/blobs"
-            blob_resp = requests.post(blob_url, headers=HEADERS,
-                                      json={"content": base64.b64encode(content).decode(),
-                                            "encoding": "base64"})
-            if blob_resp.status_code != 201:
-                raise Exception(f"Failed to create blob for {rel_path}: {blob_resp.text}")
-            blob_sha = blob_resp.json()["sha"]
-
-            tree_items.append({
-                "path": rel_path,
-                "mode": "100644",
-                "type": "blob",
-                "sha": blob_sha
-            })
+    with gh.stage("ref"):
+        latest_commit_sha = gh.get_ref(branch)
+        base_tree_sha = gh.get_commit_tree(latest_commit_sha)
+        remote_shas = gh.get_tree_shas(base_tree_sha)
+
+    # 2. Collect files that differ from the remote tree
+    changed = [(f.path, f.data) for f in artifact if remote_shas.get(f.path) != f.blob_sha]
+    with gh.stage("stale"):
+        stale = stale_assets(gh, artifact, remote_shas)
+
+    if not changed and not stale:
+        print(f"Site unchanged; nothing to push (head {latest_commit_sha})")
+        return PushResult(latest_commit_sha, False, 0, dict(gh.timings))
+
+    with gh.stage("blobs"):
+        blob_shas = gh.create_blobs(changed)
+    tree_items = [
+        {"path": path, "mode": "100644", "type": "blob", "sha": blob_shas[path]}
+        for path, _ in changed
+    ] + [{"path": path, "mode": "100644", "type": "blob", "sha": None} for path in stale]
 
     # 3. Create new tree
-    url = f"https://api.github.com/repos/{repo}/git/trees"
-    tree_resp = requests.post(url, headers=HEADERS,
-                              json={"base_tree": base_tree_sha, "tree": tree_items})
-    if tree_resp.status_code != 201:
-        raise Exception(f"Failed to create tree: {tree_resp.text}")
-    new_tree_sha = tree_resp.json()["sha"]
+    with gh.stage("tree"):
+        new_tree_sha = gh.create_tree(base_tree_sha, tree_items)
 
     # 4. Create commit
-    url = f"https://api.github.com/repos/{repo}/git/commits"
-    commit_resp = requests.post(url, headers=HEADERS,
-                                json={"message": commit_message,
-                                      "tree": new_tree_sha,
-                                      "parents": [latest_commit_sha]})
-    if commit_resp.status_code != 201:
-        raise Exception(f"Failed to create commit: {commit_resp.text}")
-    new_commit_sha = commit_resp.json()["sha"]
+    with gh.stage("commit"):
+        new_commit_sha = gh.create_commit(commit_message, new_tree_sha, [latest_commit_sha])
 
     # 5. Update ref
-    url = f"https://api.github.com/repos/{repo}/git/refs/heads/{branch}"
-    ref_resp = requests.patch(url, headers=HEADERS,
-                              json={"sha": new_commit_sha, "force": True})
-    if ref_resp.status_code not in (200, 201):
-        raise Exception(f"Failed to update ref: {ref_resp.text}")
+    with gh.stage("ref_update"):
+        gh.update_ref(branch, new_commit_sha)
+
+    timings = {k: round(v, 3) for k, v in gh.timings.items()}
+    print(f"Pushed site as one commit: {new_commit_sha} ({len(tree_items)} changed files) timings={timings}")
+    return PushResult(new_commit_sha, True, len(tree_items), timings)
 
-    print(f"Pushed site as one commit: {new_commit_sha}")
-    return True
+
+PAGE_REFS_KEEP = int(os.environ.get("PAGE_REFS_KEEP", 2048))
+# page blob sha -> hashed asset paths it refers to (blobs never change); LRU, PAGE_REFS_KEEP entries
+_page_refs: "OrderedDict[str, frozenset]" = OrderedDict()
+_page_refs_lock = threading.Lock()
+_HASHED_REF_RE = re.compile(r"(?:css/style|js/script)\.[0-9a-f]{10}\.(?:css|js)")
+
+
+def stale_assets(gh: GitHubClient, artifact: SiteArtifact, remote_shas: dict) -> list:
+    """
+    Hashed assets in the remote tree that neither the artifact nor any remote page it
+    does not replace refers to. The push overlays the tree, so pages of earlier deploys
+    stay and must keep their stylesheet and script. If those pages cannot be read,
+    nothing is deleted.
+    """
+    candidates = [path for path in remote_shas if is_hashed_asset(path) and path not in artifact]
+    if not candidates:
+        return []
+    kept = [sha for path, sha in remote_shas.items() if path.endswith(".html") and path not in artifact]
+    refs = {}
+    with _page_refs_lock:
+        for sha in kept:
+            if sha in _page_refs:
+                _page_refs.move_to_end(sha)
+                refs[sha] = _page_refs[sha]
+    try:
+        fetched = gh.get_blobs([sha for sha in kept if sha not in refs])
+    except Exception as e:
+        print(f"[!] Could not read remaining pages, keeping old assets: {e}")
+        return []
+    with _page_refs_lock:
+        for sha, data in fetched.items():
+            refs[sha] = _page_refs[sha] = frozenset(_HASHED_REF_RE.findall(data.decode("utf-8", "replace")))
+        while len(_page_refs) > PAGE_REFS_KEEP:
+            _page_refs.popitem(last=False)
+    referenced = set().union(*refs.values())
+    return [path for path in candidates if path not in referenced]
 
 
 def trigger_netlify_build_hook(max_retries=3, backoff=5, timeout=10):
     """
-    Trigger Netlify build hook and wait until the latest deployment is ready.
+    Trigger Netlify build hook; returns True once the build was accepted.
+    Completion is tracked per commit by deploy_tracker (see start_deploy).
     """
     if not build_hook_url:
         print("[!] Netlify build hook URL is missing.")
-        return None
+        return False
 
     for attempt in range(1, max_retries + 1):
         try:
@@ -131,9 +230,7 @@ def trigger_netlify_build_hook(max_retries=3, backoff=5, timeout=10):
 
             if response.status_code in (200, 201):
                 print("✅ Netlify build triggered successfully")
-
-                # Wait for Netlify to process new deployment
-                return wait_for_latest_deploy()
+                return True
             else:
                 print(f"[Netlify] Hook error: {response.text}")
 
@@ -145,47 +242,5 @@ def trigger_netlify_build_hook(max_retries=3, backoff=5, timeout=10):
             time.sleep(backoff)
 
     print("❌ Netlify build hook failed after retries.")
-    return None
-
-
-def wait_for_latest_deploy(poll_interval=5, max_wait=120):
-    """
-    Poll Netlify API until the latest deploy is ready.
-    Requires NETLIFY_AUTH_TOKEN and NETLIFY_SITE_ID in env.
-    """
-    NETLIFY_AUTH_TOKEN = os.environ.get("NETLIFY_AUTH_TOKEN")
-    NETLIFY_SITE_ID = os.environ.get("NETLIFY_SITE_ID")
-
-    if not NETLIFY_AUTH_TOKEN or not NETLIFY_SITE_ID:
-        print("[!] Missing NETLIFY_AUTH_TOKEN or NETLIFY_SITE_ID.")
-        return "https://auto-deploy-site.netlify.app"
-
-    headers = {"Authorization": f"Bearer {NETLIFY_AUTH_TOKEN}"}
-
-    for waited in range(0, max_wait, poll_interval):
-        try:
-            url = f"https://api.netlify.com/api/v1/sites/{NETLIFY_SITE_ID}/deploys"
-            resp = requests.get(url, headers=headers, timeout=10)
-
-            if resp.status_code == 200:
-                deploys = resp.json()
-                if deploys:
-                    latest = deploys[0]
-                    state = latest.get("state")
-                    deploy_url = latest.get("deploy_url")
-
-                    print(f"[Netlify] Latest deploy state: {state}")
-
-                    if state == "ready" and deploy_url:
-                        print(f"✅ New deploy is live: {deploy_url}")
-                        return deploy_url
-            else:
-                print(f"[Netlify] Failed to fetch deploys: {resp.text}")
-
-        except Exception as e:
-            print(f"[Netlify] Error polling deploys: {e}")
-
-        time.sleep(poll_interval)
+    return False
 
-    print("⚠️ Timeout: returning site root")
-    return "https://auto-deploy-site.netlify.app"
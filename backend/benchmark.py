@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+benchmark.py — Offline load test of /submit and /deploy against local stand-in APIs.
+
+    python benchmark.py --requests 20 --concurrency 4 --pages 6 \
+        --llm-latency lognormal:1.5,0.5 --llm-429 0.05 --page-bytes 12000 \
+        --deploy --output bench/results.json --baseline bench/baseline.json
+
+Starts mock_servers.py stand-ins for OpenRouter, DeepSeek, GitHub's git data API and
+Netlify, points the backend at them through its env vars, then drives the Flask app
+in-process (one test client per worker) at the requested concurrency. Caches are off and
+every request uses a distinct prompt, so each /submit generates every page.
+
+Reports p50/p95/p99 latency and throughput per endpoint, peak thread count, peak RSS,
+LLM calls and retries, and writes them as JSON. With --baseline the run is compared to
+an earlier result file and the exit status is 1 if p95 or throughput regressed by more
+than --tolerance.
+
+Deploys share one fake repo/branch. The backend's deploy coordinator batches concurrent
+/deploy calls (--deploy-debounce): one push and one build per site in a batch, run one
+after another on its thread; with --deploy-debounce 0
+every deploy is pushed on its own, so the benchmark serializes them (concurrent pushes
+would race on the branch ref) and deploy latency includes that wait.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from mock_servers import FakeChatCompletionsServer, FakeGitHubServer, FakeNetlifyServer
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=10, help="number of /submit calls")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads")
+    parser.add_argument("--pages", type=int, default=5, help="pages per generated site")
+    parser.add_argument("--engine", choices=("threads", "async"), default="threads")
+    parser.add_argument("--deploy", action="store_true", help="also /deploy every generated site")
+    parser.add_argument("--deploy-debounce", type=float, default=1.0,
+                        help="DEPLOY_DEBOUNCE seconds; 0 pushes and builds every deploy separately")
+    parser.add_argument("--llm-latency", default="lognormal:0.5,0.4",
+                        help="DeepSeek/OpenRouter latency spec (see mock_servers.latency_sampler)")
+    parser.add_argument("--llm-429", type=float, default=0.0, help="probability of an injected 429")
+    parser.add_argument("--page-bytes", type=int, default=8000, help="size of each generated page")
+    parser.add_argument("--generation-mode", choices=("full", "skeleton"), default="full",
+                        help="website_agent GENERATION_MODE")
+    parser.add_argument("--fragment-bytes", type=int, default=5000,
+                        help="size of each <main> fragment in skeleton mode")
+    parser.add_argument("--layout-bytes", type=int, default=4000, help="size of the skeleton layout response")
+    parser.add_argument("--github-latency", default="uniform:0.02,0.08")
+    parser.add_argument("--github-429", type=float, default=0.0)
+    parser.add_argument("--netlify-latency", default="fixed:0.02")
+    parser.add_argument("--build-time", type=float, default=0.5, help="fake Netlify build duration")
+    parser.add_argument("--llm-concurrency", type=int, default=64,
+                        help="llm_scheduler max concurrency (rate limits are lifted for the run)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    return parser.parse_args(argv)
+
+
+# -----------------------------
+# Stand-in APIs
+# -----------------------------
+def _requirements_content(pages: int):
+    page_names = ["Home"] + [f"Page {i}" for i in range(1, pages)]
+
+    def content(body: dict) -> str:
+        prompt = (body.get("messages") or [{}])[-1].get("content", "")
+        m = re.search(r"bench site (\d+)", prompt)
+        return json.dumps({
+            "project": f"bench-{m.group(1) if m else 'x'}",
+            "pages": page_names,
+            "features": ["contact form", "newsletter"],
+            "style": "modern,tailwind",
+            "notes": "",
+        })
+    return content
+
+
+def _pad(content: str, size: int, filler: str) -> str:
+    missing = size - len(content)
+    return content + filler * (missing // len(filler) + 1) if missing > 0 else content
+
+
+def _deepseek_content(args):
+    """Full pages, or in skeleton mode a layout (three fenced blocks) and <main> fragments."""
+    def content(body: dict) -> str:
+        system = (body.get("messages") or [{}])[0].get("content", "")
+        prompt = (body.get("messages") or [{}])[-1].get("content", "")
+        project = re.search(r"Project: (.*)", prompt)
+        page = re.search(r"Page: (.*)", prompt)
+        title = f"{project.group(1) if project else ''} — {page.group(1) if page else ''}"
+        if "shared layout of" in system:
+            html = ("<!DOCTYPE html><html><head><title>{{PAGE_TITLE}}</title></head><body>"
+                    "<!-- NAVBAR --><header>bench</header><main><!-- CONTENT --></main><footer>bench</footer>"
+                    "</body></html>")
+            css = _pad("", args.layout_bytes // 2, ".bench { color: #123456; }\n")
+            return f"```html\n{html}\n```\n```css\n{css}```\n```js\nconsole.log('bench');\n```"
+        if "inside <main>" in system:
+            return _pad(f"<h1>{title}</h1>\n", args.fragment_bytes, "<p>Lorem ipsum dolor sit amet.</p>\n")
+        return _pad(f"<!DOCTYPE html><html><head><title>bench</title></head><body><main><h1>{title}</h1>\n",
+                    args.page_bytes, "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n")
+    return content
+
+
+def start_servers(args) -> Dict[str, object]:
+    servers = {
+        "openrouter": FakeChatCompletionsServer(content=_requirements_content(args.pages),
+                                                latency=args.llm_latency, rate_limit=args.llm_429),
+        "deepseek": FakeChatCompletionsServer(content=_deepseek_content(args),
+                                              latency=args.llm_latency, rate_limit=args.llm_429),
+        "github": FakeGitHubServer(latency=args.github_latency, rate_limit=args.github_429),
+    }
+    github = servers["github"]
+    servers["netlify"] = FakeNetlifyServer(head_commit=lambda: github.heads["main"], build_time=args.build_time,
+                                           latency=args.netlify_latency)
+    for server in servers.values():
+        server.start()
+    return servers
+
+
+def configure_env(args, servers, workdir: str) -> None:
+    """Point the backend at the stand-ins; must run before main.py is imported."""
+    os.environ.update({
+        "OPENROUTER_API_KEY": "bench", "DEEPSEEK_API_KEY": "bench",
+        "OPENROUTER_API_URL": servers["openrouter"].url + "/chat/completions",
+        "DEEPSEEK_BASE_URL": servers["deepseek"].url,
+        "GITHUB_TOKEN": "bench", "GITHUB_REPO": "bench/site",
+        "GITHUB_API_URL": servers["github"].url,
+        "NETLIFY_AUTH_TOKEN": "bench", "NETLIFY_SITE_ID": "bench",
+        "NETLIFY_API_URL": servers["netlify"].api_url,
+        "NETLIFY_HOOK_URL": servers["netlify"].url + "/build_hooks/bench",
+        "GENERATION_ENGINE": args.engine,
+        "DEPLOY_DEBOUNCE": str(args.deploy_debounce),
+        "GENERATION_MODE": args.generation_mode,
+        "GENERATED_SITE_ROOT": os.path.join(workdir, "sites"),
+        "WORKSPACE_KEEP": str(args.requests + 10),
+        "LLM_CACHE_DIR": os.path.join(workdir, "cache"),
+        "REQUIREMENT_CACHE": "0", "PAGE_CACHE": "0",
+    })
+    for key, value in {
+        "LLM_RPM": "1000000", "LLM_TPM": "1000000000",
+        "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+        "LLM_INITIAL_CONCURRENCY": str(args.llm_concurrency),
+        "NETLIFY_POLL_MIN": "0.1", "NETLIFY_POLL_MAX": "1",
+        "DEPLOY_WAIT": "60",
+    }.items():
+        os.environ.setdefault(key, value)
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+class _ThreadSampler(threading.Thread):
+    def __init__(self, interval: float = 0.05):
+        super().__init__(name="bench-sampler", daemon=True)
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(latencies: List[float], errors: int, wall: float) -> dict:
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50": _round(percentile(latencies, 50)),
+        "p95": _round(percentile(latencies, 95)),
+        "p99": _round(percentile(latencies, 99)),
+        "max": _round(max(latencies) if latencies else None),
+        "throughput_per_s": _round(len(latencies) / wall if wall else None),
+    }
+
+
+def _round(value, digits: int = 4):
+    return round(value, digits) if value is not None else None
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+def run(args) -> dict:
+    servers = start_servers(args)
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    configure_env(args, servers, workdir)
+
+    import main as backend  # reads the env configured above
+    import telemetry
+
+    timings: Dict[str, List[float]] = {"submit": [], "deploy": []}
+    errors = {"submit": 0, "deploy": 0}
+    lock = threading.Lock()
+    # coordinated deploys are pushed one batch at a time by the backend itself
+    deploy_lock = threading.Lock() if args.deploy_debounce <= 0 else contextlib.nullcontext()
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = backend.app.test_client()
+        return local.client
+
+    def record(kind: str, started: float, ok: bool) -> None:
+        with lock:
+            if ok:
+                timings[kind].append(time.perf_counter() - started)
+            else:
+                errors[kind] += 1
+
+    def one(i: int) -> None:
+        started = time.perf_counter()
+        resp = client().post("/submit", json={"requirement": f"bench site {i}: a small business website"})
+        body = resp.get_json(silent=True) or {}
+        ok = resp.status_code == 200 and body.get("site") and len(body.get("files") or {}) == args.pages
+        record("submit", started, ok)
+        if not (ok and args.deploy):
+            return
+        started = time.perf_counter()
+        with deploy_lock:
+            resp = client().post("/deploy", json={"site": body["site"]})
+        url = (resp.get_json(silent=True) or {}).get("url") or ""
+        record("deploy", started, resp.status_code == 200 and "--fake.netlify.app" in url)
+
+    sampler = _ThreadSampler()
+    sampler.start()
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="bench-client") as exe:
+        list(exe.map(one, range(args.requests)))
+    wall = time.perf_counter() - wall_started
+    peak_threads = sampler.stop()
+
+    for server in servers.values():
+        server.stop()
+
+    results = {
+        "submit": summarize(timings["submit"], errors["submit"], wall),
+        "process": {
+            "wall_s": _round(wall, 3),
+            "peak_threads": peak_threads,
+            "peak_rss_mb": peak_rss_mb(),
+            "llm_calls": sum(1 for m, _, _ in servers["deepseek"].requests + servers["openrouter"].requests
+                             if m == "POST"),
+            "llm_429_injected": servers["deepseek"].throttled + servers["openrouter"].throttled,
+            "llm_completion_tokens": telemetry.LLM_TOKENS.total(provider="deepseek", kind="completion"),
+            "retries": telemetry.RETRIES.total(),
+            "github_calls": len(servers["github"].requests),
+        },
+    }
+    if args.deploy:
+        results["deploy"] = summarize(timings["deploy"], errors["deploy"], wall)
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": _git_rev(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Human-readable regressions of p95 latency or throughput beyond `tolerance`."""
+    regressions = []
+    for endpoint in ("submit", "deploy"):
+        now, before = current["results"].get(endpoint), baseline.get("results", {}).get(endpoint)
+        if not now or not before:
+            continue
+        if before.get("p95") and now.get("p95") and now["p95"] > before["p95"] * (1 + tolerance):
+            regressions.append(f"{endpoint} p95 {before['p95']}s -> {now['p95']}s")
+        if (before.get("throughput_per_s") and now.get("throughput_per_s") is not None
+                and now["throughput_per_s"] < before["throughput_per_s"] * (1 - tolerance)):
+            regressions.append(f"{endpoint} throughput {before['throughput_per_s']}/s -> {now['throughput_per_s']}/s")
+    return regressions
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = run(args)
+    print(json.dumps(report["results"], indent=2))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION: {line}")
+        if regressions:
+            return 1
+        print(f"No regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
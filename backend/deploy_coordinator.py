@@ -0,0 +1,110 @@
+"""
+deploy_coordinator.py — Debounce deploy requests and push each site once per burst.
+
+    coordinator = DeployCoordinator(push_and_build)   # push_and_build(artifact, requests) -> result
+    result = coordinator.submit(artifact).result()      # callers deploying the same site share a result
+
+Every /deploy used to be its own commit and its own Netlify build, so a user clicking
+deploy repeatedly queued builds whose results nobody needed. Requests are now
+collected until none has arrived for DEPLOY_DEBOUNCE seconds (but no longer than
+DEPLOY_MAX_DELAY after the first). Requests for the same workspace are coalesced:
+only the latest artifact is pushed, as one commit with one build, and its result
+goes to each of them. Different sites are never merged; each gets its own commit
+and build, so every caller's deploy URL shows its own site.
+
+Batches run one at a time on the coordinator's thread. Requests arriving while a
+batch is being pushed go into the next one, so there is never more than one push
+in flight.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+from site_artifact import SiteArtifact
+from telemetry import counter, span
+
+DEPLOY_DEBOUNCE = float(os.environ.get("DEPLOY_DEBOUNCE", 1.0))
+DEPLOY_MAX_DELAY = float(os.environ.get("DEPLOY_MAX_DELAY", 5.0))
+
+DEPLOY_REQUESTS = counter("deploy_requests_total", "Deploy requests; 'coalesced' ones rode on another request's push.",
+                          ("role",))
+
+
+def by_workspace(batch: List[Tuple[SiteArtifact, Future]]) -> List[Tuple[SiteArtifact, List[Future]]]:
+    """(latest artifact, futures) per workspace, ordered by each workspace's latest request."""
+    groups: Dict[str, Tuple[SiteArtifact, List[Future]]] = {}
+    for artifact, future in batch:
+        futures = groups.pop(artifact.workspace, (None, []))[1]
+        groups[artifact.workspace] = (artifact, futures + [future])
+    return list(groups.values())
+
+
+class DeployCoordinator:
+    """Batches submit()ted artifacts and runs `push` once per workspace in a batch, on a background thread."""
+
+    def __init__(self, push: Callable[[SiteArtifact, int], Any], window: float = DEPLOY_DEBOUNCE,
+                 max_delay: float = DEPLOY_MAX_DELAY):
+        self.push = push
+        self.window = window
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[SiteArtifact, Future]] = []
+        self._first = self._last = 0.0
+        self._thread = None
+        self._requests = 0
+        self._batches = 0
+
+    def submit(self, artifact: SiteArtifact) -> Future:
+        """Queue a deploy; the future resolves with push()'s result for the batch it joins."""
+        future = Future()
+        with self._cond:
+            now = time.monotonic()
+            if not self._pending:
+                self._first = now
+            self._last = now
+            self._pending.append((artifact, future))
+            self._requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="deploy-coordinator", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                while True:
+                    due = min(self._last + self.window, self._first + self.max_delay)
+                    now = time.monotonic()
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                batch, self._pending = self._pending, []
+                self._batches += 1
+            self._deploy(batch)
+
+    def _deploy(self, batch: List[Tuple[SiteArtifact, Future]]) -> None:
+        for artifact, futures in by_workspace(batch):
+            DEPLOY_REQUESTS.inc(role="pushed")
+            if len(futures) > 1:
+                DEPLOY_REQUESTS.inc(len(futures) - 1, role="coalesced")
+            try:
+                with span("deploy.batch", site=artifact.workspace, requests=len(futures)):
+                    result = self.push(artifact, len(futures))
+            except Exception as e:
+                logging.exception("Deploy of %s (%d request(s)) failed: %s", artifact.workspace, len(futures), e)
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future in futures:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"pending": len(self._pending), "requests": self._requests, "batches": self._batches}
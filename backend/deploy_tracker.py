@@ -0,0 +1,268 @@
+"""
+deploy_tracker.py — Commit-correlated Netlify deploy tracking without a thread per deploy.
+
+track(commit_sha) returns a concurrent.futures.Future that resolves with the Netlify
+deploy whose `commit_ref` is that commit once it is ready (or fails if the deploy
+errors or times out). Futures are resolved by, in order of preference:
+
+- notify(payload): the body of a Netlify deploy notification webhook
+  (POST /netlify/webhook in main.py, JWS-signed with NETLIFY_WEBHOOK_SECRET; unsigned
+  notifications are refused unless NETLIFY_WEBHOOK_UNSIGNED=1, since anyone could
+  otherwise report a deploy as ready);
+- a single shared background poller that lists recent deploys and backs off
+  from NETLIFY_POLL_MIN to NETLIFY_POLL_MAX seconds while nothing changes.
+
+status(commit_sha) exposes the latest known state for polling clients.
+"""
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import Dict, Optional
+
+import requests
+from telemetry import counter, histogram, span
+
+NETLIFY_API_URL = os.environ.get("NETLIFY_API_URL", "https://api.netlify.com/api/v1")
+NETLIFY_POLL_MIN = float(os.environ.get("NETLIFY_POLL_MIN", 2))
+NETLIFY_POLL_MAX = float(os.environ.get("NETLIFY_POLL_MAX", 15))
+NETLIFY_DEPLOY_TIMEOUT = float(os.environ.get("NETLIFY_DEPLOY_TIMEOUT", 600))
+NETLIFY_WEBHOOK_SECRET = os.environ.get("NETLIFY_WEBHOOK_SECRET")
+# explicit opt-out for local setups without a secret; the poller still works either way
+NETLIFY_WEBHOOK_UNSIGNED = os.environ.get("NETLIFY_WEBHOOK_UNSIGNED", "0") != "0"
+
+if not NETLIFY_WEBHOOK_SECRET:
+    logging.warning("NETLIFY_WEBHOOK_SECRET is not set: %s",
+                    "accepting unsigned deploy webhooks (NETLIFY_WEBHOOK_UNSIGNED=1)" if NETLIFY_WEBHOOK_UNSIGNED
+                    else "deploy webhooks are refused, deploys are confirmed by polling")
+
+FAILED_STATES = ("error", "rejected")
+
+DEPLOY_SECONDS = histogram("netlify_deploy_duration_seconds", "Time from track() to the deploy resolving.",
+                           ("outcome",), buckets=(5, 10, 20, 30, 60, 90, 120, 180, 300, 600))
+NETLIFY_EVENTS = counter("netlify_events_total", "Deploy observations by source (poll/webhook).",
+                         ("source", "matched"))
+
+
+class DeployFailed(Exception):
+    pass
+
+
+class _Tracked:
+    __slots__ = ("future", "deadline", "state", "deploy")
+
+    def __init__(self, deadline: float):
+        self.future: Future = Future()
+        self.deadline = deadline
+        self.state = "pending"
+        self.deploy: Optional[dict] = None
+
+
+class DeployTracker:
+    def __init__(self, site_id: str, token: str, api_url: str = None,
+                 poll_min: float = NETLIFY_POLL_MIN, poll_max: float = NETLIFY_POLL_MAX,
+                 timeout: float = NETLIFY_DEPLOY_TIMEOUT):
+        self.site_id = site_id
+        self.api_url = (api_url or NETLIFY_API_URL).rstrip("/")
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+        self._tracked: Dict[str, _Tracked] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._poller: Optional[threading.Thread] = None
+        self.polls = 0
+        self.webhooks = 0
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def track(self, commit_sha: str) -> Future:
+        with self._lock:
+            tracked = self._tracked.get(commit_sha)
+            if tracked is None or (tracked.future.done() and tracked.state != "ready"):
+                tracked = _Tracked(time.monotonic() + self.timeout)
+                self._tracked[commit_sha] = tracked
+                tracked.future.add_done_callback(_observe_duration(time.monotonic()))
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll_loop, name="netlify-poller", daemon=True)
+                self._poller.start()
+        self._wakeup.set()
+        return tracked.future
+
+    def notify(self, payload: dict) -> bool:
+        """Feed a deploy notification (webhook body); returns True if it matched a tracked commit."""
+        self.webhooks += 1
+        matched = self._observe(payload)
+        NETLIFY_EVENTS.inc(source="webhook", matched=matched)
+        return matched
+
+    def status(self, commit_sha: str) -> Optional[dict]:
+        with self._lock:
+            tracked = self._tracked.get(commit_sha)
+            if tracked is None:
+                return None
+            deploy = tracked.deploy or {}
+            return {
+                "commit_sha": commit_sha,
+                "state": tracked.state,
+                "deploy_id": deploy.get("id"),
+                "url": deploy_url(deploy),
+                "error": deploy.get("error_message"),
+            }
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _observe(self, deploy: dict) -> bool:
+        sha = deploy.get("commit_ref")
+        with self._lock:
+            tracked = self._tracked.get(sha) if sha else None
+            if tracked is None or tracked.future.done():
+                return False
+            tracked.state = deploy.get("state") or tracked.state
+            tracked.deploy = deploy
+        if tracked.state == "ready":
+            return _settle(tracked.future, result=deploy)
+        if tracked.state in FAILED_STATES:
+            return _settle(tracked.future, error=DeployFailed(deploy.get("error_message") or tracked.state))
+        return True
+
+    def _pending(self):
+        with self._lock:
+            return [(sha, t) for sha, t in self._tracked.items() if not t.future.done()]
+
+    def _poll_once(self) -> bool:
+        """List recent deploys and resolve matches; return True if any tracked state changed."""
+        self.polls += 1
+        url = f"{self.api_url}/sites/{self.site_id}/deploys"
+        try:
+            with span("netlify.poll", pending=len(self._pending())):
+                resp = self.session.get(url, params={"per_page": 20}, timeout=10)
+        except requests.RequestException as e:
+            logging.warning("Netlify poll failed: %s", e)
+            return False
+        if resp.status_code != 200:
+            logging.warning("Netlify poll failed: %s %s", resp.status_code, resp.text[:200])
+            return False
+        changed = False
+        before = {sha: t.state for sha, t in self._pending()}
+        for deploy in resp.json():
+            sha = deploy.get("commit_ref")
+            if sha in before and deploy.get("state") != before[sha]:
+                matched = self._observe(deploy)
+                NETLIFY_EVENTS.inc(source="poll", matched=matched)
+                changed = matched or changed
+                before[sha] = deploy.get("state")
+        return changed
+
+    def _poll_loop(self) -> None:
+        interval = self.poll_min
+        while True:
+            pending = self._pending()
+            if not pending:
+                with self._lock:
+                    # stop only if nothing was tracked while we were checking
+                    if not any(not t.future.done() for t in self._tracked.values()):
+                        self._poller = None
+                        self._prune_locked()
+                        return
+                continue
+
+            now = time.monotonic()
+            for sha, tracked in pending:
+                if now > tracked.deadline:
+                    _settle(tracked.future, error=TimeoutError(f"deploy of {sha} not ready in {self.timeout}s"))
+
+            if self._poll_once():
+                interval = self.poll_min
+            else:
+                interval = min(self.poll_max, interval * 1.5)
+
+            # a newly tracked commit (or a webhook) cuts the wait short
+            if self._wakeup.wait(interval):
+                self._wakeup.clear()
+                interval = self.poll_min
+
+    def _prune_locked(self, keep: int = 256) -> None:
+        if len(self._tracked) > keep:
+            for sha in list(self._tracked)[:-keep]:
+                del self._tracked[sha]
+
+
+def _observe_duration(started: float):
+    def done(future: Future) -> None:
+        outcome = "ready" if future.exception() is None else type(future.exception()).__name__
+        DEPLOY_SECONDS.observe(time.monotonic() - started, outcome=outcome)
+    return done
+
+
+def _settle(future: Future, result=None, error: BaseException = None) -> bool:
+    """Resolve `future` unless a webhook, the poller or the deadline got there first."""
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        return False
+    return True
+
+
+def deploy_url(deploy: dict) -> Optional[str]:
+    return deploy.get("deploy_ssl_url") or deploy.get("deploy_url") or deploy.get("ssl_url") or deploy.get("url")
+
+
+def verify_webhook_signature(body: bytes, signature: str, secret: str = None) -> bool:
+    """
+    Verify Netlify's X-Webhook-Signature: an HS256 JWS whose payload carries the
+    sha256 of the request body. Without a secret configured only NETLIFY_WEBHOOK_UNSIGNED=1
+    lets a notification through.
+    """
+    secret = secret or NETLIFY_WEBHOOK_SECRET
+    if not secret:
+        return NETLIFY_WEBHOOK_UNSIGNED
+    if not signature or signature.count(".") != 2:
+        return False
+    header_b64, payload_b64, sig_b64 = signature.split(".")
+
+    def b64decode(part: str) -> bytes:
+        return base64.urlsafe_b64decode(part + "=" * (-len(part) % 4))
+
+    expected = hmac.new(secret.encode(), f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+    try:
+        if not hmac.compare_digest(expected, b64decode(sig_b64)):
+            return False
+        claims = json.loads(b64decode(payload_b64))
+    except ValueError:
+        return False
+    return claims.get("sha256") == hashlib.sha256(body).hexdigest()
+
+
+# -----------------------------
+# Process-wide tracker
+# -----------------------------
+_tracker: Optional[DeployTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker() -> Optional[DeployTracker]:
+    """The shared tracker, or None when NETLIFY_AUTH_TOKEN / NETLIFY_SITE_ID are not set."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            token = os.environ.get("NETLIFY_AUTH_TOKEN")
+            site_id = os.environ.get("NETLIFY_SITE_ID")
+            if not token or not site_id:
+                return None
+            _tracker = DeployTracker(site_id, token)
+        return _tracker
@@ -0,0 +1,159 @@
+"""
+generation_journal.py — Per-page record of every site generation, so a failed page can be retried alone.
+
+    journal = get_journal()
+    journal.start(job, workspace, enhanced_req, [(page, filename, inputs), ...])
+    journal.mark(job, idx, RUNNING)
+    journal.mark(job, idx, DONE, output=sha256_of_html)     # or FAILED, error=str(e)
+    journal.finish(job)
+    journal.get(job)     # {"generation", "workspace", "status", "pages": [...], ...}
+
+A generation (job = the SiteArtifact id) stores its requirements and one row per page:
+state (pending / running / done / failed), a hash of the page's inputs, the SHA-256 of
+the finished HTML (the same value as its SiteFile etag), the last error and the number
+of attempts. website_agent.iter_website_pages(..., resume=job) reads it back, keeps the
+pages that are done and whose content still has that hash, and generates only the
+rest. A page left "running" by a crash or a disconnected client is simply not done.
+
+The journal is one SQLite database (generation_journal.sqlite3 next to the llm_cache
+files); generations older than JOURNAL_RETENTION seconds are dropped.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_cache import CACHE_DIR
+from telemetry import counter
+
+JOURNAL_RETENTION = int(os.environ.get("JOURNAL_RETENTION", 7 * 24 * 3600))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+PARTIAL = "partial"   # generation status: finished with pages missing
+
+JOURNAL_PAGES = counter("generation_journal_pages_total", "Journaled page outcomes.", ("state",))
+
+
+class GenerationJournal:
+    """SQLite-backed journal; safe to share between threads."""
+
+    def __init__(self, path: str = None):
+        path = path or os.path.join(CACHE_DIR, "generation_journal.sqlite3")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " job TEXT PRIMARY KEY, workspace TEXT NOT NULL, request TEXT NOT NULL,"
+            " status TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " job TEXT NOT NULL, idx INTEGER NOT NULL, page TEXT NOT NULL, filename TEXT NOT NULL,"
+            " inputs TEXT, state TEXT NOT NULL, output TEXT, error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL, PRIMARY KEY (job, idx))"
+        )
+
+    def start(self, job: str, workspace: str, request: Any, pages: List[Tuple[str, str, str]]) -> None:
+        """Record a new generation; `pages` are (page, filename, inputs hash) in page order."""
+        now = time.time()
+        with self._lock:
+            self._prune_locked(now)
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO generations (job, workspace, request, status, created, updated)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (job, workspace, json.dumps(request, ensure_ascii=False), RUNNING, now, now),
+                )
+                self._conn.execute("DELETE FROM pages WHERE job = ?", (job,))
+                self._conn.executemany(
+                    "INSERT INTO pages (job, idx, page, filename, inputs, state, updated)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(job, idx, page, filename, inputs, PENDING, now)
+                     for idx, (page, filename, inputs) in enumerate(pages)],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def reopen(self, job: str, indices: List[int]) -> None:
+        """Start a resume of `job`: the pages at `indices` go back to pending."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE generations SET status = ?, updated = ? WHERE job = ?", (RUNNING, now, job))
+            self._conn.executemany(
+                "UPDATE pages SET state = ?, updated = ? WHERE job = ? AND idx = ?",
+                [(PENDING, now, job, idx) for idx in indices],
+            )
+
+    def mark(self, job: str, idx: int, state: str, output: str = None, error: str = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET state = ?, output = COALESCE(?, output), error = ?,"
+                " attempts = attempts + ?, updated = ? WHERE job = ? AND idx = ?",
+                (state, output, error, 1 if state == RUNNING else 0, time.time(), job, idx),
+            )
+        if state in (DONE, FAILED):
+            JOURNAL_PAGES.inc(state=state)
+
+    def finish(self, job: str) -> str:
+        """Close a generation; its status is "done", or "partial" if any page is not done."""
+        with self._lock:
+            missing = self._conn.execute(
+                "SELECT COUNT(*) FROM pages WHERE job = ? AND state != ?", (job, DONE)
+            ).fetchone()[0]
+            status = PARTIAL if missing else DONE
+            self._conn.execute("UPDATE generations SET status = ?, updated = ? WHERE job = ?",
+                               (status, time.time(), job))
+        return status
+
+    def get(self, job: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT workspace, request, status, created, updated FROM generations WHERE job = ?", (job,)
+            ).fetchone()
+            if row is None:
+                return None
+            pages = self._conn.execute(
+                "SELECT idx, page, filename, inputs, state, output, error, attempts FROM pages"
+                " WHERE job = ? ORDER BY idx", (job,)
+            ).fetchall()
+        workspace, request, status, created, updated = row
+        return {
+            "generation": job,
+            "workspace": workspace,
+            "request": json.loads(request),
+            "status": status,
+            "created": created,
+            "updated": updated,
+            "pages": [
+                {"index": idx, "page": page, "filename": filename, "inputs": inputs, "state": state,
+                 "output": output, "error": error, "attempts": attempts}
+                for idx, page, filename, inputs, state, output, error, attempts in pages
+            ],
+        }
+
+    def _prune_locked(self, now: float) -> None:
+        cutoff = now - JOURNAL_RETENTION
+        self._conn.execute("DELETE FROM pages WHERE job IN (SELECT job FROM generations WHERE updated < ?)", (cutoff,))
+        self._conn.execute("DELETE FROM generations WHERE updated < ?", (cutoff,))
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> GenerationJournal:
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = GenerationJournal()
+        return _journal
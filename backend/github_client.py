@@ -0,0 +1,197 @@
+"""
+github_client.py — Pooled, retrying client for the GitHub git data API.
+
+- One keep-alive requests.Session per client, with the connection pool sized to the
+  blob-upload concurrency (GITHUB_PARALLELISM) so parallel uploads reuse connections.
+- Every call has a timeout and is retried on connection errors, 5xx and rate limits:
+  Retry-After is honoured, primary limits (x-ratelimit-remaining: 0) wait for
+  x-ratelimit-reset, and secondary limits back off exponentially.
+- stage("blobs") blocks accumulate wall-clock time per pipeline stage in `timings`.
+"""
+
+import os
+import time
+import base64
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from telemetry import counter, record_retry, span
+
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+GITHUB_PARALLELISM = int(os.environ.get("GITHUB_PARALLELISM", 4))
+GITHUB_TIMEOUT = float(os.environ.get("GITHUB_TIMEOUT", 30))
+GITHUB_RETRIES = int(os.environ.get("GITHUB_RETRIES", 5))
+GITHUB_MAX_BACKOFF = float(os.environ.get("GITHUB_MAX_BACKOFF", 60))
+
+GITHUB_REQUESTS = counter("github_requests_total", "GitHub API calls by endpoint and status.",
+                          ("method", "endpoint", "status"))
+
+
+def _endpoint(path: str) -> str:
+    """Metric label for a repo-relative path without SHAs/branches, e.g. "git/blobs"."""
+    return "/".join(path.lstrip("/").split("/")[:2])
+
+
+class GitHubError(Exception):
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+class GitHubClient:
+    def __init__(self, token: str, repo: str, api_url: str = None,
+                 parallelism: int = GITHUB_PARALLELISM, timeout: float = GITHUB_TIMEOUT,
+                 retries: int = GITHUB_RETRIES):
+        self.repo = repo
+        self.api_url = (api_url or GITHUB_API_URL).rstrip("/")
+        self.parallelism = max(1, parallelism)
+        self.timeout = timeout
+        self.retries = retries
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github.v3+json",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.parallelism + 2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.timings: Dict[str, float] = {}
+        self.calls = 0
+        self.retried = 0
+        self._stats_lock = threading.Lock()
+
+    # -----------------------------
+    # Plumbing
+    # -----------------------------
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            with span(f"github.{name}", repo=self.repo):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def _retry_wait(self, resp: requests.Response, attempt: int) -> float:
+        """Seconds to wait before retrying `resp`, or None if it is not retryable."""
+        status = resp.status_code
+        if status not in (403, 429) and status < 500:
+            return None
+        retry_after = resp.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        if status in (403, 429):
+            if resp.headers.get("x-ratelimit-remaining") == "0":
+                reset = float(resp.headers.get("x-ratelimit-reset", 0))
+                return max(1.0, reset - time.time())
+            if status == 403 and "rate limit" not in resp.text.lower():
+                return None  # a real permission error
+        return (2 ** attempt) + random.uniform(0, 1)
+
+    def request(self, method: str, path: str, expected: Iterable[int] = (200,), **kwargs) -> dict:
+        url = path if path.startswith("http") else f"{self.api_url}/repos/{self.repo}/{path.lstrip('/')}"
+        endpoint = _endpoint(path)
+        kwargs.setdefault("timeout", self.timeout)
+        last_error = None
+        for attempt in range(self.retries):
+            with self._stats_lock:
+                self.calls += 1
+            with span("github.request", method=method, endpoint=endpoint, attempt=attempt + 1) as call:
+                try:
+                    resp = self.session.request(method, url, **kwargs)
+                except requests.RequestException as e:
+                    last_error = str(e)
+                    reason = "network"
+                    wait = (2 ** attempt) + random.uniform(0, 1)
+                    GITHUB_REQUESTS.inc(method=method, endpoint=endpoint, status="error")
+                else:
+                    call.set(status_code=resp.status_code)
+                    GITHUB_REQUESTS.inc(method=method, endpoint=endpoint, status=resp.status_code)
+                    if resp.status_code in expected:
+                        return resp.json() if resp.content else {}
+                    last_error = f"{resp.status_code} {resp.text}"
+                    reason = str(resp.status_code)
+                    wait = self._retry_wait(resp, attempt)
+                    if wait is None:
+                        raise GitHubError(f"{method} {path} failed: {last_error}", resp.status_code)
+            if attempt == self.retries - 1:
+                break
+            wait = min(wait, GITHUB_MAX_BACKOFF)
+            with self._stats_lock:
+                self.retried += 1
+            record_retry("github", reason, wait)
+            logging.warning("GitHub %s %s: %s — retrying in %.1fs", method, path, last_error[:200], wait)
+            time.sleep(wait)
+        raise GitHubError(f"{method} {path} failed after {self.retries} attempts: {last_error}")
+
+    # -----------------------------
+    # Git data API
+    # -----------------------------
+    def get_ref(self, branch: str) -> str:
+        return self.request("GET", f"git/refs/heads/{branch}")["object"]["sha"]
+
+    def get_commit_tree(self, commit_sha: str) -> str:
+        return self.request("GET", f"git/commits/{commit_sha}")["tree"]["sha"]
+
+    def get_tree_shas(self, tree_sha: str) -> Dict[str, str]:
+        """Map path -> blob sha for every file in the (recursive) tree; {} if it cannot be listed."""
+        try:
+            info = self.request("GET", f"git/trees/{tree_sha}", params={"recursive": "1"})
+        except GitHubError as e:
+            logging.warning("Could not list base tree, uploading everything: %s", e)
+            return {}
+        if info.get("truncated"):
+            # GitHub caps recursive listings; without the full tree we can't trust the diff
+            logging.warning("Base tree listing truncated, uploading everything")
+            return {}
+        return {item["path"]: item["sha"] for item in info.get("tree", []) if item.get("type") == "blob"}
+
+    def create_blob(self, content: bytes) -> str:
+        payload = {"content": base64.b64encode(content).decode(), "encoding": "base64"}
+        return self.request("POST", "git/blobs", expected=(201,), json=payload)["sha"]
+
+    def get_blob(self, sha: str) -> bytes:
+        return base64.b64decode(self.request("GET", f"git/blobs/{sha}")["content"])
+
+    def get_blobs(self, shas: List[str]) -> Dict[str, bytes]:
+        """Download blobs with bounded concurrency; return sha -> content."""
+        shas = list(dict.fromkeys(shas))
+        if not shas:
+            return {}
+        workers = min(self.parallelism, len(shas))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gh-blob") as exe:
+            return dict(zip(shas, exe.map(self.get_blob, shas)))
+
+    def create_blobs(self, files: List[Tuple[str, bytes]]) -> Dict[str, str]:
+        """Upload (path, content) pairs with bounded concurrency; return path -> blob sha."""
+        if not files:
+            return {}
+        workers = min(self.parallelism, len(files))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gh-blob") as exe:
+            shas = exe.map(lambda item: self.create_blob(item[1]), files)
+            return {path: sha for (path, _), sha in zip(files, shas)}
+
+    def create_tree(self, base_tree_sha: str, items: List[dict]) -> str:
+        return self.request("POST", "git/trees", expected=(201,),
+                            json={"base_tree": base_tree_sha, "tree": items})["sha"]
+
+    def create_commit(self, message: str, tree_sha: str, parents: List[str]) -> str:
+        return self.request("POST", "git/commits", expected=(201,),
+                            json={"message": message, "tree": tree_sha, "parents": parents})["sha"]
+
+    def update_ref(self, branch: str, commit_sha: str, force: bool = True) -> None:
+        self.request("PATCH", f"git/refs/heads/{branch}", expected=(200, 201),
+                     json={"sha": commit_sha, "force": force})
@@ -0,0 +1,302 @@
+"""
+hedging.py — Hedged (speculative) LLM requests across an ordered list of models.
+
+    model, result = hedged([("deepseek/deepseek-r1:free", call_primary),
+                            ("gpt-4o-mini:free", call_fallback)], component="requirement_agent")
+
+Each call is fn(cancel) -> result (None or an exception means it failed). The first
+call starts at once. If it has not finished after the policy's delay (a latency
+percentile of that model, see ModelStats) the next call is fired in parallel, and so
+on; a call that fails fires the next one immediately. The first result that passes
+`validate` wins and the others are cancelled: threads get `cancel` set (calls check it
+before each retry), coroutines are cancelled outright (hedged_async).
+
+Every finished call feeds the shared ModelStats (recent latencies, success rate), which
+sets the hedge delays and, with reorder=True, the order the models are tried in. Calls
+that lose are recorded with their elapsed time as a lower bound, so a model that is
+always slow still gets enough samples to move down the order. With
+HedgePolicy(enabled=False) the same code path is the plain sequential fallback.
+"""
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from telemetry import bind, counter, register_collector
+
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", 0.9))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", 1.0))
+HEDGE_MAX_DELAY = float(os.environ.get("HEDGE_MAX_DELAY", 30.0))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", 8.0))   # until a model has stats
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", 5))
+HEDGE_WINDOW = int(os.environ.get("HEDGE_WINDOW", 200))                    # latencies kept per model
+HEDGE_THREADS = int(os.environ.get("HEDGE_THREADS", 32))
+
+HEDGES = counter("llm_hedge_events_total", "Hedged calls fired and won, by component and model.",
+                 ("component", "model", "event"))
+
+
+class ModelStats:
+    """Recent latencies and an exponentially weighted success rate per model; thread-safe."""
+
+    def __init__(self, window: int = HEDGE_WINDOW, alpha: float = 0.2, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = {}
+        self._success: Dict[str, float] = {}
+        self._calls: Dict[str, int] = {}
+
+    def record(self, model: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self._latencies.setdefault(model, deque(maxlen=self.window)).append(seconds)
+            rate = self._success.get(model, 1.0)
+            self._success[model] = rate + self.alpha * ((1.0 if ok else 0.0) - rate)
+            self._calls[model] = self._calls.get(model, 0) + 1
+
+    def record_lost(self, model: str, seconds: float) -> None:
+        """A call cancelled after `seconds` took at least that long; kept as a latency sample."""
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        """Latency quantile of successful calls, or None with fewer than min_samples."""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def success_rate(self, model: str) -> float:
+        with self._lock:
+            return self._success.get(model, 1.0)
+
+    def order(self, models: Sequence[str]) -> List[str]:
+        """
+        Models by expected time to a good answer (median latency / success rate). The
+        configured order is kept until every model has enough samples to compare.
+        """
+        scores = {}
+        for model in models:
+            median = self.quantile(model, 0.5)
+            if median is None:
+                return list(models)
+            scores[model] = median / max(self.success_rate(model), 0.05)
+        return sorted(models, key=lambda m: scores[m])  # stable: ties keep configured order
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            calls = {m: self._calls.get(m, 0) for m in set(self._calls) | set(self._latencies)}
+        return {
+            m: {"calls": n, "success_rate": round(self.success_rate(m), 4),
+                "p50": self.quantile(m, 0.5), "p90": self.quantile(m, 0.9)}
+            for m, n in calls.items()
+        }
+
+
+class HedgePolicy:
+    """When to fire the next call: `percentile` of the running model's latency, clamped."""
+
+    def __init__(self, stats: ModelStats, enabled: bool = True, percentile: float = HEDGE_PERCENTILE,
+                 min_delay: float = HEDGE_MIN_DELAY, max_delay: float = HEDGE_MAX_DELAY,
+                 default_delay: float = HEDGE_DEFAULT_DELAY, reorder: bool = True):
+        self.stats = stats
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.reorder = reorder
+
+    def delay(self, model: str) -> Optional[float]:
+        """Seconds to wait on `model` before hedging; None means only on failure."""
+        if not self.enabled:
+            return None
+        observed = self.stats.quantile(model, self.percentile)
+        if observed is None:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, observed))
+
+    def order(self, calls: list) -> list:
+        if not self.reorder or len(calls) < 2:
+            return list(calls)
+        ranked = self.stats.order([name for name, _ in calls])
+        remaining = list(calls)
+        ordered = []
+        for name in ranked:
+            for i, call in enumerate(remaining):
+                if call[0] == name:
+                    ordered.append(remaining.pop(i))
+                    break
+        return ordered
+
+
+STATS = ModelStats()
+DEFAULT_POLICY = HedgePolicy(STATS)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix="hedge")
+        return _executor
+
+
+def _passes(result, validate) -> bool:
+    return result is not None and (validate is None or validate(result))
+
+
+def hedged(calls: List[Tuple[str, Callable]], policy: HedgePolicy = None,
+           validate: Callable = None, component: str = "llm"):
+    """
+    Race `calls` ([(model, fn(cancel))]) per `policy`; return (model, result) of the winner.
+    If every call fails: re-raises the last exception, or returns (None, None).
+    """
+    policy = policy or DEFAULT_POLICY
+    calls = policy.order(calls)
+    cancel = threading.Event()
+    finished: "queue.Queue" = queue.Queue()
+
+    def run(i: int, name: str, fn: Callable) -> None:
+        started = time.perf_counter()
+        error, result = None, None
+        try:
+            result = fn(cancel)
+        except Exception as e:
+            error = e
+        ok = _passes(result, validate)
+        if not cancel.is_set():  # losers were recorded when the race ended
+            policy.stats.record(name, time.perf_counter() - started, ok)
+        finished.put((i, result if ok else None, error))
+
+    launched = running = 0
+    last_error = None
+    started_at: Dict[int, float] = {}
+
+    def launch() -> None:
+        nonlocal launched, running
+        name, fn = calls[launched]
+        if launched:
+            logging.info("%s: hedging with %s (call %d)", component, name, launched + 1)
+            HEDGES.inc(component=component, model=name, event="fired")
+        started_at[launched] = time.perf_counter()
+        _pool().submit(bind(run), launched, name, fn)
+        launched += 1
+        running += 1
+
+    try:
+        launch()
+        while True:
+            timeout = policy.delay(calls[launched - 1][0]) if launched < len(calls) else None
+            try:
+                i, result, error = finished.get(timeout=timeout)
+            except queue.Empty:
+                launch()  # slow: race the next model while this one keeps going
+                continue
+            running -= 1
+            del started_at[i]
+            if result is not None:
+                if launched > 1:
+                    HEDGES.inc(component=component, model=calls[i][0], event="won")
+                return calls[i][0], result
+            last_error = error or last_error
+            if launched < len(calls):
+                launch()  # failed: no point waiting out the delay
+            elif running == 0:
+                if last_error is not None:
+                    raise last_error
+                return None, None
+    finally:
+        cancel.set()
+        for i, started in started_at.items():
+            policy.stats.record_lost(calls[i][0], time.perf_counter() - started)
+
+
+async def hedged_async(calls: List[Tuple[str, Callable]], policy: HedgePolicy = None,
+                       validate: Callable = None, component: str = "llm"):
+    """Coroutine twin of hedged(): calls are [(model, fn())] returning awaitables; losers are cancelled."""
+    policy = policy or DEFAULT_POLICY
+    calls = policy.order(calls)
+
+    async def run(name: str, fn: Callable):
+        started = time.perf_counter()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            policy.stats.record(name, time.perf_counter() - started, False)
+            raise
+        ok = _passes(result, validate)
+        policy.stats.record(name, time.perf_counter() - started, ok)
+        return result if ok else None
+
+    tasks: Dict[asyncio.Task, int] = {}
+    started_at: Dict[int, float] = {}
+    launched = 0
+    last_error = None
+
+    def launch() -> None:
+        nonlocal launched
+        name, fn = calls[launched]
+        if launched:
+            logging.info("%s: hedging with %s (call %d)", component, name, launched + 1)
+            HEDGES.inc(component=component, model=name, event="fired")
+        tasks[asyncio.ensure_future(run(name, fn))] = launched
+        started_at[launched] = time.perf_counter()
+        launched += 1
+
+    try:
+        launch()
+        while True:
+            timeout = policy.delay(calls[launched - 1][0]) if launched < len(calls) else None
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            failed = False
+            for task in done:
+                i = tasks.pop(task)
+                del started_at[i]
+                try:
+                    result = task.result()
+                except Exception as e:
+                    last_error, result = e, None
+                if result is not None:
+                    if launched > 1:
+                        HEDGES.inc(component=component, model=calls[i][0], event="won")
+                    return calls[i][0], result
+                failed = True
+            if failed and launched < len(calls):
+                launch()
+            elif not tasks:
+                if last_error is not None:
+                    raise last_error
+                return None, None
+    finally:
+        for task, i in tasks.items():
+            task.cancel()
+            policy.stats.record_lost(calls[i][0], time.perf_counter() - started_at[i])
+
+
+def _stats_gauges():
+    for model, stats in STATS.snapshot().items():
+        yield "llm_model_success_rate", "Weighted success rate per model (hedging).", {"model": model}, stats["success_rate"]
+        for q in ("p50", "p90"):
+            if stats[q] is not None:
+                yield f"llm_model_latency_{q}_seconds", f"Recent {q} latency per model (hedging).", {"model": model}, stats[q]
+
+
+register_collector(_stats_gauges)
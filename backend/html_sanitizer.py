@@ -0,0 +1,240 @@
+"""
+html_sanitizer.py — Incremental cleanup and structural check of model-generated HTML.
+
+HtmlSanitizer replaces the re.sub/re.findall chain that used to live in
+website_agent.sanitize_ai_html. It consumes the raw model output in chunks (a whole
+response or stream deltas as they arrive) and in one pass over the input:
+
+- drops "<<<<<<< START_TITLE ... / END_TITLE" marker lines;
+- splits out ``` / ```html fenced blocks (when there are any, only their contents are
+  kept, as before), otherwise removes stray fence tokens;
+- notes whether the result has a <!DOCTYPE>.
+
+close() returns a SanitizeResult. Its structural check is one compiled-regex scan of
+the cleaned HTML (no parse tree). It reports unclosed or stray tags, a missing
+<head>/<body> in full documents, and empty output. It also records where <body> opens
+and whether there is already a <nav>, so the caller can inject the shared navbar
+without searching again.
+
+sanitize_ai_html(raw) in website_agent is a thin wrapper and returns the same string as
+the old implementation (see sanitizer_benchmark.py, which checks both on a corpus).
+"""
+
+import re
+from collections import Counter, namedtuple
+from typing import List, Optional, Tuple
+
+SanitizeResult = namedtuple("SanitizeResult", [
+    "html",          # cleaned HTML
+    "has_doctype",   # contains <!doctype ...>
+    "issues",        # [(code, tag)], e.g. ("unclosed", "div"), ("missing", "head")
+    "unclosed",      # tags left open at the end, innermost last (for repair())
+    "body_start",    # offset just after the <body ...> tag, or None
+    "has_nav",       # a <nav> element is present
+])
+
+FENCE = "```"
+_DOCTYPE_RE = re.compile(r"<!doctype", re.IGNORECASE)
+_LEADING_HTML_RE = re.compile(r"^\s*html\s*", re.IGNORECASE)
+_TRAILING_HTML_RE = re.compile(r"\s*html\s*$", re.IGNORECASE)
+
+VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr", "keygen", "command",
+))
+# end tag may be omitted in valid HTML; never reported as unclosed
+OPTIONAL_END_TAGS = frozenset((
+    "p", "li", "dt", "dd", "option", "optgroup", "tr", "td", "th", "thead", "tbody",
+    "tfoot", "colgroup", "caption", "rb", "rt", "rtc", "rp",
+))
+
+# Attribute values containing ">" are not handled (rare in generated markup); keeping the
+# tag branch a plain [^>]* makes this scan as cheap as one of the old re.sub passes.
+_TAG_RE = re.compile(
+    r"<(?:"
+    r"!--.*?(?:-->|\Z)"                                                  # comment
+    r"|![^>]*>"                                                          # doctype / declaration
+    r"|(?P<raw>(?i:script|style|textarea|title))\b[^>]*>"
+    r".*?(?P<raw_end></(?i:(?P=raw))\s*>|\Z)"                            # raw-text element
+    r"|(?P<close>/?)(?P<tag>[a-zA-Z][a-zA-Z0-9:-]*)[^>]*>"               # start / end tag
+    r")",
+    re.DOTALL,
+)
+
+
+class HtmlSanitizer:
+    """
+    feed(chunk) any number of times, then close() once:
+
+        s = HtmlSanitizer()
+        for delta in stream:
+            s.feed(delta)
+        result = s.close()
+    """
+
+    def __init__(self):
+        self._pending = ""           # incomplete last line
+        self._in_fence = False
+        self._strip_lang = False     # drop "html" right after an opening fence
+        self._block: List[str] = []  # contents of the open fenced block
+        self._block_doctype = False
+        self._blocks: List[str] = []
+        self._blocks_doctype = False
+        self._plain: List[str] = []  # everything minus fence tokens (used if no block completes)
+        self._plain_doctype = False
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        data = self._pending + chunk if self._pending else chunk
+        cut = data.rfind("\n") + 1
+        if not cut:
+            self._pending = data
+            return
+        self._pending = data[cut:]
+        self._lines(data[:cut])
+
+    def close(self, check: bool = True) -> SanitizeResult:
+        """Finish the input; check=False skips the structural scan (issues is then None)."""
+        if self._pending:
+            # a final line without "\n" is never treated as a marker line (as before)
+            self._segments(self._pending)
+            self._pending = ""
+
+        if self._blocks:
+            html = "\n\n".join(block.strip() for block in self._blocks).strip()
+            has_doctype = self._blocks_doctype
+        else:
+            html = "".join(self._plain)
+            html = _LEADING_HTML_RE.sub("", html, count=1)
+            html = _TRAILING_HTML_RE.sub("", html, count=1).strip()
+            has_doctype = self._plain_doctype
+        if not check:
+            return SanitizeResult(html, has_doctype, None, [], None, False)
+        return check_structure(html, has_doctype)
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _lines(self, text: str) -> None:
+        """Handle complete lines; only lines containing "<<" are looked at individually."""
+        start = 0
+        while True:
+            marker = text.find("<<", start)
+            if marker == -1:
+                if start < len(text):
+                    self._segments(text[start:])
+                return
+            line_end = text.find("\n", marker) + 1
+            tail = text[marker:line_end].upper()
+            if "END_TITLE" in tail or "START_TITLE" in tail:
+                # marker line: drop from the first "<<" through the newline
+                if marker > start:
+                    self._segments(text[start:marker])
+            else:
+                self._segments(text[start:line_end])
+            start = line_end
+
+    def _segments(self, text: str) -> None:
+        parts = text.split(FENCE) if FENCE in text else (text,)
+        for i, part in enumerate(parts):
+            if i:
+                # crossed a fence token
+                if self._in_fence:
+                    self._blocks.append("".join(self._block))
+                    self._blocks_doctype = self._blocks_doctype or self._block_doctype
+                    self._block = []
+                    self._block_doctype = False
+                    self._plain = []  # fenced output wins once a block is complete
+                self._in_fence = not self._in_fence
+                self._strip_lang = True
+            if self._strip_lang and part:
+                if part[:4].lower() == "html":
+                    part = part[4:]
+                self._strip_lang = False
+            if not part:
+                continue
+            doctype = "<!" in part and _DOCTYPE_RE.search(part) is not None
+            if self._in_fence:
+                self._block.append(part)
+                self._block_doctype = self._block_doctype or doctype
+            if not self._blocks:
+                self._plain.append(part)
+                self._plain_doctype = self._plain_doctype or doctype
+
+
+def check_structure(html: str, has_doctype: bool = None) -> SanitizeResult:
+    """Scan `html` once for tag balance and document structure."""
+    if has_doctype is None:
+        has_doctype = _DOCTYPE_RE.search(html) is not None
+    issues: List[Tuple[str, str]] = []
+    if not html.strip():
+        return SanitizeResult(html, has_doctype, [("empty", "")], [], None, False)
+
+    stack: List[str] = []
+    stray: Counter = Counter()
+    seen = set()
+    body_start: Optional[int] = None
+
+    for m in _TAG_RE.finditer(html):
+        raw, raw_end, close, tag = m.group("raw", "raw_end", "close", "tag")
+        if raw:
+            raw = raw.lower()
+            seen.add(raw)
+            if not raw_end:
+                stack.append(raw)
+            continue
+        if not tag:
+            continue  # comment / doctype
+        tag = tag.lower()
+        if not close:
+            seen.add(tag)
+            end = m.end()
+            if tag == "body" and body_start is None:
+                body_start = end
+            if tag not in VOID_TAGS and html[end - 2] != "/":
+                stack.append(tag)
+            continue
+        if tag in VOID_TAGS:
+            continue
+        if tag not in stack:
+            stray[tag] += 1
+            continue
+        while stack:
+            top = stack.pop()
+            if top == tag:
+                break
+            if top not in OPTIONAL_END_TAGS:
+                issues.append(("unclosed", top))
+
+    unclosed = [t for t in stack if t not in OPTIONAL_END_TAGS]
+    issues.extend(("unclosed", t) for t in unclosed)
+    issues.extend(("stray", t) for t in stray)
+    if has_doctype or "html" in seen:
+        for required in ("head", "body"):
+            if required not in seen:
+                issues.append(("missing", required))
+    return SanitizeResult(html, has_doctype, issues, unclosed, body_start, "nav" in seen)
+
+
+def repair(result: SanitizeResult, html: str = None) -> str:
+    """
+    Close tags left open at the end (typically a response cut off by max_tokens).
+    `html` defaults to result.html; pass inject_navbar()'s output to apply both.
+    """
+    html = result.html if html is None else html
+    if not result.unclosed:
+        return html
+    return html + "".join(f"</{tag}>" for tag in reversed(result.unclosed)) + "\n"
+
+
+def inject_navbar(result: SanitizeResult, navbar_html: str) -> str:
+    """Insert the shared navbar right after <body> if the document has no <nav> of its own."""
+    if result.has_nav or result.body_start is None or not navbar_html:
+        return result.html
+    at = result.body_start
+    return result.html[:at] + "\n" + navbar_html + result.html[at:]
+
+
+def format_issues(issues: List[Tuple[str, str]]) -> str:
+    return ", ".join(f"{code} <{tag}>" if tag else code for code, tag in issues)
@@ -0,0 +1,171 @@
+"""
+jobs.py — Background job subsystem for the long-running /submit and /deploy pipelines.
+
+- Handlers are registered per job kind ("submit", "deploy", ...) and called as
+  handler(job_id, payload); payloads and results must be JSON-serializable so a
+  backend can keep them outside the process.
+- InProcessJobBackend runs jobs on a bounded thread pool and rejects new jobs with
+  QueueFull once `max_queue` jobs are waiting (the API turns that into a 429).
+- submit(..., dedupe_key=k) returns the id of a job with the same key that is still
+  queued or running instead of starting another one.
+- Backends are pluggable: register_backend("redis", factory) and set JOB_BACKEND=redis
+  to swap in another implementation of the JobBackend interface.
+
+Only the interface and the in-process backend ship here; there is no Redis/RQ backend
+yet. One would enqueue (kind, payload, dedupe_key) in Redis, keep the job snapshots
+get() returns there, and run the handlers in separate worker processes that import
+main.py's registrations. QueueFull and the dedupe semantics have to carry over.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "inprocess")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", 32))
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", 3600))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+Handler = Callable[[str, Any], Any]
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the backend cannot accept more work right now."""
+
+
+class JobBackend:
+    """Interface every job backend implements."""
+
+    def __init__(self):
+        self.handlers: Dict[str, Handler] = {}
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self.handlers[kind] = handler
+
+    def submit(self, kind: str, payload: Any = None, dedupe_key: str = None) -> str:
+        """
+        Enqueue a job and return its id. With dedupe_key, an unfinished job submitted with
+        the same key is returned instead. Raises QueueFull when saturated.
+        """
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of the job (id, kind, status, result, error, timestamps) or None."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class InProcessJobBackend(JobBackend):
+    def __init__(self, workers: int = JOB_WORKERS, max_queue: int = JOB_QUEUE_SIZE,
+                 retention: int = JOB_RETENTION):
+        super().__init__()
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._dedupe: Dict[str, str] = {}  # dedupe_key -> unfinished job id
+        self._attached = 0
+
+    def submit(self, kind: str, payload: Any = None, dedupe_key: str = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        with self._lock:
+            if dedupe_key and dedupe_key in self._dedupe:
+                self._attached += 1
+                return self._dedupe[dedupe_key]
+            self._prune_locked()
+            if self._queued >= self.max_queue:
+                raise QueueFull(f"{self._queued} jobs already waiting")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "status": QUEUED,
+                "result": None,
+                "error": None,
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+            }
+            self._queued += 1
+            if dedupe_key:
+                self._dedupe[dedupe_key] = job_id
+        self._executor.submit(self._run, job_id, kind, payload, dedupe_key)
+        return job_id
+
+    def _run(self, job_id: str, kind: str, payload: Any, dedupe_key: str = None) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = RUNNING
+            job["started"] = time.time()
+            self._queued -= 1
+            self._running += 1
+        try:
+            result = self.handlers[kind](job_id, payload)
+            status, error = DONE, None
+        except Exception as e:
+            logging.exception("Job %s (%s) failed: %s", job_id, kind, e)
+            result, status, error = None, FAILED, str(e)
+        with self._lock:
+            job.update(status=status, result=result, error=error, finished=time.time())
+            self._running -= 1
+            if dedupe_key and self._dedupe.get(dedupe_key) == job_id:
+                del self._dedupe[dedupe_key]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "inprocess",
+                "workers": self.workers,
+                "queued": self._queued,
+                "running": self._running,
+                "max_queue": self.max_queue,
+                "tracked": len(self._jobs),
+                "deduplicated": self._attached,
+            }
+
+    def _prune_locked(self) -> None:
+        cutoff = time.time() - self.retention
+        stale = [jid for jid, j in self._jobs.items() if j["finished"] and j["finished"] < cutoff]
+        for jid in stale:
+            del self._jobs[jid]
+
+
+# -----------------------------
+# Backend selection
+# -----------------------------
+_factories: Dict[str, Callable[[], JobBackend]] = {"inprocess": InProcessJobBackend}
+_backend: Optional[JobBackend] = None
+_backend_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: Callable[[], JobBackend]) -> None:
+    _factories[name] = factory
+
+
+def get_backend() -> JobBackend:
+    """Return the process-wide backend selected by JOB_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if JOB_BACKEND not in _factories:
+                raise RuntimeError(f"Unknown JOB_BACKEND '{JOB_BACKEND}'")
+            _backend = _factories[JOB_BACKEND]()
+        return _backend
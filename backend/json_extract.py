@@ -0,0 +1,296 @@
+"""
+json_extract.py — Find, repair and validate the JSON object in a model response.
+
+JsonScanner consumes the response in chunks (a whole response or stream deltas) and
+finds the first balanced {...} in one pass: compiled regexes jump straight to the next
+bracket or quote, so it never walks the text a character at a time in Python and stops
+as soon as the object closes (prose or a ``` fence around it is simply skipped).
+
+parse_object() json.loads the candidate and, only if that fails, repairs the usual
+defects locally instead of asking the model again:
+
+- trailing commas before } or ];
+- 'single-quoted' strings;
+- Python literals (True / False / None) and unquoted keys;
+- truncation (max_tokens hit): the open string is closed, a dangling key or comma is
+  dropped and the open containers are closed. A list item cut off inside its string
+  ("pages": ["Home", "Lo) is dropped rather than kept as a bogus value.
+
+conform() then checks the object against a declared schema, {key: Field}, and coerces
+what it safely can (a comma-separated string into a list, {"name": ...} items into
+strings) before filling defaults for missing keys.
+"""
+
+import re
+import json
+import copy
+from collections import namedtuple
+from typing import List, Optional, Tuple
+
+# type: expected type(s); default: used when missing or unusable (None: optional key);
+# items: for lists, the type every item is coerced to
+Field = namedtuple("Field", ["type", "default", "items"], defaults=(None, None))
+
+MAX_CANDIDATES = 3  # "{" positions tried before giving up
+
+_OUTSIDE_RE = re.compile(r"[{}\[\]\"']")
+_IN_STRING_RE = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_TOKEN_RE = re.compile(
+    r'"(?:[^"\\]|\\.)*(?:"|\\?\Z)'      # double-quoted string (maybe cut off)
+    r"|'(?:[^'\\]|\\.)*(?:'|\\?\Z)"     # single-quoted string (maybe cut off)
+    r"|[{}\[\]:,]"
+    r"|[^\s{}\[\]:,\"']+"               # number / literal / bare word
+    r"|\s+",
+    re.DOTALL,
+)
+_SQ_ESCAPE_RE = re.compile(r"\\(.)|\"", re.DOTALL)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_BARE_KEY_RE = re.compile(r"[A-Za-z_$][\w$-]*\Z")
+
+
+class JsonScanner:
+    """
+    feed(chunk) until it returns True (object complete) or the input ends, then close():
+
+        scanner = JsonScanner()
+        for delta in stream:
+            if scanner.feed(delta):
+                break
+        text, truncated = scanner.close()
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._depth = 0
+        self._quote = None       # quote char of the string we are in
+        self._escape = False     # chunk ended right after a backslash
+        self._seen = 0           # characters fed before the object started
+        self.start = None        # offset of the object's "{" in the fed text
+        self.done = False
+
+    def feed(self, chunk: str) -> bool:
+        if self.done or not chunk:
+            return self.done
+        if self.start is None:
+            at = chunk.find("{")
+            if at == -1:
+                self._seen += len(chunk)
+                return False
+            self.start = self._seen + at
+            chunk = chunk[at:]
+
+        pos = 0
+        if self._escape:
+            self._escape = False
+            pos = 1
+        while True:
+            m = (_IN_STRING_RE[self._quote] if self._quote else _OUTSIDE_RE).search(chunk, pos)
+            if m is None:
+                break
+            ch = m.group()
+            pos = m.end()
+            if self._quote:
+                if ch == "\\":
+                    if pos == len(chunk):
+                        self._escape = True
+                        break
+                    pos += 1
+                else:
+                    self._quote = None
+            elif ch in "\"'":
+                self._quote = ch
+            elif ch in "{[":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[:pos])
+                    self.done = True
+                    return True
+        self._parts.append(chunk)
+        return False
+
+    def close(self) -> Tuple[Optional[str], bool]:
+        """(object text or None if no "{" was seen, truncated)."""
+        if self.start is None:
+            return None, False
+        return "".join(self._parts), not self.done
+
+
+def repair_json(text: str, truncated: bool = False) -> Tuple[str, List[str]]:
+    """Rewrite `text` token by token fixing the defects listed above; returns (json, fixes)."""
+    out: List[str] = []
+    stack: List[str] = []
+    fixes = set()
+    comma = False
+    cut = False   # the last token is a string the input ended in
+
+    for m in _TOKEN_RE.finditer(text):
+        tok = m.group()
+        first = tok[0]
+        if first.isspace():
+            continue
+        if tok == ",":
+            if comma or not out or out[-1] in "{[":
+                fixes.add("stray_comma")
+            else:
+                comma = True
+            continue
+        if tok in "}]":
+            if comma:
+                fixes.add("trailing_comma")
+                comma = False
+            if stack:
+                stack.pop()
+                out.append(tok)
+            continue
+        if comma:
+            out.append(",")
+            comma = False
+
+        if tok in "{[":
+            stack.append("}" if tok == "{" else "]")
+        elif first == '"':
+            if len(tok) == 1 or not tok.endswith('"') or tok.endswith('\\"') and _odd_backslashes(tok[:-1]):
+                tok = _drop_dangling_escape(tok) + '"'
+                fixes.add("truncated")
+                cut = True
+        elif first == "'":
+            closed = len(tok) > 1 and tok.endswith("'") and not _odd_backslashes(tok[:-1])
+            if not closed:
+                fixes.add("truncated")
+                cut = True
+            tok = _requote(tok[1:-1] if closed else _drop_dangling_escape(tok[1:]))
+            fixes.add("single_quotes")
+        elif tok != ":":
+            if tok in _LITERALS:
+                tok = _LITERALS[tok]
+                fixes.add("python_literal")
+            elif stack and stack[-1] == "}" and out and out[-1] in "{," and _BARE_KEY_RE.match(tok):
+                tok = json.dumps(tok)
+                fixes.add("unquoted_key")
+        out.append(tok)
+
+    if stack:
+        truncated = True
+    if truncated:
+        fixes.add("truncated")
+        # drop what cannot be completed: a dangling colon gets null, a key without value goes
+        if out and out[-1] == ":":
+            out.append("null")
+        elif len(out) >= 2 and stack and stack[-1] == "}" and out[-1][0] == '"' and out[-2] in "{,":
+            out.pop()
+            if out[-1] == ",":
+                out.pop()
+        elif cut and stack and stack[-1] == "]" and out[-1][0] == '"':
+            out.pop()
+            if out[-1] == ",":
+                out.pop()
+        out.extend(reversed(stack))
+    return "".join(out), sorted(fixes)
+
+
+def _requote(body: str) -> str:
+    """'single-quoted' string body -> "double-quoted" JSON string, other escapes kept."""
+    return '"' + _SQ_ESCAPE_RE.sub(lambda m: '\\"' if m.group(1) is None else
+                                   "'" if m.group(1) == "'" else m.group(0), body) + '"'
+
+
+def _odd_backslashes(s: str) -> bool:
+    return (len(s) - len(s.rstrip("\\"))) % 2 == 1
+
+
+def _drop_dangling_escape(s: str) -> str:
+    """A string cut off right after a lone backslash loses it; an escaped one (\\\\) stays."""
+    return s[:-1] if _odd_backslashes(s) else s
+
+
+def parse_object(text: str) -> Tuple[Optional[dict], List[str]]:
+    """First JSON object in a model response -> (dict or None, fixes applied)."""
+    if not text:
+        return None, []
+    offset = 0
+    for _ in range(MAX_CANDIDATES):
+        scanner = JsonScanner()
+        scanner.feed(text[offset:] if offset else text)
+        candidate, truncated = scanner.close()
+        if candidate is None:
+            return None, []
+        if not truncated:
+            try:
+                obj = json.loads(candidate, strict=False)
+            except ValueError:
+                pass
+            else:
+                if isinstance(obj, dict):
+                    return obj, []
+        repaired, fixes = repair_json(candidate, truncated)
+        try:
+            obj = json.loads(repaired, strict=False)
+        except ValueError:
+            obj = None
+        if isinstance(obj, dict):
+            return obj, fixes
+        offset += scanner.start + 1
+    return None, []
+
+
+def conform(obj, schema: dict) -> Tuple[Optional[dict], List[str]]:
+    """
+    Check `obj` against `schema` ({key: Field}), coercing where safe; returns
+    (obj or None if it is not an object, problems found). Unknown keys are kept.
+    """
+    if not isinstance(obj, dict):
+        return None, ["not an object"]
+    problems: List[str] = []
+    for key, field in schema.items():
+        value = obj.get(key)
+        if value is None or value == "" and field.type is list:
+            if field.default is not None:
+                obj[key] = copy.deepcopy(field.default)
+                problems.append(f"missing {key}")
+            else:
+                obj.pop(key, None)
+            continue
+        coerced = _coerce(value, field)
+        if coerced is None:
+            problems.append(f"invalid {key}")
+            if field.default is not None:
+                obj[key] = copy.deepcopy(field.default)
+            else:
+                obj.pop(key, None)
+        elif coerced is not value:
+            problems.append(f"coerced {key}")
+            obj[key] = coerced
+    return obj, problems
+
+
+def _coerce(value, field: Field):
+    if field.type is list:
+        if isinstance(value, str):
+            value = [v for v in re.split(r"[,\n]", value)]
+        elif not isinstance(value, list):
+            return None
+        if field.items is str:
+            items = [_as_str(v) for v in value]
+            items = [v.strip() for v in items if v and v.strip()]
+            return value if items == value else items
+        return value
+    if isinstance(value, field.type):
+        return value
+    if field.type is str and isinstance(value, (int, float, list)):
+        return ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+    return None
+
+
+def _as_str(value) -> Optional[str]:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        for key in ("name", "title", "id"):
+            if isinstance(value.get(key), str):
+                return value[key]
+        return None
+    if isinstance(value, (int, float)):
+        return str(value)
+    return None
@@ -0,0 +1,159 @@
+"""
+llm_cache.py — Persistent, content-addressed cache for LLM responses.
+
+- Entries live in a small SQLite database on local disk (one file per named cache).
+- Keys are SHA-256 digests over the normalized prompt plus everything that changes
+  the model output (model id, system prompt, temperature, ...), see make_key().
+- Entries expire after `ttl` seconds; once `max_entries` is exceeded the least
+  recently used entries are evicted.
+- Hit / miss / eviction counters are exposed through stats() / all_stats().
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+CACHE_DIR = os.environ.get("LLM_CACHE_DIR", "cache")
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Collapse whitespace so trivially different prompts share a key. Case is kept: the
+    cached value is generated from the prompt ("ACME Corp" vs "acme corp" in a project name).
+    """
+    return re.sub(r"\s+", " ", (text or "").strip())
+
+
+def make_key(*parts: Any) -> str:
+    blob = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed key/value cache with TTL and LRU size eviction.
+    Values must be JSON-serializable. Safe to share between threads.
+    """
+
+    def __init__(self, name: str, ttl: float = DEFAULT_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, cache_dir: str = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        cache_dir = cache_dir or CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, f"{name}.sqlite3")
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self.ttl and now - created > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._count -= 1
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        blob = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            existed = self._conn.execute(
+                "SELECT 1 FROM entries WHERE key = ?", (key,)
+            ).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, blob, now, now),
+            )
+            if not existed:
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        # Re-count first: another process may share the same database file.
+        self._count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM entries WHERE key IN "
+            "(SELECT key FROM entries ORDER BY accessed ASC LIMIT ?)",
+            (excess,),
+        )
+        self._count -= excess
+        self.evictions += excess
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._count = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": self._count,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+
+# -----------------------------
+# Process-wide registry
+# -----------------------------
+_caches: Dict[str, ResponseCache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(name: str, **kwargs) -> ResponseCache:
+    """Return the shared cache called `name`, creating it on first use."""
+    with _registry_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = ResponseCache(name, **kwargs)
+            _caches[name] = cache
+        return cache
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        caches = list(_caches.values())
+    return {c.name: c.stats() for c in caches}
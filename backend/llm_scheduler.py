@@ -0,0 +1,307 @@
+"""
+llm_scheduler.py — Process-wide admission control for LLM API calls.
+
+One LLMScheduler per provider (get_scheduler("deepseek"), get_scheduler("openrouter")),
+shared by every thread in the process:
+
+- token buckets for requests/minute and tokens/minute (refilled continuously);
+- adaptive concurrency limit (AIMD): +1/limit per fast success, x0.5 on a 429,
+  x0.9 when a call is slower than the target latency. It starts at the maximum, so a
+  single site gets one call per page right away and the limit only drops on pushback;
+- priorities: lower value goes first (the index page and requirement extraction
+  use PRIORITY_HIGH so a site's first page is never stuck behind other pages);
+- fair sharing: among waiters of equal priority the job with the fewest calls in
+  flight, then the one admitted least recently, goes first (round-robin between
+  jobs), so one 20-page site cannot starve a 3-page one.
+
+Usage:
+    with get_scheduler("deepseek").slot(job="site-123", est_tokens=4000) as ticket:
+        resp = session.post(...)
+        ticket.report(status=resp.status_code, tokens=total_tokens)
+
+Coroutines use `async with scheduler.slot_async(...)`, which waits on an asyncio future
+instead of blocking a thread.
+"""
+
+import os
+import time
+import asyncio
+import itertools
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+from telemetry import histogram
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+QUEUE_SECONDS = histogram("llm_scheduler_wait_seconds", "Time a call waited for admission.",
+                          ("provider", "priority"))
+
+
+def _env(name: str, key: str, default: float) -> float:
+    """Per-provider override (DEEPSEEK_RPM) falling back to the global one (LLM_RPM)."""
+    value = os.environ.get(f"{name.upper()}_{key}", os.environ.get(f"LLM_{key}"))
+    return float(value) if value else default
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a call could not be admitted within the requested timeout."""
+
+
+class Ticket:
+    __slots__ = ("job", "priority", "est_tokens", "seq", "event", "granted", "granted_at",
+                 "enqueued_at", "status", "tokens", "on_grant")
+
+    def __init__(self, job, priority: int, est_tokens: int, seq: int):
+        self.job = job
+        self.priority = priority
+        self.est_tokens = est_tokens
+        self.seq = seq
+        self.event = threading.Event()
+        self.granted = False
+        self.granted_at = None
+        self.enqueued_at = time.monotonic()
+        self.status = None
+        self.tokens = None
+        self.on_grant = None  # optional callback, e.g. to wake an asyncio waiter
+
+    def report(self, status: int = None, tokens: int = None) -> None:
+        """Record the outcome of the call; used by release() for AIMD and token accounting."""
+        if status is not None:
+            self.status = status
+        if tokens is not None:
+            self.tokens = tokens
+
+
+class LLMScheduler:
+    def __init__(self, name: str, rpm: float = None, tpm: float = None,
+                 initial_concurrency: float = None, min_concurrency: float = None,
+                 max_concurrency: float = None, target_latency: float = None):
+        self.name = name
+        self.rpm = rpm or _env(name, "RPM", 60)
+        self.tpm = tpm or _env(name, "TPM", 300000)
+        self.min_concurrency = min_concurrency or _env(name, "MIN_CONCURRENCY", 1)
+        self.max_concurrency = max_concurrency or _env(name, "MAX_CONCURRENCY", 16)
+        self.limit = initial_concurrency or _env(name, "INITIAL_CONCURRENCY", self.max_concurrency)
+        self.target_latency = target_latency or _env(name, "TARGET_LATENCY", 90)
+
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._inflight = 0
+        self._inflight_by_job: Dict[object, int] = {}
+        self._last_admit: Dict[object, int] = {}
+        self._req_tokens = self.rpm
+        self._tok_tokens = self.tpm
+        self._refilled_at = time.monotonic()
+
+        self.admitted = 0
+        self.throttled = 0
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def enqueue(self, job=None, priority: int = PRIORITY_NORMAL, est_tokens: int = 0,
+                on_grant=None) -> Ticket:
+        """
+        Register a waiter without blocking; the ticket's event is set (and on_grant called,
+        with the scheduler lock held) once it is admitted.
+        """
+        with self._lock:
+            ticket = Ticket(job, priority, min(int(est_tokens), int(self.tpm)), next(self._seq))
+            ticket.on_grant = on_grant
+            if ticket.job is None:
+                ticket.job = ("anon", ticket.seq)
+            self._waiting.append(ticket)
+            self._dispatch_locked()
+        return ticket
+
+    def poll(self, ticket: Ticket) -> float:
+        """Retry admission; return how long to wait before polling again (0 once granted)."""
+        with self._lock:
+            if not ticket.granted:
+                self._dispatch_locked()
+            if ticket.granted:
+                return 0.0
+            return self._refill_wait_locked(ticket)
+
+    def cancel(self, ticket: Ticket) -> None:
+        with self._lock:
+            if ticket.granted:
+                return
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+            self._dispatch_locked()
+
+    def acquire(self, job=None, priority: int = PRIORITY_NORMAL, est_tokens: int = 0,
+                timeout: float = None) -> Ticket:
+        ticket = self.enqueue(job, priority, est_tokens)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.poll(ticket)
+            if not wait:
+                return ticket
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.cancel(ticket)
+                    if ticket.granted:
+                        return ticket
+                    raise SchedulerTimeout(f"{self.name}: no slot within {timeout}s")
+                wait = min(wait, remaining)
+            ticket.event.wait(wait)
+
+    def release(self, ticket: Ticket) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._inflight -= 1
+            left = self._inflight_by_job.get(ticket.job, 1) - 1
+            if left > 0:
+                self._inflight_by_job[ticket.job] = left
+            else:
+                self._inflight_by_job.pop(ticket.job, None)
+
+            # correct the token estimate with actual usage (bucket may go into debt)
+            if ticket.tokens is not None:
+                self._tok_tokens -= ticket.tokens - ticket.est_tokens
+
+            latency = now - ticket.granted_at
+            if ticket.status == 429:
+                self.limit = max(self.min_concurrency, self.limit * 0.5)
+                self.throttled += 1
+            elif ticket.status is not None and ticket.status < 400:
+                if latency > self.target_latency:
+                    self.limit = max(self.min_concurrency, self.limit * 0.9)
+                else:
+                    self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self._dispatch_locked()
+            if len(self._last_admit) > 1024:
+                self._prune_locked()
+
+    @contextmanager
+    def slot(self, job=None, priority: int = PRIORITY_NORMAL, est_tokens: int = 0,
+             timeout: float = None):
+        ticket = self.acquire(job, priority, est_tokens, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    async def acquire_async(self, job=None, priority: int = PRIORITY_NORMAL, est_tokens: int = 0) -> Ticket:
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        ticket = self.enqueue(job, priority, est_tokens, on_grant=wake)
+        try:
+            while True:
+                wait = self.poll(ticket)
+                if not wait:
+                    return ticket
+                try:
+                    await asyncio.wait_for(asyncio.shield(granted), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            self.cancel(ticket)
+            if ticket.granted:
+                self.release(ticket)
+            raise
+
+    @asynccontextmanager
+    async def slot_async(self, job=None, priority: int = PRIORITY_NORMAL, est_tokens: int = 0):
+        ticket = await self.acquire_async(job, priority, est_tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            self._refill_locked()
+            return {
+                "limit": round(self.limit, 2),
+                "inflight": self._inflight,
+                "waiting": len(self._waiting),
+                "jobs": len(self._inflight_by_job),
+                "request_budget": round(self._req_tokens, 2),
+                "token_budget": round(self._tok_tokens),
+                "admitted": self.admitted,
+                "throttled": self.throttled,
+            }
+
+    # -----------------------------
+    # Internals (call with _lock held)
+    # -----------------------------
+    def _refill_locked(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._req_tokens = min(self.rpm, self._req_tokens + elapsed * self.rpm / 60.0)
+        self._tok_tokens = min(self.tpm, self._tok_tokens + elapsed * self.tpm / 60.0)
+
+    def _refill_wait_locked(self, ticket: Ticket) -> float:
+        """Seconds until the buckets could cover `ticket`, capped so waiters re-check often."""
+        need_req = max(0.0, 1 - self._req_tokens) * 60.0 / self.rpm
+        need_tok = max(0.0, ticket.est_tokens - self._tok_tokens) * 60.0 / self.tpm
+        return min(max(need_req, need_tok, 0.05), 1.0)
+
+    def _prune_locked(self) -> None:
+        active = set(self._inflight_by_job) | {t.job for t in self._waiting}
+        self._last_admit = {job: n for job, n in self._last_admit.items() if job in active}
+
+    def _dispatch_locked(self) -> None:
+        self._refill_locked()
+        while self._waiting and self._inflight < int(self.limit):
+            ticket = min(
+                self._waiting,
+                key=lambda t: (t.priority, self._inflight_by_job.get(t.job, 0),
+                               self._last_admit.get(t.job, -1), t.seq),
+            )
+            if self._req_tokens < 1 or self._tok_tokens < ticket.est_tokens:
+                return
+            self._waiting.remove(ticket)
+            self._req_tokens -= 1
+            self._tok_tokens -= ticket.est_tokens
+            self._inflight += 1
+            self._inflight_by_job[ticket.job] = self._inflight_by_job.get(ticket.job, 0) + 1
+            self._last_admit[ticket.job] = self.admitted
+            self.admitted += 1
+            ticket.granted = True
+            ticket.granted_at = time.monotonic()
+            QUEUE_SECONDS.observe(ticket.granted_at - ticket.enqueued_at, provider=self.name,
+                                  priority=ticket.priority)
+            ticket.event.set()
+            if ticket.on_grant:
+                ticket.on_grant()
+
+
+# -----------------------------
+# Process-wide registry
+# -----------------------------
+_schedulers: Dict[str, LLMScheduler] = {}
+_registry_lock = threading.Lock()
+
+
+def get_scheduler(name: str) -> LLMScheduler:
+    with _registry_lock:
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            scheduler = LLMScheduler(name)
+            _schedulers[name] = scheduler
+        return scheduler
+
+
+def all_stats() -> Dict[str, Dict[str, object]]:
+    with _registry_lock:
+        schedulers = list(_schedulers.values())
+    return {s.name: s.stats() for s in schedulers}
+
+
+def estimate_tokens(messages: list, max_tokens: int = 0) -> int:
+    """Rough pre-call estimate: ~4 characters per prompt token plus half the output budget."""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // 4 + max_tokens // 2
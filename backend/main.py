@@ -2,15 +2,72 @@
 import os
 import json
 import re
+import queue
+import threading
+import time
+import uuid
 import traceback
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from requirement_agent import enhance_requirements
-from website_agent import generate_website_parallel
-from auto_deploy import deploy
+from requirement_agent import enhance_requirements, enhance_requirements_async
+from website_agent import GenerationCancelled, iter_website_pages, iter_website_pages_async
+from generation_journal import get_journal
+from auto_deploy import deploy, start_deploy
+from deploy_tracker import get_tracker, verify_webhook_signature
+from llm_cache import all_stats, make_key, normalize_prompt
+from llm_scheduler import all_stats as scheduler_stats
+from jobs import QueueFull, get_backend
+from singleflight import Group, all_stats as flight_stats
+from workspaces import workspace_path
+from site_artifact import recall
+from site_http import file_response, manifest_response, site_artifact
+from async_engine import get_engine
+import telemetry
+from telemetry import bind, span
+
+# "threads" (default): thread pool per site; "async": one shared event loop + pooled HTTP/2 client
+GENERATION_ENGINE = os.environ.get("GENERATION_ENGINE", "threads")
+# pages that fail are regenerated in the background up to RESUME_RETRIES times,
+# RESUME_BACKOFF seconds after the generation (doubling per retry)
+RESUME_RETRIES = int(os.environ.get("RESUME_RETRIES", 2))
+RESUME_BACKOFF = float(os.environ.get("RESUME_BACKOFF", 5))
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["ETag"])   # the preview revalidates /sites files with If-None-Match
+
+HTTP_SECONDS = telemetry.histogram("http_request_duration_seconds", "Flask request latency by route.",
+                                   ("method", "route", "status"))
+
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _observe_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # streamed responses are timed until their headers go out, not until the stream ends
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method, route=route,
+                             status=response.status_code)
+    return response
+
+
+def _runtime_gauges():
+    for provider, stats in scheduler_stats().items():
+        for key in ("limit", "inflight", "waiting", "throttled"):
+            yield f"llm_scheduler_{key}", f"llm_scheduler stats() '{key}'.", {"provider": provider}, stats[key]
+    for cache, stats in all_stats().items():
+        for key in ("entries", "hits", "misses", "evictions"):
+            yield f"llm_cache_{key}", f"llm_cache stats() '{key}'.", {"cache": cache}, stats.get(key)
+    for group, inflight in flight_stats().items():
+        yield "singleflight_inflight", "Coalesced calls in flight.", {"group": group}, inflight
+    yield "threads", "Live Python threads.", {}, threading.active_count()
+
+
+telemetry.register_collector(_runtime_gauges)
 
 
 def _safe_project_name(enhanced):
@@ -29,6 +86,145 @@ def _safe_project_name(enhanced):
     return name[:80]
 
 
+def _new_workspace(enhanced):
+    """
+    A workspace of its own for one generation: "<project>-<random id>". Two users whose
+    requirements get the same project name must not write, publish or GC each other's
+    site; the project name is only a label.
+    """
+    return f"{_safe_project_name(enhanced)[:64]}-{uuid.uuid4().hex[:10]}"
+
+
+def _normalize_enhanced(enhanced):
+    # normalize if string
+    if isinstance(enhanced, str):
+        try:
+            enhanced = json.loads(enhanced)
+        except Exception:
+            enhanced = {"project": "AutoProject", "pages": ["Home"], "features": [], "style": "modern", "notes": enhanced}
+    return enhanced
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _page_events_with_deltas(enhanced, workspace, cancelled):
+    """
+    Run iter_website_pages on a helper thread with token streaming enabled and merge its
+    page events with {"type": "delta"} events from the workers into one iterator.
+    Setting `cancelled` aborts the in-flight page streams.
+    """
+    events = queue.Queue()
+
+    def on_delta(idx, page, chunk):
+        if cancelled.is_set():
+            raise GenerationCancelled("client went away")
+        events.put({"type": "delta", "index": idx, "page": page, "delta": chunk})
+
+    def run():
+        try:
+            for event in iter_website_pages(enhanced, on_delta=on_delta, workspace=workspace):
+                events.put(event)
+        except Exception as e:
+            events.put({"type": "fatal", "error": str(e)})
+        finally:
+            events.put(None)
+
+    threading.Thread(target=bind(run), daemon=True).start()
+    for event in iter(events.get, None):
+        if event["type"] == "fatal":
+            raise RuntimeError(event["error"])
+        yield event
+
+
+_pipelines = Group("submit")
+
+
+def _run_submit_pipeline(user_prompt, workspace=None):
+    """
+    enhance_requirements + page generation into generated_site/<workspace>
+    (default: a new one per generation, see _new_workspace); returns
+    (enhanced, workspace, {filename: html}, generation).
+    Identical requests (same normalized requirement and workspace) arriving while one is
+    running attach to it and get its result instead of generating the site again.
+    """
+    key = make_key(normalize_prompt(user_prompt), workspace)
+    result, shared = _pipelines.do(key, _generate_site, user_prompt, workspace)
+    if shared:
+        print("[main] Attached to an identical submit already in flight")
+    return result
+
+
+def _generate_site(user_prompt, workspace=None):
+    if GENERATION_ENGINE == "async":
+        return get_engine().run(_run_submit_pipeline_async(user_prompt, workspace))
+
+    with span("submit", engine="threads") as submit_span:
+        enhanced = _normalize_enhanced(enhance_requirements(user_prompt))
+
+        workspace = workspace or _new_workspace(enhanced)
+        submit_span.set(workspace=workspace)
+
+        # pages come straight from the workers; no need to re-read them from disk
+        html_files, done = {}, None
+        for event in iter_website_pages(enhanced, workspace=workspace):
+            if event["type"] == "page":
+                html_files[event["filename"]] = event["html"]
+            elif event["type"] == "done":
+                done = event
+        _retry_failed_pages(done)
+        return enhanced, workspace, html_files, done["generation"]
+
+
+async def _run_submit_pipeline_async(user_prompt, workspace=None):
+    client = get_engine().client
+    # runs as a task on the engine loop, so this is the root span of its own trace
+    with span("submit", engine="async") as submit_span:
+        enhanced = _normalize_enhanced(await enhance_requirements_async(user_prompt, client))
+        workspace = workspace or _new_workspace(enhanced)
+        submit_span.set(workspace=workspace)
+
+        html_files, done = {}, None
+        async for event in iter_website_pages_async(enhanced, client, workspace=workspace):
+            if event["type"] == "page":
+                html_files[event["filename"]] = event["html"]
+            elif event["type"] == "done":
+                done = event
+        _retry_failed_pages(done)
+        return enhanced, workspace, html_files, done["generation"]
+
+
+def _retry_failed_pages(done, attempt=0):
+    """Queue a background resume of a generation that has failed pages (bounded by RESUME_RETRIES)."""
+    if not done or not done["failed"] or attempt >= RESUME_RETRIES:
+        return
+    delay = RESUME_BACKOFF * (2 ** attempt)
+    print(f"[main] {len(done['failed'])} page(s) of {done['generation']} failed; resuming in {delay:g}s")
+    timer = threading.Timer(delay, _enqueue_resume, (done["generation"], attempt + 1))
+    timer.daemon = True
+    timer.start()
+
+
+def _enqueue_resume(generation, attempt):
+    try:
+        jobs.submit("resume", {"generation": generation, "attempt": attempt},
+                    dedupe_key=make_key("resume", generation))
+    except QueueFull as e:
+        print(f"[main] Could not queue the resume of {generation}: {e}")
+
+
+async def _resume_async(generation, record):
+    html_files, done = {}, None
+    async for event in iter_website_pages_async(record["request"], get_engine().client,
+                                                workspace=record["workspace"], resume=generation):
+        if event["type"] == "page":
+            html_files[event["filename"]] = event["html"]
+        elif event["type"] == "done":
+            done = event
+    return html_files, done
+
+
 @app.route("/submit", methods=["POST"])
 def submit():
     try:
@@ -37,29 +233,14 @@ def submit():
         if not user_prompt:
             return jsonify({"error": "Missing 'requirement' in JSON body"}), 400
 
-        enhanced = enhance_requirements(user_prompt)
-        # normalize if string
-        if isinstance(enhanced, str):
-            try:
-                enhanced = json.loads(enhanced)
-            except Exception:
-                enhanced = {"project": "AutoProject", "pages": ["Home"], "features": [], "style": "modern", "notes": enhanced}
+        enhanced, workspace, html_files, generation = _run_submit_pipeline(user_prompt)
 
-        project_name = _safe_project_name(enhanced)
-        
-        saved_files = generate_website_parallel(enhanced) #generate_website(enhanced)
-        
-        if saved_files:
-            
-            folder_path = "generated_site/site"
-            html_files = {}
-
-            for file_name in os.listdir(folder_path):
-                if file_name.endswith(".html"):
-                    with open(os.path.join(folder_path, file_name), "r", encoding="utf-8") as f:
-                        html_files[file_name] = f.read()
-
-            return jsonify({"files": html_files})
+        if html_files:
+            if request.args.get("inline") in ("0", "false"):
+                # pages are fetched (and revalidated) one by one from /sites/<site>/<file>
+                html_files = {name: f"/sites/{workspace}/{name}" for name in html_files}
+            return jsonify({"site": workspace, "project": _safe_project_name(enhanced),
+                            "manifest": f"/sites/{workspace}", "files": html_files, "generation": generation})
         
                
         return jsonify({
@@ -73,17 +254,256 @@ def submit():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/submit/stream", methods=["POST"])
+def submit_stream():
+    """
+    Server-Sent Events variant of /submit. Emits, in order:
+      requirements — the enhanced requirements JSON, as soon as it is available
+      delta        — {index, page, delta} raw token chunks, only with ?partial=1
+      page         — {index, page, filename, html} for each page as soon as it is generated;
+                     with ?inline=0 {index, page, filename, url} instead; the URL serves
+                     the page (ETag, br/gzip) from the moment the event is sent
+      page_error   — {index, page, error} for pages whose worker failed
+      done         — {site, project, manifest, files: [filenames], generation, failed: [indices]};
+                     pass `site` (the generation's own workspace) to /deploy; failed pages are retried in the background
+      error        — {error} if the pipeline itself failed
+    """
+    data = request.get_json(force=True)
+    user_prompt = data.get("requirement")
+    if not user_prompt:
+        return jsonify({"error": "Missing 'requirement' in JSON body"}), 400
+    partial = request.args.get("partial") in ("1", "true")
+    inline = request.args.get("inline") not in ("0", "false")
+
+    def events():
+        cancelled = threading.Event()
+        try:
+            with span("submit", engine="threads", stream=True):
+                enhanced = _normalize_enhanced(enhance_requirements(user_prompt))
+                yield _sse("requirements", enhanced)
+                workspace = _new_workspace(enhanced)
+
+                filenames, done = [], None
+                if partial:
+                    source = _page_events_with_deltas(enhanced, workspace, cancelled)
+                else:
+                    source = iter_website_pages(enhanced, workspace=workspace)
+                for event in source:
+                    if event["type"] == "delta":
+                        yield _sse("delta", {k: event[k] for k in ("index", "page", "delta")})
+                    elif event["type"] == "page":
+                        filenames.append(event["filename"])
+                        page_event = {k: event[k] for k in ("index", "page", "filename")}
+                        if inline:
+                            page_event["html"] = event["html"]
+                        else:
+                            page_event["url"] = f"/sites/{workspace}/{event['filename']}"
+                        yield _sse("page", page_event)
+                    elif event["type"] == "error":
+                        yield _sse("page_error", {k: event[k] for k in ("index", "page", "error")})
+                    elif event["type"] == "done":
+                        done = event
+                _retry_failed_pages(done)
+                yield _sse("done", {"site": workspace, "project": _safe_project_name(enhanced),
+                                    "manifest": f"/sites/{workspace}", "files": filenames,
+                                    "generation": done["generation"], "failed": done["failed"]})
+        except Exception as e:
+            print("[main] Exception:", e)
+            print(traceback.format_exc())
+            yield _sse("error", {"error": str(e)})
+        finally:
+            # client disconnected (or we finished): stop any page still streaming
+            cancelled.set()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(events(), mimetype="text/event-stream", headers=headers)
+
+
 @app.route("/", methods=["GET"])
 def home():
     return jsonify({"message": "Website generator backend running"}), 200
 
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(all_stats()), 200
+
+def _site_dir(data):
+    """generated_site/<site> for the `site` returned by /submit; None means the latest site."""
+    site = (data or {}).get("site")
+    return workspace_path(site) if site else None
+
+
+def _site_artifact(data):
+    """The in-memory artifact of `site` (None: the latest one) if this process generated it."""
+    return recall((data or {}).get("site"))
+
+
+@app.route("/sites/<site>", methods=["GET"])
+def site_manifest(site):
+    """Files of a generated site with their ETags (see site_http)."""
+    artifact = site_artifact(site)
+    if artifact is None:
+        return jsonify({"error": "Unknown site"}), 404
+    return manifest_response(artifact, site, request.headers)
+
+
+@app.route("/sites/<site>/", defaults={"path": ""}, methods=["GET"])
+@app.route("/sites/<site>/<path:path>", methods=["GET"])
+def site_file(site, path):
+    """One file of a generated site: ETag / If-None-Match, br/gzip from precompressed variants."""
+    artifact = site_artifact(site)
+    if artifact is None:
+        return jsonify({"error": "Unknown site"}), 404
+    return file_response(artifact, path, request.headers)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(telemetry.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/traces", methods=["GET"])
+def traces():
+    """Recent finished spans (?trace_id=...&limit=...); ?format=chrome for chrome://tracing / Perfetto."""
+    limit = request.args.get("limit", 1000, type=int)   # not a number: the default
+    limit = min(max(limit, 1), telemetry.SPAN_BUFFER)
+    spans = telemetry.recent_spans(request.args.get("trace_id"), limit)
+    if request.args.get("format") == "chrome":
+        return jsonify(telemetry.chrome_trace(spans)), 200
+    return jsonify(spans), 200
+
+
+@app.route("/scheduler/stats", methods=["GET"])
+def llm_scheduler_stats():
+    return jsonify(scheduler_stats()), 200
+
 @app.route("/deploy", methods=["POST"])
 def deployment():
-    
-    deployed_url = deploy()
+    data = request.get_json(force=True, silent=True)
+    deployed_url = deploy(_site_dir(data), artifact=_site_artifact(data))
     return jsonify({"url": deployed_url})
 
 
+@app.route("/deploys/<commit_sha>", methods=["GET"])
+def deploy_status(commit_sha):
+    tracker = get_tracker()
+    status = tracker.status(commit_sha) if tracker else None
+    if status is None:
+        return jsonify({"error": "Unknown deploy"}), 404
+    return jsonify(status), 200
+
+
+@app.route("/netlify/webhook", methods=["POST"])
+def netlify_webhook():
+    """Netlify deploy notification (deploy succeeded / failed) for the configured site."""
+    if not verify_webhook_signature(request.get_data(), request.headers.get("X-Webhook-Signature")):
+        return jsonify({"error": "Invalid signature"}), 401
+    tracker = get_tracker()
+    payload = request.get_json(force=True, silent=True) or {}
+    matched = tracker.notify(payload) if tracker else False
+    return jsonify({"matched": matched}), 200
+
+
+# -----------------------------
+# Background jobs
+# -----------------------------
+def _submit_job(job_id, payload):
+    enhanced, workspace, html_files, generation = _run_submit_pipeline(payload["requirement"], workspace=job_id)
+    return {"requirements": enhanced, "site": workspace, "files": html_files, "generation": generation}
+
+
+def _resume_job(job_id, payload):
+    """Regenerate the pages of a generation that are not done (see generation_journal)."""
+    generation = payload["generation"]
+    record = get_journal().get(generation)
+    if record is None:
+        raise RuntimeError(f"Unknown generation '{generation}'")
+    with span("resume", generation=generation, attempt=payload.get("attempt", 0)):
+        if GENERATION_ENGINE == "async":
+            html_files, done = get_engine().run(_resume_async(generation, record))
+        else:
+            html_files, done = {}, None
+            for event in iter_website_pages(record["request"], workspace=record["workspace"], resume=generation):
+                if event["type"] == "page":
+                    html_files[event["filename"]] = event["html"]
+                elif event["type"] == "done":
+                    done = event
+    _retry_failed_pages(done, payload.get("attempt", 0))
+    return {"site": done["workspace"], "generation": generation, "files": html_files, "failed": done["failed"]}
+
+
+def _deploy_job(job_id, payload):
+    # returns once the build is triggered; completion is tracked at /deploys/<commit_sha>
+    started = start_deploy(_site_dir(payload), _site_artifact(payload))
+    if not started:
+        raise RuntimeError("Deploy failed to start")
+    commit_sha, _ = started
+    return {"commit_sha": commit_sha, "status_url": f"/deploys/{commit_sha}"}
+
+
+jobs = get_backend()
+jobs.register("submit", _submit_job)
+jobs.register("deploy", _deploy_job)
+jobs.register("resume", _resume_job)
+
+
+def _enqueue(kind, payload=None, dedupe_key=None):
+    try:
+        job_id = jobs.submit(kind, payload, dedupe_key=dedupe_key)
+    except QueueFull as e:
+        resp = jsonify({"error": f"Server busy: {e}"})
+        resp.headers["Retry-After"] = "10"
+        return resp, 429
+    return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+
+@app.route("/jobs/submit", methods=["POST"])
+def submit_job():
+    data = request.get_json(force=True)
+    user_prompt = data.get("requirement")
+    if not user_prompt:
+        return jsonify({"error": "Missing 'requirement' in JSON body"}), 400
+    # an identical submit already queued or running is returned instead of a new job
+    return _enqueue("submit", {"requirement": user_prompt},
+                    dedupe_key=make_key("submit", normalize_prompt(user_prompt)))
+
+
+@app.route("/jobs/deploy", methods=["POST"])
+def deploy_job():
+    data = request.get_json(force=True, silent=True) or {}
+    return _enqueue("deploy", {"site": data.get("site")})
+
+
+@app.route("/generations/<generation>", methods=["GET"])
+def generation_status(generation):
+    """Journal of a generation: status and per-page state (pending / running / done / failed)."""
+    record = get_journal().get(generation)
+    if record is None:
+        return jsonify({"error": "Unknown generation"}), 404
+    return jsonify(record), 200
+
+
+@app.route("/generations/<generation>/resume", methods=["POST"])
+def resume_generation(generation):
+    """Regenerate only the missing or failed pages of a generation, as a background job."""
+    if get_journal().get(generation) is None:
+        return jsonify({"error": "Unknown generation"}), 404
+    return _enqueue("resume", {"generation": generation}, dedupe_key=make_key("resume", generation))
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job), 200
+
+
+@app.route("/jobs", methods=["GET"])
+def job_stats():
+    return jsonify(jobs.stats()), 200
+
+
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
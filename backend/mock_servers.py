@@ -0,0 +1,386 @@
+"""
+mock_servers.py — Local stand-ins for the external APIs the backend talks to.
+
+Each server binds to 127.0.0.1 on a free port, runs on a daemon thread and can be used
+as a context manager:
+
+    with FakeChatCompletionsServer(content="<html>...</html>") as srv:
+        website_agent.DEEPSEEK_BASE_URL = srv.url
+        ...
+
+Every server records the decoded JSON bodies it received in `.requests`, and accepts
+`latency` (seconds, or a spec for latency_sampler()) plus `rate_limit` (probability of
+answering 429 with Retry-After: `retry_after`) for load testing (see benchmark.py).
+"""
+
+import json
+import math
+import time
+import random
+import base64
+import hashlib
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _dispatch(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            body = raw
+        owner = self.server.owner
+        owner._record(method, self.path, body)
+        if owner._simulate(self):
+            return
+        owner.handle(self, method, self.path, body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def latency_sampler(spec: Union[str, float, Callable[[], float], None]) -> Callable[[], float]:
+    """
+    Build a latency function from a spec:
+      0.2 / "fixed:0.2"        — constant seconds
+      "uniform:0.1,0.5"        — uniform between the bounds
+      "lognormal:0.5,0.4"      — median 0.5s, sigma 0.4 (long right tail, like LLM APIs)
+      "exp:0.3"                — exponential with mean 0.3s
+    """
+    if spec is None:
+        return lambda: 0.0
+    if callable(spec):
+        return spec
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+    kind, _, args = str(spec).partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    values = [float(v) for v in args.split(",")]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1.0 / values[0])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class MockServer:
+    """Base class: subclasses implement handle(handler, method, path, body)."""
+
+    def __init__(self, latency=None, rate_limit: float = 0.0, retry_after: float = 0):
+        self.latency = latency_sampler(latency)
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.throttled = 0
+        self.requests: List[Tuple[str, str, object]] = []
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockServer":
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _record(self, method: str, path: str, body) -> None:
+        with self._lock:
+            self.requests.append((method, path, body))
+
+    def _simulate(self, handler: BaseHTTPRequestHandler) -> bool:
+        """Apply the configured latency; return True if a 429 was injected instead of a response."""
+        delay = self.latency()
+        if delay > 0:
+            time.sleep(delay)
+        if self.rate_limit and random.random() < self.rate_limit:
+            with self._lock:
+                self.throttled += 1
+            data = b'{"error": {"message": "Rate limit exceeded (injected)"}}'
+            handler.send_response(429)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Retry-After", str(self.retry_after))
+            handler.send_header("Content-Length", str(len(data)))
+            handler.end_headers()
+            handler.wfile.write(data)
+            return True
+        return False
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str, path: str, body) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def send_json(handler: BaseHTTPRequestHandler, status: int, payload) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+class FakeChatCompletionsServer(MockServer):
+    """
+    OpenAI-compatible POST /chat/completions (DeepSeek / OpenRouter shape).
+    `content` may be a string or a function of the request body. `response_bytes` pads
+    the content with filler markup up to that size. Honours `stream: true` by sending the
+    content as SSE deltas of `chunk_size` characters, `chunk_delay` seconds apart,
+    followed by a chunk carrying the finish_reason and `data: [DONE]`. Content longer
+    than the request's max_tokens (~4 characters per token) is cut off there with
+    finish_reason "length".
+    """
+
+    def __init__(self, content: Union[str, Callable[[dict], str]] = "<!DOCTYPE html><html><head></head><body></body></html>",
+                 chunk_size: int = 32, delay: float = 0.0, chunk_delay: float = 0.0,
+                 response_bytes: int = 0, **kwargs):
+        super().__init__(latency=kwargs.pop("latency", delay or None), **kwargs)
+        self.content = content
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.response_bytes = response_bytes
+
+    def _content_for(self, body: dict) -> str:
+        content = self.content(body) if callable(self.content) else self.content
+        missing = self.response_bytes - len(content.encode("utf-8"))
+        if missing > 0:
+            filler = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n"
+            content += filler * (missing // len(filler) + 1)
+        return content
+
+    def handle(self, handler, method, path, body):
+        if method != "POST" or not path.endswith("/chat/completions"):
+            return self.send_json(handler, 404, {"error": "not found"})
+        model = (body or {}).get("model", "fake")
+        content = self._content_for(body or {})
+        finish_reason = "stop"
+        max_tokens = (body or {}).get("max_tokens")
+        if max_tokens and len(content) > max_tokens * 4:
+            content, finish_reason = content[:max_tokens * 4], "length"
+        if not (body or {}).get("stream"):
+            prompt_tokens = sum(len(m.get("content") or "") for m in (body or {}).get("messages", [])) // 4
+            completion_tokens = len(content) // 4
+            return self.send_json(handler, 200, {
+                "id": "fake", "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": finish_reason}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+        try:
+            for i in range(0, len(content), self.chunk_size):
+                chunk = {"id": "fake", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": content[i:i + self.chunk_size]},
+                                      "finish_reason": None}]}
+                handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                handler.wfile.flush()
+                if self.chunk_delay:
+                    time.sleep(self.chunk_delay)
+            final = {"id": "fake", "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+            handler.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            handler.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client cancelled the stream
+
+
+class FakeGitHubServer(MockServer):
+    """
+    In-memory git data API for one repo (any owner/name) under /repos/<owner>/<repo>/git/...:
+    refs (GET/PATCH), commits, trees (recursive listing) and blobs (GET/POST).
+    Blob SHAs are real git object ids, so unchanged-file diffing behaves as on GitHub.
+    Use `url` as GITHUB_API_URL; `heads` maps branch -> commit sha.
+    """
+
+    def __init__(self, branch: str = "main", **kwargs):
+        super().__init__(**kwargs)
+        self.blobs: Dict[str, bytes] = {}
+        self.trees: Dict[str, Dict[str, str]] = {}
+        self.commits: Dict[str, dict] = {}
+        empty_tree = self._put_tree({})
+        root = self._put_commit({"message": "initial", "tree": empty_tree, "parents": []})
+        self.heads: Dict[str, str] = {branch: root}
+
+    @staticmethod
+    def _sha(data: bytes) -> str:
+        return hashlib.sha1(data).hexdigest()
+
+    def _put_tree(self, entries: Dict[str, str]) -> str:
+        sha = self._sha(json.dumps(sorted(entries.items())).encode("utf-8"))
+        self.trees[sha] = entries
+        return sha
+
+    def _put_commit(self, commit: dict) -> str:
+        sha = self._sha(json.dumps(commit, sort_keys=True).encode("utf-8") + str(time.time()).encode())
+        self.commits[sha] = commit
+        return sha
+
+    def handle(self, handler, method, path, body):
+        path = path.split("?", 1)[0]
+        parts = path.strip("/").split("/")
+        if len(parts) < 5 or parts[0] != "repos" or parts[3] != "git":
+            return self.send_json(handler, 404, {"message": "Not Found"})
+        kind, rest = parts[4], "/".join(parts[5:])
+        body = body if isinstance(body, dict) else {}
+
+        with self._lock:
+            status, payload = self._route(method, kind, rest, body)
+        return self.send_json(handler, status, payload)
+
+    def _route(self, method: str, kind: str, rest: str, body: dict) -> Tuple[int, object]:
+        if kind == "refs" and rest.startswith("heads/"):
+            branch = rest[len("heads/"):]
+            if method == "PATCH":
+                self.heads[branch] = body["sha"]
+            if branch not in self.heads:
+                return 404, {"message": "Not Found"}
+            return 200, {"ref": f"refs/{rest}", "object": {"sha": self.heads[branch], "type": "commit"}}
+
+        if kind == "commits":
+            if method == "POST":
+                sha = self._put_commit({"message": body.get("message"), "tree": body["tree"],
+                                        "parents": body.get("parents", [])})
+                return 201, {"sha": sha, "tree": {"sha": body["tree"]}}
+            commit = self.commits.get(rest)
+            if commit is None:
+                return 404, {"message": "Not Found"}
+            return 200, {"sha": rest, "tree": {"sha": commit["tree"]}, "message": commit["message"]}
+
+        if kind == "trees":
+            if method == "POST":
+                entries = dict(self.trees.get(body.get("base_tree"), {}))
+                for item in body.get("tree", []):
+                    if item.get("sha") is None:
+                        entries.pop(item["path"], None)
+                    else:
+                        entries[item["path"]] = item["sha"]
+                return 201, {"sha": self._put_tree(entries)}
+            entries = self.trees.get(rest)
+            if entries is None:
+                return 404, {"message": "Not Found"}
+            listing = [{"path": p, "mode": "100644", "type": "blob", "sha": sha}
+                       for p, sha in sorted(entries.items())]
+            return 200, {"sha": rest, "tree": listing, "truncated": False}
+
+        if kind == "blobs":
+            if method == "POST":
+                content = base64.b64decode(body.get("content", ""))
+                sha = self._sha(b"blob %d\0" % len(content) + content)
+                self.blobs[sha] = content
+                return 201, {"sha": sha}
+            content = self.blobs.get(rest)
+            if content is None:
+                return 404, {"message": "Not Found"}
+            return 200, {"sha": rest, "encoding": "base64", "content": base64.b64encode(content).decode()}
+
+        return 404, {"message": "Not Found"}
+
+
+class FakeNetlifyServer(MockServer):
+    """
+    Netlify build hook + deploys API:
+
+    - POST /build_hooks/<id> starts a deploy of `head_commit` (state "building", ready
+      after `build_time` seconds; "error" instead if `fail` is set);
+    - GET /api/v1/sites/<site_id>/deploys lists deploys newest first;
+    - if `webhook_url` is set, a deploy notification is POSTed there when a build finishes.
+
+    Point NETLIFY_HOOK_URL at `url + "/build_hooks/x"` and NETLIFY_API_URL at `api_url`.
+    """
+
+    def __init__(self, head_commit: Union[str, Callable[[], str]] = None, build_time: float = 0.5,
+                 webhook_url: str = None, fail: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.head_commit = head_commit
+        self.build_time = build_time
+        self.webhook_url = webhook_url
+        self.fail = fail
+        self.deploys: List[dict] = []
+
+    @property
+    def api_url(self) -> str:
+        return self.url + "/api/v1"
+
+    def start_deploy(self, commit_sha: str = None) -> dict:
+        if commit_sha is None:
+            commit_sha = self.head_commit() if callable(self.head_commit) else self.head_commit
+        with self._lock:
+            deploy = {
+                "id": f"deploy-{len(self.deploys) + 1}",
+                "commit_ref": commit_sha,
+                "state": "building",
+                "deploy_url": f"https://deploy-{len(self.deploys) + 1}--fake.netlify.app",
+                "deploy_ssl_url": f"https://deploy-{len(self.deploys) + 1}--fake.netlify.app",
+                "error_message": None,
+            }
+            self.deploys.insert(0, deploy)
+        timer = threading.Timer(self.build_time, self._finish, args=(deploy,))
+        timer.daemon = True
+        timer.start()
+        return deploy
+
+    def _finish(self, deploy: dict) -> None:
+        with self._lock:
+            if self.fail:
+                deploy.update(state="error", error_message="Build script returned non-zero exit code")
+            else:
+                deploy["state"] = "ready"
+            payload = dict(deploy)
+        if self.webhook_url:
+            req = urllib.request.Request(self.webhook_url, data=json.dumps(payload).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+            try:
+                urllib.request.urlopen(req, timeout=5).close()
+            except OSError:
+                pass
+
+    def handle(self, handler, method, path, body):
+        path = path.split("?", 1)[0]
+        if method == "POST" and path.startswith("/build_hooks/"):
+            self.start_deploy()
+            return self.send_json(handler, 200, {})
+        if method == "GET" and path.startswith("/api/v1/sites/") and path.endswith("/deploys"):
+            with self._lock:
+                listing = [dict(d) for d in self.deploys]
+            return self.send_json(handler, 200, listing)
+        return self.send_json(handler, 404, {"error": "not found"})
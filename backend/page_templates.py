@@ -0,0 +1,275 @@
+"""
+page_templates.py — Local library of reusable pages for recurring page types.
+
+Login and Signup are on every site (requirement_agent.SYSTEM_PROMPT) and carry no
+content of their own. They should not cost a DeepSeek call each time:
+
+    templates = for_site(enhanced_req, project_title, "page", version)   # once per site
+    html = templates.render("Sign in", navbar_html)   # None -> generate with the model
+    ...
+    templates.learn("Sign in", html, navbar_html)     # after a model generation
+
+Templates are keyed by normalized page type (page_type(): "Sign In" -> "login") and the
+site's style tags. Past generations fill the library: a generated page of a type in
+PAGE_TEMPLATE_TYPES (and without structural issues) is stored with the values that
+belong to its project (title, navbar, theme colours and fonts) replaced by
+placeholders. Rendering puts the new project's values back in; theme values the new
+project does not set keep the template's own. When the exact style tags have no template, the one with the most
+tags in common is used if it shares at least PAGE_TEMPLATE_MIN_OVERLAP of them.
+
+Templates are shared between users, so nothing else of a project may end up in one. A
+page with an email address, phone number, street address, link to another site or a
+line of the project's notes is never stored. By default only the content-free types
+(CONTENT_FREE_TYPES) are in the library. Domain pages (contact, courses, faq, ...) can
+be enabled through PAGE_TEMPLATE_TYPES; their templates are then keyed by a hash of
+the project's features and notes as well, so they are only reused for the same brief.
+
+The library is one SQLite table (page_templates.sqlite3 next to the llm_cache files),
+indexed by (kind, version, page_type). "kind" is "page" for full documents and
+"fragment" for skeleton-mode <main> content. Bump the version (website_agent passes
+MODEL_ID + PROMPT_VERSION) to stop reusing templates.
+"""
+
+import os
+import re
+import json
+import hashlib
+import time
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from html_sanitizer import check_structure
+from llm_cache import CACHE_DIR
+from telemetry import counter
+
+PAGE_TEMPLATES_ENABLED = os.environ.get("PAGE_TEMPLATES", "1") != "0"
+CONTENT_FREE_TYPES = frozenset(("login", "signup", "forgot-password"))
+PAGE_TEMPLATE_TYPES = frozenset(
+    t.strip() for t in os.environ.get("PAGE_TEMPLATE_TYPES", ",".join(sorted(CONTENT_FREE_TYPES))).split(",")
+    if t.strip()
+)
+PAGE_TEMPLATE_MIN_OVERLAP = float(os.environ.get("PAGE_TEMPLATE_MIN_OVERLAP", 0.5))
+
+TEMPLATE_EVENTS = counter("page_templates_total", "Page template lookups and stores by page type.",
+                          ("page_type", "event"))
+
+# Page names that mean the same page; anything else is slugified as is.
+_SYNONYMS = {
+    "log-in": "login", "sign-in": "login", "signin": "login",
+    "sign-up": "signup", "register": "signup", "registration": "signup", "create-account": "signup",
+    "forgot-password": "forgot-password", "reset-password": "forgot-password", "password-reset": "forgot-password",
+    "shopping-cart": "cart", "basket": "cart", "bag": "cart",
+    "contact-us": "contact", "my-account": "profile", "account": "profile",
+    "faqs": "faq", "privacy-policy": "privacy", "terms-of-service": "terms", "terms-and-conditions": "terms",
+    "course": "courses", "course-catalog": "courses", "all-courses": "courses",
+}
+
+_COLOR_RE = re.compile(r"#[0-9a-fA-F]{3,8}|(?:rgb|rgba|hsl|hsla)\([^)]*\)")
+
+# Project literals that must never be stored in a shared template.
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE_RE = re.compile(r"\+?\(?\d(?:[\s().-]*\d){6,}")
+_ADDRESS_RE = re.compile(r"\b\d{1,5}\s+(?:[A-Z][\w.]*\s+){1,3}"
+                         r"(?:St|Street|Ave|Avenue|Rd|Road|Blvd|Boulevard|Ln|Lane|Dr|Drive|Way|Court|Ct)\b\.?")
+_URL_RE = re.compile(r"\b(?:https?://|www\.)|\b(?:mailto|tel):", re.I)
+# Asset includes (Tailwind CDN, fonts) and SVG namespaces are the same on every site.
+_ASSET_TAG_RE = re.compile(r"<(?:script|link)\b[^>]*>|\bxmlns(?::\w+)?\s*=\s*[\"'][^\"']*[\"']", re.I)
+_CODE_RE = re.compile(r"<(script|style)\b.*?</\1\s*>|<[^>]*>", re.I | re.S)
+
+TITLE = "{{TEMPLATE:title}}"
+NAVBAR = "{{TEMPLATE:navbar}}"
+_THEME_RE = re.compile(r"\{\{TEMPLATE:theme:([^}]+)\}\}")
+
+
+def page_type(page: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", (page or "").lower()).strip("-")
+    slug = re.sub(r"-?page$", "", slug) or slug
+    return _SYNONYMS.get(slug, slug)
+
+
+def style_tags(style) -> Tuple[str, ...]:
+    """"Modern, Tailwind" / ["modern", "tailwind"] -> ("modern", "tailwind")."""
+    if isinstance(style, (list, tuple)):
+        style = ",".join(map(str, style))
+    tags = {t.strip().lower() for t in re.split(r"[,;/|]", str(style or ""))}
+    return tuple(sorted(t for t in tags if t))
+
+
+def has_project_literals(html: str, notes: str = "") -> bool:
+    """True if `html` carries an email, phone number, address, outside link or a line of `notes`."""
+    if _EMAIL_RE.search(html) or _URL_RE.search(_ASSET_TAG_RE.sub("", html)):
+        return True
+    text = " ".join(_CODE_RE.sub(" ", html).split())
+    if _PHONE_RE.search(text) or _ADDRESS_RE.search(text):
+        return True
+    lowered = text.lower()
+    for line in re.split(r"[\n.;!?]+", notes or ""):
+        line = " ".join(line.split()).lower()
+        if len(line) >= 12 and line in lowered:
+            return True
+    return False
+
+
+def content_key(features, notes) -> str:
+    """Hash of a project's brief; part of the key of domain-page templates."""
+    blob = json.dumps([features or [], notes or ""], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def theme_values(theme, prefix: str = "") -> Dict[str, str]:
+    """
+    Colours and font families of a (nested) theme object: {"colors.primary": "#1e40af", ...}.
+    Other theme values ("rounded", "wide") are ordinary words and class names in the HTML.
+    """
+    values = {}
+    if isinstance(theme, dict):
+        for key, value in theme.items():
+            path = f"{prefix}{key}"
+            if isinstance(value, dict):
+                values.update(theme_values(value, path + "."))
+            elif isinstance(value, str) and len(value.strip()) >= 3:
+                value = value.strip()
+                if _COLOR_RE.fullmatch(value) or "font" in path.lower():
+                    values[path] = value
+    return values
+
+
+class TemplateLibrary:
+    """SQLite-backed template store; safe to share between threads."""
+
+    def __init__(self, path: str = None):
+        path = path or os.path.join(CACHE_DIR, "page_templates.sqlite3")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            " kind TEXT NOT NULL, version TEXT NOT NULL, page_type TEXT NOT NULL, style TEXT NOT NULL,"
+            " body TEXT NOT NULL, defaults TEXT NOT NULL, uses INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL, PRIMARY KEY (kind, version, page_type, style))"
+        )
+
+    def find(self, kind: str, version: str, ptype: str, tags: Tuple[str, ...]) -> Optional[Tuple[str, dict]]:
+        """(body, defaults) of the best template for `ptype` and style `tags`, or None."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT style, body, defaults FROM templates WHERE kind = ? AND version = ? AND page_type = ?",
+                (kind, version, ptype),
+            ).fetchall()
+        best, best_score = None, 0.0
+        wanted = set(tags)
+        for style, body, defaults in rows:
+            have = set(style.split(",")) if style else set()
+            if have == wanted:
+                best, best_score = (style, body, defaults), 2.0
+                break
+            union = have | wanted
+            score = len(have & wanted) / len(union) if union else 1.0
+            if score >= PAGE_TEMPLATE_MIN_OVERLAP and score > best_score:
+                best, best_score = (style, body, defaults), score
+        if best is None:
+            return None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE templates SET uses = uses + 1 WHERE kind = ? AND version = ? AND page_type = ? AND style = ?",
+                (kind, version, ptype, best[0]),
+            )
+        return best[1], json.loads(best[2])
+
+    def store(self, kind: str, version: str, ptype: str, tags: Tuple[str, ...], body: str, defaults: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO templates (kind, version, page_type, style, body, defaults, uses, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (kind, version, ptype, ",".join(tags), body, json.dumps(defaults, ensure_ascii=False), time.time()),
+            )
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT page_type, COUNT(*), SUM(uses) FROM templates GROUP BY page_type").fetchall()
+        return {ptype: {"templates": n, "uses": uses or 0} for ptype, n, uses in rows}
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library() -> TemplateLibrary:
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = TemplateLibrary()
+        return _library
+
+
+class SiteTemplates:
+    """Template lookups and stores for one site (its title, style tags and theme)."""
+
+    def __init__(self, project_title: str, style, theme, kind: str, version: str,
+                 library: TemplateLibrary = None, features=None, notes: str = ""):
+        self.project_title = project_title or ""
+        self.tags = style_tags(style)
+        self.theme = theme_values(theme)
+        self.kind = kind
+        self.version = version
+        self.library = library or get_library()
+        self.notes = notes if isinstance(notes, str) else ""
+        self.content_key = content_key(features, self.notes)
+
+    def _version(self, ptype: str) -> str:
+        # a domain page is only reused for a project with the same features and notes
+        return self.version if ptype in CONTENT_FREE_TYPES else f"{self.version}:{self.content_key}"
+
+    def render(self, page: str, navbar_html: str = "") -> Optional[str]:
+        """The page rendered from the library, or None if it has to be generated."""
+        ptype = page_type(page)
+        if ptype not in PAGE_TEMPLATE_TYPES:
+            return None
+        found = self.library.find(self.kind, self._version(ptype), ptype, self.tags)
+        if found is None:
+            TEMPLATE_EVENTS.inc(page_type=ptype, event="miss")
+            return None
+        body, defaults = found
+        if NAVBAR in body and not navbar_html:
+            return None
+        html = _THEME_RE.sub(lambda m: self.theme.get(m.group(1)) or defaults.get(m.group(1), ""), body)
+        html = html.replace(TITLE, self.project_title).replace(NAVBAR, navbar_html)
+        TEMPLATE_EVENTS.inc(page_type=ptype, event="hit")
+        return html
+
+    def learn(self, page: str, html: str, navbar_html: str = "") -> bool:
+        """Store a generated page as a template if its type recurs and it can be parameterized."""
+        ptype = page_type(page)
+        if ptype not in PAGE_TEMPLATE_TYPES or not html:
+            return False
+        if has_project_literals(html, self.notes):
+            TEMPLATE_EVENTS.inc(page_type=ptype, event="rejected")
+            return False
+        body = html
+        if self.kind == "page":
+            # a page with its own navbar would carry another site's links
+            if not navbar_html or body.count(navbar_html) != 1 or check_structure(body).issues:
+                return False
+            body = body.replace(navbar_html, NAVBAR)
+        if len(self.project_title) >= 3:
+            body = re.sub(r"(?<!\w)%s(?!\w)" % re.escape(self.project_title), lambda m: TITLE, body)
+        defaults = {}
+        for path, value in sorted(self.theme.items(), key=lambda kv: -len(kv[1])):
+            if value in body:
+                body = body.replace(value, "{{TEMPLATE:theme:%s}}" % path)
+                defaults[path] = value
+        self.library.store(self.kind, self._version(ptype), ptype, self.tags, body, defaults)
+        TEMPLATE_EVENTS.inc(page_type=ptype, event="learned")
+        return True
+
+
+def for_site(enhanced_req: dict, project_title: str, kind: str, version: str) -> Optional[SiteTemplates]:
+    """SiteTemplates for a site's requirements, or None when templates are off."""
+    if not PAGE_TEMPLATES_ENABLED:
+        return None
+    return SiteTemplates(project_title, enhanced_req.get("style"), enhanced_req.get("theme"), kind, version,
+                         features=enhanced_req.get("features"), notes=enhanced_req.get("notes"))
@@ -1,12 +1,18 @@
 # requirement_agent.py
 import os
-import json
-import re
+import copy
+import asyncio
 import time
 import requests
+from llm_cache import get_cache, make_key, normalize_prompt
+from llm_scheduler import PRIORITY_HIGH, estimate_tokens, get_scheduler
+from telemetry import counter, llm_call, record_retry, span
+from hedging import STATS, HedgePolicy, hedged, hedged_async
+from json_extract import Field, conform, parse_object
+from singleflight import Group
 
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
-API_URL = "https://openrouter.ai/api/v1/chat/completions"
+API_URL = os.environ.get("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
 
 if not OPENROUTER_API_KEY:
     raise RuntimeError("OPENROUTER_API_KEY environment variable is not set.")
@@ -20,67 +26,33 @@ BACKOFF_FACTOR = 2
 PRIMARY_MODEL = "deepseek/deepseek-r1:free"
 FALLBACK_MODEL = "gpt-4o-mini:free"
 
+# Hedged mode (REQUIREMENT_HEDGE=1): if the first model is slower than its usual p90
+# (HEDGE_PERCENTILE), race the other one instead of waiting out all its retries; models
+# are reordered by observed latency/success. Off by default, like PAGE_HEDGE: the primary
+# is a slow reasoning model, so most requests would also pay for a fallback call, and
+# the losing call is only abandoned between retries, not mid-request.
+HEDGE_ENABLED = os.environ.get("REQUIREMENT_HEDGE", "0") != "0"
+HEDGE_POLICY = HedgePolicy(STATS, enabled=HEDGE_ENABLED, reorder=HEDGE_ENABLED)
 
-def _strip_code_fence(text: str) -> str:
-    if not text:
-        return text
-    m = re.search(r"```(?:json)?\s*(.*?)\s*```", text, flags=re.DOTALL | re.IGNORECASE)
-    if m:
-        return m.group(1).strip()
-    return text.strip()
+# identical prompts being enhanced concurrently share one model round
+_flights = Group("requirements")
 
+JSON_REPAIRS = counter("requirement_json_repairs_total", "Model JSON defects fixed without a retry.", ("fix",))
 
-def _extract_first_json(text: str):
-    if not text:
-        return None
-    idx = text.find("{")
-    if idx == -1:
-        return None
-    i = idx
-    depth = 0
-    in_string = False
-    escape = False
-    while i < len(text):
-        ch = text[i]
-        if ch == '"' and not escape:
-            in_string = not in_string
-        if ch == '\\' and in_string and not escape:
-            escape = True
-            i += 1
-            continue
-        if not in_string:
-            if ch == '{':
-                depth += 1
-            elif ch == '}':
-                depth -= 1
-                if depth == 0:
-                    return text[idx:i+1]
-        escape = False
-        i += 1
-    return None
+CACHE_ENABLED = os.environ.get("REQUIREMENT_CACHE", "1") != "0"
+CACHE_TTL = int(os.environ.get("REQUIREMENT_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get("REQUIREMENT_CACHE_MAX_ENTRIES", 5000))
 
 
-def _try_parse_json_from_text(text: str):
-    if not text:
-        return None
-    t = _strip_code_fence(text)
-    try:
-        return json.loads(t)
-    except Exception:
-        pass
-    json_str = _extract_first_json(t)
-    if json_str:
-        try:
-            return json.loads(json_str)
-        except Exception:
-            pass
-    m = re.search(r"\{[\s\S]*\}", t)
-    if m:
-        try:
-            return json.loads(m.group(0))
-        except Exception:
-            pass
-    return None
+# What SYSTEM_PROMPT asks for; see json_extract.conform()
+REQUIREMENTS_SCHEMA = {
+    "project": Field((str, dict), "AutoProject"),
+    "pages": Field(list, ["Home"], str),
+    "features": Field(list, [], str),
+    "style": Field(str, ""),
+    "theme": Field(dict),
+    "notes": Field(str, ""),
+}
 
 
 SYSTEM_PROMPT = (
@@ -103,10 +75,45 @@ SYSTEM_PROMPT = (
 )
 
 
-def _call_model(model_id: str, messages: list) -> dict:
-    """Call a model with retries and return parsed JSON or None."""
+def _parse_model_output(assistant_raw: str):
+    """JSON object from the model, repaired and conformed locally; None means ask again."""
+    parsed, fixes = parse_object(assistant_raw)
+    if parsed is None:
+        return None
+    if fixes:
+        print(f"[requirement_agent] Repaired model JSON locally: {', '.join(fixes)}")
+        for fix in fixes:
+            JSON_REPAIRS.inc(fix=fix)
+    if 'project' not in parsed and parsed.get('title'):
+        parsed['project'] = parsed['title']
+    parsed, problems = conform(parsed, REQUIREMENTS_SCHEMA)
+    if problems:
+        print(f"[requirement_agent] Requirements schema: {', '.join(problems)}")
+    return parsed
+
+
+def _repair_messages(assistant_raw: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "assistant", "content": assistant_raw},
+        {"role": "user", "content": "The JSON above is invalid or missing. Please return EXACTLY one valid JSON object containing keys project,pages,features,style,notes and nothing else."}
+    ]
+
+
+def _backoff(wait: float, cancel) -> bool:
+    """Sleep before a retry; False if the call was cancelled meanwhile (it lost a hedge race)."""
+    if cancel is None:
+        time.sleep(wait)
+        return True
+    return not cancel.wait(wait)
+
+
+def _call_model(model_id: str, messages: list, cancel=None) -> dict:
+    """Call a model with retries and return parsed JSON or None; stops early once `cancel` is set."""
     headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"}
     assistant_raw = None
+    # every attempt waits for a slot on the process-wide OpenRouter scheduler
+    scheduler = get_scheduler("openrouter")
 
     for attempt in range(RETRY_ATTEMPTS):
         payload = {
@@ -116,12 +123,20 @@ def _call_model(model_id: str, messages: list) -> dict:
             "max_tokens": MAX_TOKENS
         }
         try:
-            resp = requests.post(API_URL, headers=headers, json=payload, timeout=120)
+            with scheduler.slot(priority=PRIORITY_HIGH, est_tokens=estimate_tokens(messages, MAX_TOKENS)) as ticket, \
+                    llm_call("openrouter", model_id, attempt=attempt + 1) as call:
+                resp = requests.post(API_URL, headers=headers, json=payload, timeout=120)
+                data = resp.json() if resp.ok else None
+                usage = (data or {}).get("usage") or {}
+                ticket.report(status=resp.status_code, tokens=usage.get("total_tokens"))
+                call.finish(resp.status_code, usage)
         except Exception as e:
             if attempt < RETRY_ATTEMPTS - 1:
                 wait = RETRY_WAIT * (BACKOFF_FACTOR ** attempt)
                 print(f"[requirement_agent] Network error ({model_id}): {e}. Retrying in {wait}s...")
-                time.sleep(wait)
+                record_retry("requirement_agent", "network", wait)
+                if not _backoff(wait, cancel):
+                    return None
                 continue
             return None
 
@@ -129,7 +144,9 @@ def _call_model(model_id: str, messages: list) -> dict:
             if attempt < (RETRY_ATTEMPTS - 1):
                 wait = RETRY_WAIT * (BACKOFF_FACTOR ** attempt)
                 print(f"[requirement_agent] {model_id} Rate-limited ({resp.status_code}). Retrying in {wait}s...")
-                time.sleep(wait)
+                record_retry("requirement_agent", str(resp.status_code), wait)
+                if not _backoff(wait, cancel):
+                    return None
                 continue
             return None
 
@@ -137,60 +154,65 @@ def _call_model(model_id: str, messages: list) -> dict:
             print(f"[requirement_agent] {model_id} failed: {resp.status_code} {resp.text}")
             return None
 
-        data = resp.json()
         assistant_raw = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        parsed = _try_parse_json_from_text(assistant_raw)
+        parsed = _parse_model_output(assistant_raw)
         if parsed is not None:
-            if 'project' not in parsed:
-                parsed['project'] = parsed.get('title', 'AutoProject')
-            if 'pages' not in parsed:
-                parsed['pages'] = ['Home']
             return parsed
 
         # If invalid JSON, try to repair
         if attempt < (RETRY_ATTEMPTS - 1):
-            messages = [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "assistant", "content": assistant_raw},
-                {"role": "user", "content": "The JSON above is invalid or missing. Please return EXACTLY one valid JSON object containing keys project,pages,features,style,notes and nothing else."}
-            ]
+            messages = _repair_messages(assistant_raw)
             wait = RETRY_WAIT * (BACKOFF_FACTOR ** attempt)
             print(f"[requirement_agent] Invalid JSON from {model_id}. Retrying in {wait}s...")
-            time.sleep(wait)
+            record_retry("requirement_agent", "invalid_json", wait)
+            if not _backoff(wait, cancel):
+                return None
             continue
 
     return None
 
 
-def enhance_requirements(user_prompt: str):
-    
-    
+def _cache_key(user_prompt: str) -> str:
+    return make_key(normalize_prompt(user_prompt), PRIMARY_MODEL, FALLBACK_MODEL, SYSTEM_PROMPT, TEMPERATURE)
+
+
+def _requirement_cache():
+    return get_cache("requirements", ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+
+
+def _cached_result(user_prompt: str):
+    """Return (cache_key, cached_result_or_None); cache_key is None when caching is off."""
+    cache_key = _cache_key(user_prompt) if CACHE_ENABLED else None
+    if cache_key:
+        cached = _requirement_cache().get(cache_key)
+        if cached is not None:
+            print("[requirement_agent] Cache hit")
+            return cache_key, cached
+    return cache_key, None
+
+
+def _base_messages(user_prompt: str) -> list:
     user_prompt += (
         "\nMake sure the pages include all essential domain-specific pages "
         "(e.g., Cart, Checkout for e-commerce; Courses, Lessons for LMS). "
         "Always return these in the 'pages' array if relevant."
     )
     
-    base_messages = [
+    return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": "Extract a complete structured requirements JSON from the following user text. Return ONLY JSON:\n" + user_prompt}
     ]
 
-    # Try primary model (DeepSeek)
-    parsed = _call_model(PRIMARY_MODEL, base_messages)
-    if parsed is not None:
-        print(f"[requirement_agent] Success with {PRIMARY_MODEL}")
-        print(parsed)
-        return parsed
 
-    # Fallback to gpt-4o-mini
-    print(f"[requirement_agent] Falling back to {FALLBACK_MODEL}...")
-    parsed = _call_model(FALLBACK_MODEL, base_messages)
-    if parsed is not None:
-        print(f"[requirement_agent] Success with {FALLBACK_MODEL}")
-        print(parsed)
-        return parsed
+def _success(model_id: str, parsed: dict, cache_key: str) -> dict:
+    print(f"[requirement_agent] Success with {model_id}")
+    print(parsed)
+    if cache_key:
+        _requirement_cache().set(cache_key, parsed)
+    return parsed
 
+
+def _failed_result() -> dict:
     # Final fallback if everything fails
     return {
         "project": "AutoProject",
@@ -199,3 +221,115 @@ def enhance_requirements(user_prompt: str):
         "style": "modern,tailwind",
         "notes": "INCOMPLETE: Requirement agent failed on both models."
     }
+
+
+def enhance_requirements(user_prompt: str):
+    with span("requirements.enhance") as s:
+        cache_key, cached = _cached_result(user_prompt)
+        s.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+        parsed, shared = _flights.do(_cache_key(user_prompt), _enhance_uncached, user_prompt, cache_key)
+        s.set(shared=shared)
+        return copy.deepcopy(parsed) if shared else parsed
+
+
+def _enhance_uncached(user_prompt: str, cache_key: str):
+
+    base_messages = _base_messages(user_prompt)
+
+    # Primary model (DeepSeek) first; gpt-4o-mini is raced in if it is slow, or tried if it fails
+    calls = [(model_id, lambda cancel, m=model_id: _call_model(m, base_messages, cancel))
+             for model_id in (PRIMARY_MODEL, FALLBACK_MODEL)]
+    model_id, parsed = hedged(calls, HEDGE_POLICY, component="requirement_agent")
+    if parsed is not None:
+        return _success(model_id, parsed, cache_key)
+
+    return _failed_result()
+
+
+# -----------------------------
+# asyncio twins (driven by async_engine.py)
+# -----------------------------
+async def _call_model_async(model_id: str, messages: list, client) -> dict:
+    """Async twin of _call_model using a pooled async HTTP client (httpx.AsyncClient)."""
+    headers = {"Authorization": f"Bearer {OPENROUTER_API_KEY}", "Content-Type": "application/json"}
+    scheduler = get_scheduler("openrouter")
+
+    for attempt in range(RETRY_ATTEMPTS):
+        payload = {
+            "model": model_id,
+            "messages": messages,
+            "temperature": TEMPERATURE,
+            "max_tokens": MAX_TOKENS
+        }
+        try:
+            async with scheduler.slot_async(priority=PRIORITY_HIGH, est_tokens=estimate_tokens(messages, MAX_TOKENS)) as ticket:
+                with llm_call("openrouter", model_id, attempt=attempt + 1) as call:
+                    resp = await client.post(API_URL, headers=headers, json=payload, timeout=120)
+                    data = resp.json() if resp.is_success else None
+                    usage = (data or {}).get("usage") or {}
+                    ticket.report(status=resp.status_code, tokens=usage.get("total_tokens"))
+                    call.finish(resp.status_code, usage)
+        except Exception as e:
+            if attempt < RETRY_ATTEMPTS - 1:
+                wait = RETRY_WAIT * (BACKOFF_FACTOR ** attempt)
+                print(f"[requirement_agent] Network error ({model_id}): {e}. Retrying in {wait}s...")
+                record_retry("requirement_agent", "network", wait)
+                await asyncio.sleep(wait)
+                continue
+            return None
+
+        if resp.status_code in (429, 502, 503, 504):
+            if attempt < (RETRY_ATTEMPTS - 1):
+                wait = RETRY_WAIT * (BACKOFF_FACTOR ** attempt)
+                print(f"[requirement_agent] {model_id} Rate-limited ({resp.status_code}). Retrying in {wait}s...")
+                record_retry("requirement_agent", str(resp.status_code), wait)
+                await asyncio.sleep(wait)
+                continue
+            return None
+
+        if not resp.is_success:
+            print(f"[requirement_agent] {model_id} failed: {resp.status_code} {resp.text}")
+            return None
+
+        assistant_raw = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        parsed = _parse_model_output(assistant_raw)
+        if parsed is not None:
+            return parsed
+
+        if attempt < (RETRY_ATTEMPTS - 1):
+            messages = _repair_messages(assistant_raw)
+            wait = RETRY_WAIT * (BACKOFF_FACTOR ** attempt)
+            print(f"[requirement_agent] Invalid JSON from {model_id}. Retrying in {wait}s...")
+            record_retry("requirement_agent", "invalid_json", wait)
+            await asyncio.sleep(wait)
+            continue
+
+    return None
+
+
+async def enhance_requirements_async(user_prompt: str, client):
+    with span("requirements.enhance") as s:
+        # SQLite cache reads and writes run off the event loop
+        cache_key, cached = await asyncio.to_thread(_cached_result, user_prompt)
+        s.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+        parsed, shared = await _flights.do_async(_cache_key(user_prompt), _enhance_uncached_async,
+                                                 user_prompt, cache_key, client)
+        s.set(shared=shared)
+        return copy.deepcopy(parsed) if shared else parsed
+
+
+async def _enhance_uncached_async(user_prompt: str, cache_key: str, client):
+
+    base_messages = _base_messages(user_prompt)
+
+    calls = [(model_id, lambda m=model_id: _call_model_async(m, base_messages, client))
+             for model_id in (PRIMARY_MODEL, FALLBACK_MODEL)]
+    model_id, parsed = await hedged_async(calls, HEDGE_POLICY, component="requirement_agent")
+    if parsed is not None:
+        return await asyncio.to_thread(_success, model_id, parsed, cache_key)
+
+    return _failed_result()
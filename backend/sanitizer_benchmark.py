@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+sanitizer_benchmark.py — Microbenchmark of html_sanitizer against the old regex chain.
+
+    python sanitizer_benchmark.py --size 12000 --iterations 2000
+
+Builds a corpus of model-output shapes (plain document, ```html fence, several fences,
+DeepSite START/END_TITLE markers, truncated output, fragment) and for each one:
+
+- checks that HtmlSanitizer produces exactly what the old sanitize_ai_html did;
+- times the old regex chain + `"<!doctype" in html.lower()` (what _finalize_page did),
+  HtmlSanitizer without and with the structural check, and HtmlSanitizer fed
+  32-character stream deltas (with the check).
+
+Only the no-check column is like-for-like; the old code had no structural check.
+"""
+
+import re
+import sys
+import time
+import argparse
+
+from html_sanitizer import HtmlSanitizer
+
+
+def legacy_sanitize_ai_html(raw: str) -> str:
+    """website_agent.sanitize_ai_html before html_sanitizer.py (kept for comparison)."""
+    if not raw:
+        return ""
+
+    s = raw
+
+    s = re.sub(r"<<+.*?END_TITLE.*?\n", "", s, flags=re.IGNORECASE)
+    s = re.sub(r"<<+.*?START_TITLE.*?\n", "", s, flags=re.IGNORECASE)
+
+    fenced = re.findall(r"```(?:html)?\s*([\s\S]*?)```", s, flags=re.IGNORECASE)
+    if fenced:
+        cleaned = "\n\n".join(block.strip() for block in fenced)
+        return cleaned.strip()
+
+    s = re.sub(r"```(?:html)?", "", s, flags=re.IGNORECASE)
+    s = s.replace("```", "")
+    s = re.sub(r"^\s*html\s*", "", s, flags=re.IGNORECASE)
+    s = re.sub(r"\s*html\s*$", "", s, flags=re.IGNORECASE)
+    return s.strip()
+
+
+def _document(size: int) -> str:
+    section = (
+        "  <section class='py-12 px-6'>\n"
+        "    <h2 class='text-2xl font-bold'>Feature</h2>\n"
+        "    <p class='text-gray-600'>Lorem ipsum dolor sit amet, <a href='#'>consectetur</a> elit.</p>\n"
+        "    <ul><li>One<li>Two</ul><img src='a.png' alt=''><br>\n"
+        "  </section>\n"
+    )
+    body = section * max(1, size // len(section))
+    return (
+        "<!DOCTYPE html>\n<html lang='en'>\n<head>\n  <meta charset='utf-8'>\n  <title>Demo</title>\n"
+        "  <script src='https://cdn.tailwindcss.com'></script>\n"
+        "  <style>body { font-family: sans-serif; } a > b { color: red; }</style>\n</head>\n"
+        "<body>\n<nav class='p-4'><a href='index.html'>Home</a></nav>\n<main>\n"
+        f"{body}</main>\n<script>if (a < b && c > d) {{ console.log('<div>'); }}</script>\n</body>\n</html>"
+    )
+
+
+def corpus(size: int) -> dict:
+    doc = _document(size)
+    return {
+        "plain": doc,
+        "fenced": f"Here is the page:\n```html\n{doc}\n```\nLet me know if you need changes.",
+        "multi_fence": f"```html\n{doc[:len(doc) // 2]}\n```\ntext\n```\n{doc[len(doc) // 2:]}\n```",
+        "markers": f"<<<<<<< START_TITLE index.html >>>>>>> END_TITLE\n{doc}\n<<<<<<< END_TITLE\n",
+        "truncated": doc[: int(len(doc) * 0.7)],
+        "fragment": "html\n" + doc[doc.index("<main>"):doc.index("</main>") + 7] + "\nhtml",
+        "unclosed_fence": f"```html\n{doc}",
+    }
+
+
+def _new(raw: str, chunk: int = 0, check: bool = True):
+    s = HtmlSanitizer()
+    if chunk:
+        for i in range(0, len(raw), chunk):
+            s.feed(raw[i:i + chunk])
+    else:
+        s.feed(raw)
+    return s.close(check=check)
+
+
+def _time(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="html_sanitizer microbenchmark")
+    parser.add_argument("--size", type=int, default=12000, help="approximate page size in characters")
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    mismatches = 0
+    print(f"{'case':<16}{'bytes':>8}{'legacy us':>11}{'no-check us':>13}{'new us':>9}{'stream us':>11}  issues")
+    for name, raw in corpus(args.size).items():
+        expected = legacy_sanitize_ai_html(raw)
+        for chunk in (0, 1, 7, 32):
+            result = _new(raw, chunk)
+            if result.html != expected or result.has_doctype != ("<!doctype" in expected.lower()):
+                mismatches += 1
+                print(f"MISMATCH {name} (chunk={chunk})")
+
+        legacy = _time(lambda: "<!doctype" in legacy_sanitize_ai_html(raw).lower(), args.iterations)
+        no_check = _time(lambda: _new(raw, check=False), args.iterations)
+        new = _time(lambda: _new(raw), args.iterations)
+        stream = _time(lambda: _new(raw, 32), max(1, args.iterations // 10))
+        issues = ", ".join(f"{c} {t}".strip() for c, t in _new(raw).issues) or "-"
+        print(f"{name:<16}{len(raw):>8}{legacy:>11.1f}{no_check:>13.1f}{new:>9.1f}{stream:>11.1f}  {issues}")
+
+    if mismatches:
+        print(f"{mismatches} output mismatches vs the legacy sanitizer")
+        return 1
+    print("Output identical to the legacy sanitizer on every case and chunking.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+singleflight.py — Coalesce identical in-flight calls into one execution.
+
+    flights = Group("pipeline")
+    result, shared = flights.do(key, run_pipeline, prompt)
+
+The first caller for a key (the leader) runs the function; callers arriving with the
+same key while it runs wait for the leader and get the same result or exception
+(shared=True). Once the call finishes the key is forgotten, so this dedupes bursts
+(double-clicks, many clients asking for the same template) and never serves stale
+results; caching is llm_cache's job.
+
+Only an Exception raised by the call is shared. If the leader itself is cancelled or
+interrupted (a losing hedge task, a disconnected client) the flight is dropped and
+its followers try again: one of them becomes the new leader.
+
+Flights live in a concurrent.futures.Future, so threads and coroutines
+(do_async) can share one: a coroutine waiting on a flight started by a thread does not
+block the event loop.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+from telemetry import counter
+
+FLIGHTS = counter("singleflight_calls_total", "Calls by coalescing group; 'shared' ones reused an in-flight call.",
+                  ("group", "role"))
+
+_groups: Dict[str, "Group"] = {}
+
+
+class _Abandoned(Exception):
+    """Set on a flight whose leader stopped without a result; followers retry."""
+
+
+class Group:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+        _groups[name] = self
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """(future, leader): leader is True if the caller must run the call itself."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                FLIGHTS.inc(group=self.name, role="shared")
+                return future, False
+            future = self._flights[key] = Future()
+        FLIGHTS.inc(group=self.name, role="leader")
+        return future, True
+
+    def _land(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def do(self, key: str, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """Run fn(*args, **kwargs) once per key in flight; returns (result, shared)."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                return future.result(), True
+            except _Abandoned:
+                continue
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            self._abandon(key, future)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._land(key, future)
+
+    async def do_async(self, key: str, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """Coroutine twin of do(): fn(*args, **kwargs) returns an awaitable."""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                # shield: a cancelled follower must not cancel the flight for everyone else
+                return await asyncio.shield(asyncio.wrap_future(future)), True
+            except _Abandoned:
+                continue
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            self._abandon(key, future)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._land(key, future)
+
+    def _abandon(self, key: str, future: Future) -> None:
+        # forget the flight before waking followers, so they cannot join it again
+        self._land(key, future)
+        future.set_exception(_Abandoned(key))
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+def all_stats() -> Dict[str, int]:
+    """Calls currently in flight per group."""
+    return {name: group.inflight() for name, group in list(_groups.items())}
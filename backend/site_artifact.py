@@ -0,0 +1,236 @@
+"""
+site_artifact.py — A generated site held in memory, ready to serve, push or persist.
+
+    artifact = generate_website_parallel(enhanced_req, workspace="shop")
+    artifact.pages()               # {"index.html": "<!DOCTYPE html>...", ...}
+    start_deploy(artifact=artifact)
+
+A SiteArtifact maps site-relative paths ("index.html", "css/style.css") to SiteFiles.
+Each file is encoded once when it is added, and its git blob SHA and SHA-256 content
+hash are computed at the same time. Later stages reuse them: the deploy compares blob
+SHAs with the remote tree without reading or hashing anything again, and the hash is
+the file's ETag. Text files are also gzip- and (if the brotli package is installed)
+brotli-compressed when added, so site_http can serve them without compressing per request
+(SITE_PRECOMPRESS=0 turns this off).
+
+Disk is no longer part of the pipeline. persist() writes the artifact into a staging
+directory and publishes it as generated_site/<workspace> (workspaces.py), either
+behind the caller's back on one writer thread ("background", the default), inline
+("sync") or not at all ("off"); set it with SITE_PERSIST. Recent artifacts are kept
+per workspace (ARTIFACT_KEEP) so a deploy right after generation never touches disk;
+from_directory() loads a site that was persisted earlier, e.g. before a restart.
+"""
+
+import os
+import gzip
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Union
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are made
+    brotli = None
+
+from telemetry import bind, span
+from workspaces import create_staging, discard, gc_workspaces, publish, safe_name, workspace_path
+
+SITE_PERSIST = os.environ.get("SITE_PERSIST", "background").lower()
+ARTIFACT_KEEP = int(os.environ.get("ARTIFACT_KEEP", 16))
+SITE_PRECOMPRESS = os.environ.get("SITE_PRECOMPRESS", "1") != "0"
+GZIP_LEVEL = int(os.environ.get("SITE_GZIP_LEVEL", 9))
+BROTLI_QUALITY = int(os.environ.get("SITE_BROTLI_QUALITY", 9))
+COMPRESS_MIN_BYTES = 256
+COMPRESSIBLE = (".html", ".css", ".js", ".json", ".svg", ".txt", ".xml")
+
+SiteFile = namedtuple("SiteFile", [
+    "path",       # site-relative, "/"-separated
+    "data",       # encoded content
+    "blob_sha",   # SHA-1 git assigns to a blob with this content
+    "etag",       # SHA-256 hex of the content
+    "variants",   # {"br" / "gzip": compressed data}, only those smaller than data
+], defaults=({},))
+
+
+def git_blob_sha(content: bytes) -> str:
+    """The SHA-1 git assigns to a blob with this content (same as `git hash-object`)."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def compress_variants(path: str, data: bytes) -> dict:
+    """Content-Encoding -> compressed bytes for text files worth compressing."""
+    if len(data) < COMPRESS_MIN_BYTES or not path.lower().endswith(COMPRESSIBLE):
+        return {}
+    variants = {"gzip": gzip.compress(data, GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=BROTLI_QUALITY)
+    return {enc: body for enc, body in variants.items() if len(body) < len(data)}
+
+
+class SiteArtifact:
+    """Files of one generated site; add() is thread-safe so page workers can fill it."""
+
+    def __init__(self, workspace: str, artifact_id: str = None):
+        self.workspace = workspace
+        # a resumed generation (generation_journal) keeps the id of the one it completes
+        self.id = artifact_id or f"{safe_name(workspace)}-{uuid.uuid4().hex[:12]}"
+        # False while a generation is still adding pages (remembered early so /sites can serve them)
+        self.complete = True
+        self.persisted: Future = Future()   # resolves with the published directory
+        self._lock = threading.Lock()
+        self._files: Dict[str, SiteFile] = {}
+
+    def add(self, path: str, content: Union[str, bytes]) -> SiteFile:
+        data = content.encode("utf-8") if isinstance(content, str) else bytes(content)
+        variants = compress_variants(path, data) if SITE_PRECOMPRESS else {}
+        entry = SiteFile(path, data, git_blob_sha(data), hashlib.sha256(data).hexdigest(), variants)
+        with self._lock:
+            self._files[path] = entry
+        return entry
+
+    def reorder(self, paths: List[str]) -> None:
+        """Put `paths` first, in that order (pages are added in completion order)."""
+        with self._lock:
+            files = OrderedDict((p, self._files[p]) for p in paths if p in self._files)
+            for path, entry in self._files.items():
+                files.setdefault(path, entry)
+            self._files = dict(files)
+
+    def get(self, path: str) -> Optional[SiteFile]:
+        return self._files.get(path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._files
+
+    def __iter__(self) -> Iterator[SiteFile]:
+        return iter(list(self._files.values()))
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def paths(self) -> List[str]:
+        return list(self._files)
+
+    def pages(self) -> Dict[str, str]:
+        """{filename: html} for the HTML pages."""
+        return {f.path: f.data.decode("utf-8") for f in self if f.path.endswith(".html")}
+
+    def size(self) -> int:
+        return sum(len(f.data) for f in self)
+
+    def digest(self) -> str:
+        """Content hash of the whole site (paths + blob SHAs); equal sites have equal digests."""
+        h = hashlib.sha256()
+        for f in sorted(self, key=lambda f: f.path):
+            h.update(f"{f.path}\0{f.blob_sha}\n".encode())
+        return h.hexdigest()
+
+    def write(self, root: str) -> List[str]:
+        """Write every file under `root`; returns the paths written."""
+        written = []
+        for f in self:
+            out_path = os.path.join(root, *f.path.split("/"))
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            with open(out_path, "wb") as fh:
+                fh.write(f.data)
+            written.append(out_path)
+        return written
+
+    @classmethod
+    def from_directory(cls, root: str, workspace: str = None) -> "SiteArtifact":
+        """Load a site from disk (a workspace persisted earlier)."""
+        artifact = cls(workspace or os.path.basename(os.path.normpath(root)))
+        for dirpath, _, files in os.walk(root):
+            for fname in sorted(files):
+                abs_path = os.path.join(dirpath, fname)
+                with open(abs_path, "rb") as fh:
+                    artifact.add(os.path.relpath(abs_path, root).replace(os.path.sep, "/"), fh.read())
+        artifact.persisted.set_result(root)
+        return artifact
+
+
+# -----------------------------
+# Write-behind persistence
+# -----------------------------
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _writer_pool() -> ThreadPoolExecutor:
+    # one thread: publishes of the same workspace happen in generation order
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="site-writer")
+        return _writer
+
+
+def _persist_now(artifact: SiteArtifact) -> str:
+    with span("website.publish", workspace=artifact.workspace, files=len(artifact)):
+        staging = create_staging(artifact.workspace)
+        try:
+            artifact.write(staging)
+            site_dir = publish(staging, artifact.workspace)
+        except BaseException as e:
+            discard(staging)
+            artifact.persisted.set_exception(e)
+            raise
+        gc_workspaces()
+    artifact.persisted.set_result(site_dir)
+    return site_dir
+
+
+def _persist_logged(artifact: SiteArtifact) -> None:
+    try:
+        site_dir = _persist_now(artifact)
+    except Exception as e:
+        logging.error("Persisting site '%s' failed: %s", artifact.workspace, e)
+        return
+    logging.info("Persisted %d files to %s", len(artifact), site_dir)
+
+
+def persist(artifact: SiteArtifact, mode: str = None) -> Optional[str]:
+    """
+    Persist per `mode` (default SITE_PERSIST); returns the directory the site is (or will
+    be) published to, or None with "off". Wait on artifact.persisted for the write itself.
+    """
+    mode = mode or SITE_PERSIST
+    if mode == "off":
+        return None
+    if mode == "sync":
+        return _persist_now(artifact)
+    _writer_pool().submit(bind(_persist_logged), artifact)
+    return workspace_path(artifact.workspace)
+
+
+# -----------------------------
+# Recent artifacts
+# -----------------------------
+_recent: "OrderedDict[str, SiteArtifact]" = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def remember(artifact: SiteArtifact) -> None:
+    with _recent_lock:
+        key = safe_name(artifact.workspace)
+        _recent.pop(key, None)
+        _recent[key] = artifact
+        while len(_recent) > ARTIFACT_KEEP:
+            _recent.popitem(last=False)
+
+
+def recall(workspace: str = None, partial: bool = False) -> Optional[SiteArtifact]:
+    """
+    The latest artifact generated for `workspace` (None: for any workspace) in this process.
+    A generation still in progress is only returned with partial=True (serving its pages
+    as they arrive); deploys and resumes get finished sites only.
+    """
+    with _recent_lock:
+        if workspace is None:
+            return next((a for a in reversed(_recent.values()) if partial or a.complete), None)
+        artifact = _recent.get(safe_name(workspace))
+        return artifact if artifact is not None and (partial or artifact.complete) else None
@@ -0,0 +1,170 @@
+"""
+site_http.py — Serve generated sites file by file with ETags and precompressed bodies.
+
+    GET /sites/<site>          manifest: {"site", "digest", "files": {path: {"etag", "size", "type", "url"}}}
+    GET /sites/<site>/<path>   one file (default index.html)
+
+Files come from the site's SiteArtifact: the one generated by this process if it is
+still kept (site_artifact.recall; a generation in progress serves the pages it already
+has, so a client can fetch each page as soon as /submit/stream reports it), otherwise the published workspace loaded from disk
+once and reused until that directory changes.
+
+Every response has a strong ETag made from the file's content hash (one per encoding,
+"<hash>-br" / "<hash>-gzip", as the bytes differ), Vary: Accept-Encoding and
+Cache-Control: no-cache. The browser therefore revalidates each time, and an
+unchanged page costs a 304 with no body. Accept-Encoding is matched against the
+variants compressed when the site was generated (br before gzip at equal q), so
+nothing is compressed per request. The manifest's ETag is the site digest, so a
+client can tell whether anything changed with a single request.
+"""
+
+import os
+import mimetypes
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from flask import Response, jsonify
+
+from site_artifact import ARTIFACT_KEEP, SiteArtifact, SiteFile, recall
+from telemetry import counter
+from workspaces import workspace_path
+
+SITE_RESPONSES = counter("site_responses_total", "Generated-site file responses by status and encoding.",
+                         ("status", "encoding"))
+
+ENCODING_PREFERENCE = ("br", "gzip")
+CACHE_CONTROL = "no-cache"
+
+_loaded: "OrderedDict[str, Tuple[float, SiteArtifact]]" = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def site_artifact(site: str) -> Optional[SiteArtifact]:
+    """The artifact to serve for `site`, or None if there is no such site."""
+    artifact = recall(site, partial=True)
+    if artifact is not None:
+        return artifact
+    root = workspace_path(site)
+    try:
+        mtime = os.path.getmtime(root)
+    except OSError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(root)
+        if cached and cached[0] == mtime:
+            _loaded.move_to_end(root)
+            return cached[1]
+    artifact = SiteArtifact.from_directory(root, site)
+    with _loaded_lock:
+        _loaded[root] = (mtime, artifact)
+        while len(_loaded) > ARTIFACT_KEEP:
+            _loaded.popitem(last=False)
+    return artifact
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """"br;q=1.0, gzip;q=0.8, *;q=0" -> {"br": 1.0, "gzip": 0.8, "*": 0.0}."""
+    accepted = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(header: str, available) -> Optional[str]:
+    """Best encoding in `available` the client accepts, or None for identity."""
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in ENCODING_PREFERENCE:
+        if coding not in available:
+            continue
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def etag_for(entry: SiteFile, encoding: str = None) -> str:
+    tag = entry.etag[:32]
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def etag_matches(header: str, tag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ and the per-encoding suffix are ignored."""
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        candidate = candidate.strip('"').split("-", 1)[0]
+        if candidate == tag:
+            return True
+    return False
+
+
+def content_type(path: str) -> str:
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if mimetype.startswith("text/") or mimetype in ("application/javascript", "application/json"):
+        mimetype += "; charset=utf-8"
+    return mimetype
+
+
+def file_response(artifact: SiteArtifact, path: str, headers) -> Response:
+    """Response for one file of `artifact`; `headers` are the request headers."""
+    entry = artifact.get(path or "index.html")
+    if entry is None:
+        SITE_RESPONSES.inc(status=404, encoding="identity")
+        return jsonify({"error": "Unknown file"}), 404
+
+    encoding = negotiate(headers.get("Accept-Encoding"), entry.variants)
+    response_headers = {
+        "ETag": etag_for(entry, encoding),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": CACHE_CONTROL,
+    }
+    if etag_matches(headers.get("If-None-Match"), entry.etag[:32]):
+        SITE_RESPONSES.inc(status=304, encoding=encoding or "identity")
+        return Response(status=304, headers=response_headers)
+
+    body = entry.variants[encoding] if encoding else entry.data
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+    SITE_RESPONSES.inc(status=200, encoding=encoding or "identity")
+    return Response(body, status=200, headers=response_headers, content_type=content_type(entry.path))
+
+
+def manifest(artifact: SiteArtifact, site: str, digest: str = None) -> dict:
+    return {
+        "site": site,
+        "digest": digest or artifact.digest(),
+        "files": {
+            f.path: {"etag": etag_for(f), "size": len(f.data), "type": content_type(f.path),
+                     "url": f"/sites/{site}/{f.path}"}
+            for f in artifact
+        },
+    }
+
+
+def manifest_response(artifact: SiteArtifact, site: str, headers) -> Response:
+    digest = artifact.digest()
+    response_headers = {"ETag": f'"{digest[:32]}"', "Cache-Control": CACHE_CONTROL}
+    if etag_matches(headers.get("If-None-Match"), digest[:32]):
+        return Response(status=304, headers=response_headers)
+    response = jsonify(manifest(artifact, site, digest))
+    response.headers.update(response_headers)
+    return response
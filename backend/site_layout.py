@@ -0,0 +1,157 @@
+"""
+site_layout.py — Shared layout ("skeleton") for two-phase page generation.
+
+With GENERATION_MODE=skeleton, website_agent asks DeepSeek for the site's layout once:
+the full document chrome (<head>, Tailwind include, header, footer) plus the real
+css/style.css and js/script.js. Page workers then generate only what goes inside <main>,
+and every page is assembled locally:
+
+    layout = parse_layout(raw_model_output) or default_layout()
+    html = assemble(layout, f"{project_title} — {page}", navbar_html, extract_main(fragment))
+
+The layout HTML carries three placeholders: {{PAGE_TITLE}}, <!-- NAVBAR --> and
+<!-- CONTENT -->. The navbar is still built locally (website_agent._build_navbar), so
+the layout does not depend on the page list. Fragments only use Tailwind utility
+classes and never see the layout, so the layout call runs alongside the page calls.
+"""
+
+import re
+from collections import namedtuple
+from typing import List
+
+from html_sanitizer import check_structure, inject_navbar
+
+Layout = namedtuple("Layout", ["html", "css", "js", "generated"])
+
+TITLE = "{{PAGE_TITLE}}"
+NAVBAR = "<!-- NAVBAR -->"
+CONTENT = "<!-- CONTENT -->"
+
+DEFAULT_CSS = "/* Custom styles */\n"
+DEFAULT_JS = "// Custom JS\n"
+# Same document website_agent has always wrapped fragments in.
+DEFAULT_HTML = (
+    "<!DOCTYPE html>\n"
+    "<html lang='en'>\n"
+    "<head>\n"
+    f"  <title>{TITLE}</title>\n"
+    "  <meta charset='utf-8'>\n"
+    "  <meta name='viewport' content='width=device-width, initial-scale=1'>\n"
+    "  <script src='https://cdn.tailwindcss.com'></script>\n"
+    "  <link href='css/style.css' rel='stylesheet'>\n"
+    "</head>\n"
+    "<body>\n"
+    f"{NAVBAR}\n\n{CONTENT}\n"
+    "<script src='js/script.js'></script>\n"
+    "</body>\n"
+    "</html>\n"
+)
+
+LAYOUT_PROMPT = (
+    "You are an expert Front-End Developer and UI/UX designer.\n"
+    "Design the shared layout of a professional, fully responsive multi-page website: the parts every page has in common.\n"
+    "Return exactly three fenced code blocks, in this order and nothing else:\n"
+    "1. ```html — one complete HTML document (<!DOCTYPE html>) that:\n"
+    "   - includes <script src=\"https://cdn.tailwindcss.com\"></script> and <link href=\"css/style.css\" rel=\"stylesheet\"> in <head>;\n"
+    f"   - uses {TITLE} as the text of <title>;\n"
+    f"   - contains {NAVBAR} exactly where the site navigation goes (do not write a navbar yourself);\n"
+    f"   - contains <main>{CONTENT}</main> exactly once, between a header and a footer;\n"
+    "   - loads <script src=\"js/script.js\"></script> right before </body>;\n"
+    "   - contains no page-specific content.\n"
+    "2. ```css — the contents of css/style.css (theme colours, typography, shared components).\n"
+    "3. ```js — the contents of js/script.js (shared behaviour such as mobile menu toggles or scroll effects).\n"
+    "Do NOT include explanations."
+)
+
+FRAGMENT_PROMPT = (
+    "You are an expert Front-End Developer and UI/UX designer.\n"
+    "Write the content of ONE page of a multi-page website whose shared layout (head, navbar, header, footer, "
+    "Tailwind include) already exists.\n"
+    "Return ONLY the HTML that goes inside <main>: sections, headings, text, cards, forms, images.\n"
+    "Do NOT include <!DOCTYPE>, <html>, <head>, <body>, <main>, <nav>, a header or a footer.\n"
+    "Style with TailwindCSS utility classes only. Do NOT include explanations."
+)
+
+_BLOCK_RE = re.compile(r"```[ \t]*([\w+-]*)[^\n]*\n(.*?)```", re.DOTALL)
+_LANGS = {"": "html", "html": "html", "css": "css", "js": "js", "javascript": "js"}
+_MAIN_RE = re.compile(r"<main\b[^>]*>(.*)</main\s*>", re.IGNORECASE | re.DOTALL)
+_BODY_RE = re.compile(r"<body\b[^>]*>(.*?)(?:</body\s*>|\Z)", re.IGNORECASE | re.DOTALL)
+
+
+def default_layout() -> Layout:
+    return Layout(DEFAULT_HTML, DEFAULT_CSS, DEFAULT_JS, False)
+
+
+def layout_messages(project_title: str, features_list: List[str], notes: str) -> list:
+    user_prompt = (
+        f"Project: {project_title}\n"
+        f"Features: {', '.join(features_list)}\n"
+        f"Notes: {notes}\n\n"
+        "Generate the shared layout, style.css and script.js for this site."
+    )
+    return [
+        {"role": "system", "content": LAYOUT_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def fragment_messages(page: str, project_title: str, features_list: List[str], notes: str) -> list:
+    user_prompt = (
+        f"Project: {project_title}\n"
+        f"Page: {page}\n"
+        f"Features: {', '.join(features_list)}\n"
+        f"Notes: {notes}\n\n"
+        f"Generate ONLY the inner HTML of <main> for the {page} page."
+    )
+    return [
+        {"role": "system", "content": FRAGMENT_PROMPT},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def parse_layout(raw: str):
+    """Layout from the model's three fenced blocks, or None if the HTML is unusable."""
+    blocks = {}
+    for lang, body in _BLOCK_RE.findall(raw or ""):
+        kind = _LANGS.get(lang.lower())
+        if kind and kind not in blocks:
+            blocks[kind] = body.strip()
+
+    html = blocks.get("html") or ""
+    if html.count(CONTENT) != 1:
+        return None
+    result = check_structure(html)
+    if not result.has_doctype or result.issues or result.body_start is None:
+        return None
+    if NAVBAR not in html:
+        html = inject_navbar(result, NAVBAR)
+    if "css/style.css" not in html:
+        html = html.replace("</head>", "  <link href='css/style.css' rel='stylesheet'>\n</head>", 1)
+    if "js/script.js" not in html:
+        at = html.lower().rfind("</body")
+        html = html[:at] + "<script src='js/script.js'></script>\n" + html[at:]
+
+    css = blocks.get("css") or DEFAULT_CSS
+    js = blocks.get("js") or DEFAULT_JS
+    return Layout(html, css.rstrip() + "\n", js.rstrip() + "\n", True)
+
+
+def extract_main(fragment: str) -> str:
+    """Inner HTML of <main> (or <body>) if the model wrapped its fragment anyway."""
+    if "<main" in fragment or "<MAIN" in fragment:
+        m = _MAIN_RE.search(fragment)
+        if m:
+            return m.group(1).strip()
+    if "<body" in fragment or "<BODY" in fragment:
+        m = _BODY_RE.search(fragment)
+        if m:
+            return m.group(1).strip()
+    return fragment
+
+
+def assemble(layout: Layout, title: str, navbar_html: str, content: str) -> str:
+    """Fill the layout placeholders; content is inserted last so it is never rewritten."""
+    before, after = layout.html.split(CONTENT, 1)
+    before = before.replace(TITLE, title).replace(NAVBAR, navbar_html)
+    after = after.replace(TITLE, title).replace(NAVBAR, navbar_html)
+    return before + content + after
@@ -0,0 +1,361 @@
+"""
+site_optimizer.py — Asset optimization of a generated site before it is deployed.
+
+    optimized = optimize_site(artifact)   # a new SiteArtifact; `artifact` itself is unchanged
+    start_deploy(artifact=artifact)       # auto_deploy optimizes on its own (SITE_OPTIMIZE)
+
+The stages work on the artifact in memory. Pages are scanned and rewritten on a thread
+pool (OPTIMIZE_WORKERS).
+
+1. Each page is scanned for its inline <style> and <script> blocks, the class names it
+   uses, the Tailwind Play CDN include and its inline tailwind.config.
+2. Inline blocks found on every page are hoisted once into css/style.css or js/script.js
+   and removed from the pages. A block on only some pages stays inline: the shared files
+   load on every page, and a script written for one page may fail on another. Scripts
+   that set up Tailwind are never hoisted.
+3. If the Tailwind standalone CLI is available (TAILWIND_CLI, or `tailwindcss` on PATH),
+   the utilities the pages actually use are compiled into css/style.css with the site's
+   tailwind.config. The CDN script is then dropped; it downloads a ~100 KB compiler and
+   builds the CSS in the browser on every page load. Without the CLI the pages keep the CDN.
+4. Rules in css/style.css are purged when their selectors need a class that no page or
+   script mentions. The CSS is then minified. Pages are minified as well: comments go, and
+   runs of whitespace outside <pre>, <textarea>, <script> and <style> are collapsed.
+5. The shared files get content-hashed names, such as css/style.3f2a9c1e5b.css, and the
+   pages point at them. A Netlify _headers file marks those paths immutable for a year.
+
+Results are kept per site digest, so deploying the same site again costs nothing.
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from site_artifact import ARTIFACT_KEEP, SiteArtifact
+from telemetry import counter, span
+
+SITE_OPTIMIZE = os.environ.get("SITE_OPTIMIZE", "1") != "0"
+OPTIMIZE_WORKERS = int(os.environ.get("OPTIMIZE_WORKERS", 4))
+TAILWIND_CLI = os.environ.get("TAILWIND_CLI") or shutil.which("tailwindcss")
+TAILWIND_TIMEOUT = float(os.environ.get("TAILWIND_TIMEOUT", 60))
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+STYLE_PATH = "css/style.css"
+SCRIPT_PATH = "js/script.js"
+
+OPTIMIZED_BYTES = counter("site_optimizer_bytes_total", "Site bytes before and after optimization.", ("stage",))
+
+_STYLE_RE = re.compile(r"<style(?:\s+type\s*=\s*[\"']text/css[\"'])?\s*>(.*?)</style\s*>\s*", re.I | re.S)
+_TW_STYLE_RE = re.compile(r"<style\s+type\s*=\s*[\"']text/tailwindcss[\"']\s*>(.*?)</style\s*>\s*", re.I | re.S)
+_SCRIPT_RE = re.compile(r"<script(?:\s+type\s*=\s*[\"'](?:text|application)/javascript[\"'])?\s*>(.*?)</script\s*>\s*",
+                        re.I | re.S)
+_CDN_RE = re.compile(r"<script\b[^>]*\bsrc\s*=\s*[\"']https?://cdn\.tailwindcss\.com[^\"']*[\"'][^>]*>\s*</script\s*>\s*",
+                     re.I)
+_CONFIG_RE = re.compile(r"\btailwind\.config\s*=\s*")
+_CLASS_ATTR_RE = re.compile(r"\bclass\s*=\s*(?:\"([^\"]*)\"|'([^']*)')", re.I)
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_-]+")
+_SELECTOR_CLASS_RE = re.compile(r"\.((?:[A-Za-z0-9_-]|\\.)+)")
+_OPAQUE_SELECTOR_RE = re.compile(r":(?:not|is|where|has|matches)\(", re.I)
+_PROTECTED_RE = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2\s*>)", re.I | re.S)
+_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_CSS_TOKEN_RE = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|/\*.*?\*/", re.S)
+_HASHED_RE = re.compile(r"^(?:css/style|js/script)\.[0-9a-f]{10}\.(?:css|js)$")
+
+
+def is_hashed_asset(path: str) -> bool:
+    """True for a shared file renamed by optimize_site (css/style.<hash>.css, js/script.<hash>.js)."""
+    return bool(_HASHED_RE.match(path))
+
+
+def hashed_name(path: str, content: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]}{ext}"
+
+
+# -----------------------------
+# Per page (run on the pool)
+# -----------------------------
+def scan_page(html: str) -> dict:
+    """Inline blocks, used class names and the Tailwind setup of one page."""
+    scripts = [m.group(1).strip() for m in _SCRIPT_RE.finditer(html)]
+    used = set()
+    for m in _CLASS_ATTR_RE.finditer(html):
+        used.update((m.group(1) or m.group(2) or "").split())
+    for script in scripts:
+        # classes added from script (classList.add("hidden")) count as used
+        used.update(_TOKEN_RE.findall(script))
+    configs = [tailwind_config(s) for s in scripts if _CONFIG_RE.search(s)]
+    return {
+        "styles": [m.group(1).strip() for m in _STYLE_RE.finditer(html) if m.group(1).strip()],
+        "scripts": [s for s in scripts if s and "tailwind" not in s],
+        "tailwind_styles": [m.group(1).strip() for m in _TW_STYLE_RE.finditer(html)],
+        "tailwind_cdn": bool(_CDN_RE.search(html)),
+        "tailwind_config": configs[0] if configs else None,
+        "used": used,
+    }
+
+
+def tailwind_config(script: str) -> Optional[str]:
+    """The object literal assigned to tailwind.config in an inline script, or None."""
+    m = _CONFIG_RE.search(script)
+    if not m or script[m.end():m.end() + 1] != "{":
+        return None
+    depth, quote = 0, None
+    for i in range(m.end(), len(script)):
+        ch = script[i]
+        if quote:
+            if ch == "\\":
+                continue
+            if ch == quote and script[i - 1] != "\\":
+                quote = None
+        elif ch in "\"'`":
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return script[m.end():i + 1]
+    return None
+
+
+def rewrite_page(html: str, hoisted_styles: set, hoisted_scripts: set, drop_tailwind: bool,
+                 assets: Dict[str, str]) -> str:
+    """Remove hoisted blocks (and the Tailwind CDN setup), point at the hashed assets, minify."""
+    html = _STYLE_RE.sub(lambda m: "" if m.group(1).strip() in hoisted_styles else m.group(0), html)
+    html = _SCRIPT_RE.sub(lambda m: "" if m.group(1).strip() in hoisted_scripts else m.group(0), html)
+    if drop_tailwind:
+        html = _CDN_RE.sub("", html)
+        html = _TW_STYLE_RE.sub("", html)
+        html = _SCRIPT_RE.sub(lambda m: "" if _CONFIG_RE.search(m.group(1)) else m.group(0), html)
+    html = link_assets(html, assets, need_style=bool(hoisted_styles) or drop_tailwind,
+                       need_script=bool(hoisted_scripts))
+    return minify_html(html)
+
+
+def link_assets(html: str, assets: Dict[str, str], need_style: bool = False, need_script: bool = False) -> str:
+    """Point references to the shared files at their new names; add the tags a page needs but lacks."""
+    for path, new_path in assets.items():
+        html = re.sub(r"([\"'])((?:\.{0,2}/)*)%s(?:\?[^\"']*)?\1" % re.escape(path),
+                      lambda m: f"{m.group(1)}{m.group(2)}{new_path}{m.group(1)}", html)
+    style, script = assets.get(STYLE_PATH), assets.get(SCRIPT_PATH)
+    if need_style and style and style not in html:
+        at = html.lower().find("</head")
+        if at != -1:
+            html = html[:at] + f"<link href='{style}' rel='stylesheet'>\n" + html[at:]
+    if need_script and script and script not in html:
+        at = html.lower().rfind("</body")
+        if at != -1:
+            html = html[:at] + f"<script src='{script}'></script>\n" + html[at:]
+    return html
+
+
+def minify_html(html: str) -> str:
+    out, pos = [], 0
+    for m in _PROTECTED_RE.finditer(html):
+        out.append(_squeeze_html(html[pos:m.start()]))
+        out.append(m.group(1))
+        pos = m.end()
+    out.append(_squeeze_html(html[pos:]))
+    return "".join(out).strip() + "\n"
+
+
+def _squeeze_html(text: str) -> str:
+    return re.sub(r"\s+", " ", _COMMENT_RE.sub("", text))
+
+
+# -----------------------------
+# Shared CSS
+# -----------------------------
+def minify_css(css: str) -> str:
+    """Drop comments and whitespace around punctuation; strings are left alone."""
+    out, pos = [], 0
+    for m in _CSS_TOKEN_RE.finditer(css):
+        out.append(_squeeze_css(css[pos:m.start()]))
+        if m.group(1):
+            out.append(m.group(1))
+        pos = m.end()
+    out.append(_squeeze_css(css[pos:]))
+    css = "".join(out).strip()
+    return css + "\n" if css else ""
+
+
+def _squeeze_css(text: str) -> str:
+    text = re.sub(r"\s*([{};,])\s*", r"\1", re.sub(r"\s+", " ", text))
+    return re.sub(r":\s+", ":", text)
+
+
+def purge_css(css: str, used: set) -> str:
+    """Drop top-level rules none of whose selectors can match (a required class is never used)."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    out, pos = [], 0
+    while True:
+        brace = css.find("{", pos)
+        if brace == -1:
+            out.append(css[pos:])
+            break
+        selector = css[pos:brace]
+        if selector.strip().startswith("@"):
+            end = _block_end(css, brace)
+            keep = True
+        else:
+            end = css.find("}", brace) + 1
+            keep = any(_selector_alive(s, used) for s in selector.split(","))
+        if end <= 0:
+            out.append(css[pos:])
+            break
+        if keep:
+            out.append(css[pos:end])
+        pos = end
+    return "".join(out)
+
+
+def _block_end(css: str, brace: int) -> int:
+    depth = 0
+    for i in range(brace, len(css)):
+        if css[i] == "{":
+            depth += 1
+        elif css[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return -1
+
+
+def _selector_alive(selector: str, used: set) -> bool:
+    if _OPAQUE_SELECTOR_RE.search(selector):
+        return True
+    classes = (re.sub(r"\\(.)", r"\1", c) for c in _SELECTOR_CLASS_RE.findall(selector))
+    return all(c in used for c in classes)
+
+
+def compile_tailwind(pages: Dict[str, str], config: Optional[str], extra_css: List[str]) -> Optional[str]:
+    """Minified Tailwind CSS for the classes used in `pages`, or None if the CLI is missing or fails."""
+    if not TAILWIND_CLI:
+        return None
+    with tempfile.TemporaryDirectory(prefix="tailwind-") as tmp:
+        for i, html in enumerate(pages.values()):
+            with open(os.path.join(tmp, f"page{i}.html"), "w", encoding="utf-8") as fh:
+                fh.write(html)
+        with open(os.path.join(tmp, "tailwind.config.js"), "w", encoding="utf-8") as fh:
+            content = json.dumps([os.path.join(tmp, "*.html")])
+            fh.write(f"module.exports = Object.assign({config or '{}'}, {{content: {content}}});\n")
+        with open(os.path.join(tmp, "input.css"), "w", encoding="utf-8") as fh:
+            fh.write("@tailwind base;\n@tailwind components;\n@tailwind utilities;\n" + "\n".join(extra_css))
+        out_path = os.path.join(tmp, "output.css")
+        try:
+            proc = subprocess.run(
+                [TAILWIND_CLI, "-c", os.path.join(tmp, "tailwind.config.js"), "-i", os.path.join(tmp, "input.css"),
+                 "-o", out_path, "--minify"],
+                capture_output=True, text=True, timeout=TAILWIND_TIMEOUT,
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.warning("Tailwind CLI failed (%s); pages keep the CDN", e)
+            return None
+        if proc.returncode != 0 or not os.path.exists(out_path):
+            logging.warning("Tailwind CLI exited with %s: %.500s", proc.returncode, proc.stderr)
+            return None
+        with open(out_path, encoding="utf-8") as fh:
+            return fh.read()
+
+
+# -----------------------------
+# Whole site
+# -----------------------------
+_optimized: "OrderedDict[str, SiteArtifact]" = OrderedDict()
+_optimized_lock = threading.Lock()
+
+
+def _on_every_page(per_page: List[List[str]]) -> List[str]:
+    """Blocks present on every page, once each, in the order of the first page."""
+    if not per_page:
+        return []
+    common = set(per_page[0]).intersection(*map(set, per_page[1:]))
+    return list(OrderedDict.fromkeys(b for b in per_page[0] if b in common))
+
+
+def _text(artifact: SiteArtifact, path: str) -> str:
+    entry = artifact.get(path)
+    return entry.data.decode("utf-8") if entry else ""
+
+
+def _tailwind_css(pages: Dict[str, str], scans: List[dict]) -> Optional[str]:
+    # every page must use the CDN (the compiled preflight would restyle the others)
+    if not TAILWIND_CLI or not scans or not all(s["tailwind_cdn"] for s in scans):
+        return None
+    configs = {s["tailwind_config"] for s in scans if s["tailwind_config"]}
+    if len(configs) > 1:
+        logging.info("Pages have different tailwind.config; keeping the Tailwind CDN")
+        return None
+    extra = list(OrderedDict.fromkeys(css for s in scans for css in s["tailwind_styles"]))
+    return compile_tailwind(pages, next(iter(configs), None), extra)
+
+
+def optimize_site(artifact: SiteArtifact) -> SiteArtifact:
+    """The deployable version of `artifact` (cached per site digest)."""
+    digest = artifact.digest()
+    with _optimized_lock:
+        cached = _optimized.get(digest)
+    if cached is not None:
+        return cached
+
+    with span("site.optimize", site=artifact.workspace, files=len(artifact)) as opt_span:
+        pages = artifact.pages()
+        paths = list(pages)
+        with ThreadPoolExecutor(max_workers=max(1, min(OPTIMIZE_WORKERS, len(paths))),
+                                thread_name_prefix="optimize") as pool:
+            scans = list(pool.map(scan_page, (pages[p] for p in paths)))
+
+            hoisted_styles = _on_every_page([s["styles"] for s in scans])
+            hoisted_scripts = _on_every_page([s["scripts"] for s in scans])
+            script = _text(artifact, SCRIPT_PATH)
+            used = set(_TOKEN_RE.findall(script)).union(*(s["used"] for s in scans))
+
+            tailwind = _tailwind_css(pages, scans)
+            custom = purge_css("\n".join([_text(artifact, STYLE_PATH)] + hoisted_styles), used)
+            # after the site's own CSS, where the CDN injected its styles
+            css = minify_css(custom + "\n" + (tailwind or ""))
+            js = "".join(block.rstrip().rstrip(";") + ";\n" for block in [script] + hoisted_scripts if block.strip())
+            assets = {STYLE_PATH: hashed_name(STYLE_PATH, css), SCRIPT_PATH: hashed_name(SCRIPT_PATH, js)}
+
+            rewritten = dict(zip(paths, pool.map(
+                lambda html: rewrite_page(html, set(hoisted_styles), set(hoisted_scripts), tailwind is not None, assets),
+                (pages[p] for p in paths),
+            )))
+
+        optimized = SiteArtifact(artifact.workspace, artifact_id=artifact.id)
+        for f in artifact:
+            if f.path in rewritten:
+                optimized.add(f.path, rewritten[f.path])
+            elif f.path in assets:
+                # kept only while a page still refers to the old name in a way link_assets missed
+                if any(f.path in html for html in rewritten.values()):
+                    optimized.add(f.path, f.data)
+            else:
+                optimized.add(f.path, f.data)
+        optimized.add(assets[STYLE_PATH], css)
+        optimized.add(assets[SCRIPT_PATH], js)
+        optimized.add("_headers", "".join(f"/{path}\n  Cache-Control: {IMMUTABLE}\n" for path in assets.values()))
+
+        before, after = artifact.size(), optimized.size()
+        OPTIMIZED_BYTES.inc(before, stage="before")
+        OPTIMIZED_BYTES.inc(after, stage="after")
+        opt_span.set(bytes_before=before, bytes_after=after, hoisted=len(hoisted_styles) + len(hoisted_scripts),
+                     tailwind="compiled" if tailwind is not None else "cdn")
+    logging.info("Optimized %s: %d -> %d bytes, %d inline blocks hoisted, Tailwind %s", artifact.workspace,
+                 before, after, len(hoisted_styles) + len(hoisted_scripts),
+                 "compiled" if tailwind is not None else "from CDN")
+
+    with _optimized_lock:
+        _optimized[digest] = optimized
+        while len(_optimized) > ARTIFACT_KEEP:
+            _optimized.popitem(last=False)
+    return optimized
@@ -0,0 +1,346 @@
+"""
+telemetry.py — In-process tracing and metrics for the generation / deploy pipeline.
+
+- span("website.page", page="About") times a block, links it to the enclosing span
+  (contextvars, so nesting works across coroutines; use bind() to carry the current
+  span into executor threads) and feeds stage_duration_seconds{stage=...}.
+- Counters and histograms are kept per label set and rendered in the Prometheus text
+  exposition format by render_prometheus() (GET /metrics in main.py). Each metric keeps
+  at most TELEMETRY_MAX_SERIES label sets; extra ones are folded into "_other".
+- Finished spans are kept in a ring buffer (TELEMETRY_SPAN_BUFFER) for GET /traces and,
+  if TELEMETRY_TRACE_FILE is set, appended to that file as JSON lines.
+
+Stdlib only; recording a span or sample is a dict update under a lock.
+"""
+
+import os
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+SPAN_BUFFER = int(os.environ.get("TELEMETRY_SPAN_BUFFER", 5000))
+TRACE_FILE = os.environ.get("TELEMETRY_TRACE_FILE")
+MAX_SERIES = int(os.environ.get("TELEMETRY_MAX_SERIES", 500))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object], series: dict) -> Tuple[str, ...]:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        if key not in series and len(series) >= MAX_SERIES:
+            key = ("_other",) * len(self.labelnames)
+        return key
+
+    def _labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            key = self._key(labels, self._values)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0)
+
+    def total(self, **labels) -> float:
+        """Sum over all series, or over those matching the given labels."""
+        want = [(i, str(labels[n])) for i, n in enumerate(self.labelnames) if n in labels]
+        with self._lock:
+            return sum(v for k, v in self._values.items() if all(k[i] == x for i, x in want))
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(k)} {_num(v)}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per series: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        with self._lock:
+            key = self._key(labels, self._series)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                running = 0
+                for bound, count in zip(self.buckets, counts):
+                    running += count
+                    le = 'le="%s"' % _num(bound)
+                    lines.append(f"{self.name}_bucket{self._labels(key, le)} {running}")
+                running += counts[-1]
+                lines.append(f"{self.name}_bucket{self._labels(key, _INF_LABEL)} {running}")
+                lines.append(f"{self.name}_sum{self._labels(key)} {_num(total)}")
+                lines.append(f"{self.name}_count{self._labels(key)} {running}")
+        return lines
+
+
+_INF_LABEL = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+_metrics: Dict[str, _Metric] = {}
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, help, labelnames, **kw):
+    with _registry_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, help, labelnames, **kw)
+        return metric
+
+
+def counter(name: str, help: str, labelnames=()) -> Counter:
+    return _register(Counter, name, help, labelnames)
+
+
+def histogram(name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help, labelnames, buckets=buckets)
+
+
+def register_collector(fn) -> None:
+    """fn() -> iterable of (name, help, {labels}, value), rendered as gauges on every scrape."""
+    with _registry_lock:
+        _collectors.append(fn)
+
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        metrics = list(_metrics.values())
+        collectors = list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+
+    gauges: Dict[str, Tuple[str, List[str]]] = {}
+    for collect in collectors:
+        try:
+            samples = list(collect())
+        except Exception as e:
+            logging.warning("Telemetry collector failed: %s", e)
+            continue
+        for name, help, labels, value in samples:
+            if value is None:
+                continue
+            label_str = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+            sample = f"{name}{{{label_str}}} {_num(value)}" if label_str else f"{name} {_num(value)}"
+            gauges.setdefault(name, (help, []))[1].append(sample)
+    for name, (help, samples) in gauges.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+# Pipeline metrics shared by the instrumented modules
+STAGE_SECONDS = histogram("stage_duration_seconds", "Wall-clock time per pipeline stage (span).",
+                          ("stage", "status"))
+LLM_REQUESTS = counter("llm_requests_total", "LLM API calls by provider, model and HTTP status.",
+                       ("provider", "model", "status"))
+LLM_SECONDS = histogram("llm_request_duration_seconds", "LLM API call latency (after admission).",
+                        ("provider", "model"))
+LLM_TOKENS = counter("llm_tokens_total", "Tokens reported in LLM responses.", ("provider", "model", "kind"))
+RETRIES = counter("retries_total", "Retried calls by component and reason.", ("component", "reason"))
+BACKOFF_SECONDS = counter("backoff_seconds_total", "Time spent sleeping before retries.", ("component",))
+PAGE_SECONDS = histogram("page_generation_seconds", "Time to produce one page, cache hits included.",
+                         ("page", "source"))
+
+
+def record_llm_call(provider: str, model: str, status, seconds: float, usage: dict = None) -> None:
+    """Count one LLM HTTP call (status "error" for transport failures) and its token usage."""
+    LLM_REQUESTS.inc(provider=provider, model=model, status=status)
+    LLM_SECONDS.observe(seconds, provider=provider, model=model)
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if usage and usage.get(kind):
+            LLM_TOKENS.inc(usage[kind], provider=provider, model=model, kind=kind[:-len("_tokens")])
+    current = _current_span.get()
+    if current is not None and usage:
+        current.set(tokens=usage.get("total_tokens"))
+
+
+class LLMCall:
+    """Handle yielded by llm_call(); finish() records status, latency and token usage once."""
+
+    def __init__(self, provider: str, model: str, span: "Span"):
+        self.provider = provider
+        self.model = model
+        self.span = span
+        self.started = time.perf_counter()
+        self.recorded = False
+
+    def finish(self, status, usage: dict = None) -> None:
+        if self.recorded:
+            return
+        self.recorded = True
+        self.span.set(status_code=status)
+        record_llm_call(self.provider, self.model, status, time.perf_counter() - self.started, usage)
+
+
+@contextmanager
+def llm_call(provider: str, model: str, **attrs):
+    """Span + metrics for one LLM HTTP attempt; unfinished calls are recorded as "error"."""
+    with span("llm.call", provider=provider, model=model, **attrs) as s:
+        call = LLMCall(provider, model, s)
+        try:
+            yield call
+        finally:
+            call.finish("error")
+
+
+def record_retry(component: str, reason: str, wait: float = 0.0) -> None:
+    RETRIES.inc(component=component, reason=reason)
+    if wait:
+        BACKOFF_SECONDS.inc(wait, component=component)
+
+
+# -----------------------------
+# Spans
+# -----------------------------
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attrs", "status", "thread")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: dict):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration = None
+        self.attrs = attrs
+        self.status = "ok"
+        self.thread = threading.current_thread().name
+
+    def set(self, **attrs) -> None:
+        self.attrs.update({k: v for k, v in attrs.items() if v is not None})
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "start": self.start, "duration": self.duration,
+            "status": self.status, "thread": self.thread, "attrs": self.attrs,
+        }
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("telemetry_span", default=None)
+_finished: deque = deque(maxlen=SPAN_BUFFER)
+_trace_file_lock = threading.Lock()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    s = Span(name, _current_span.get(), {k: v for k, v in attrs.items() if v is not None})
+    token = _current_span.set(s)
+    started = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.attrs.setdefault("error", f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        s.duration = time.perf_counter() - started
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass  # exited from another context (e.g. a generator resumed elsewhere)
+        _finish(s)
+
+
+def _finish(s: Span) -> None:
+    STAGE_SECONDS.observe(s.duration, stage=s.name, status=s.status)
+    _finished.append(s)
+    if TRACE_FILE:
+        line = json.dumps(s.to_dict(), default=str)
+        with _trace_file_lock:
+            with open(TRACE_FILE, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+def bind(fn):
+    """Wrap fn so it runs with the caller's current span as parent (for executor threads)."""
+    ctx = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        # copy again so concurrent calls of the same wrapper don't share one Context
+        return ctx.copy().run(fn, *args, **kwargs)
+    return bound
+
+
+def recent_spans(trace_id: str = None, limit: int = 1000) -> List[dict]:
+    spans = [s for s in list(_finished) if trace_id is None or s.trace_id == trace_id]
+    return [s.to_dict() for s in spans[-limit:]]
+
+
+def chrome_trace(spans: List[dict]) -> dict:
+    """Convert span dicts to the Chrome trace event format (chrome://tracing, Perfetto)."""
+    threads: Dict[str, int] = {}
+    events = []
+    for s in spans:
+        tid = threads.setdefault(s["thread"], len(threads) + 1)
+        events.append({
+            "name": s["name"], "ph": "X", "pid": 1, "tid": tid,
+            "ts": int(s["start"] * 1e6), "dur": int((s["duration"] or 0) * 1e6),
+            "args": dict(s["attrs"], trace_id=s["trace_id"], status=s["status"]),
+        })
+    events.extend({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                  for name, tid in threads.items())
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
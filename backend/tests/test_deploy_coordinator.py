@@ -0,0 +1,110 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import auto_deploy
+import github_client
+from deploy_coordinator import DeployCoordinator, by_workspace
+from mock_servers import FakeGitHubServer
+from site_artifact import SiteArtifact
+
+
+def site(workspace, body):
+    artifact = SiteArtifact(workspace)
+    artifact.add("index.html", f"<!DOCTYPE html><html><body>{body}</body></html>")
+    return artifact
+
+
+@pytest.fixture
+def github(monkeypatch):
+    with FakeGitHubServer() as server:
+        monkeypatch.setattr(github_client, "GITHUB_API_URL", server.url)
+        monkeypatch.setattr(auto_deploy, "GITHUB_TOKEN", "test-token")
+        yield server
+
+
+def head_files(server):
+    tree = server.trees[server.commits[server.heads["main"]]["tree"]]
+    return {path: server.blobs[sha].decode() for path, sha in tree.items()}
+
+
+def test_by_workspace_keeps_the_latest_artifact():
+    a1, b1, a2 = site("a", 1), site("b", 1), site("a", 2)
+    futures = [Future(), Future(), Future()]
+    groups = by_workspace(list(zip([a1, b1, a2], futures)))
+    assert groups == [(b1, [futures[1]]), (a2, [futures[0], futures[2]])]
+
+
+def test_same_workspace_requests_share_one_commit(github):
+    pushed = []
+
+    def push(artifact, requests):
+        pushed.append((artifact.workspace, requests))
+        return auto_deploy.push_artifact(artifact, "owner/repo", commit_message=f"deploy ({requests})")
+
+    coordinator = DeployCoordinator(push, window=0.2, max_delay=2)
+    futures = [coordinator.submit(site("shop", n)) for n in range(3)]
+    results = [f.result(5) for f in futures]
+
+    assert pushed == [("shop", 3)]
+    assert len({r.commit_sha for r in results}) == 1
+    assert results[0].commit_sha == github.heads["main"]
+    assert head_files(github)["index.html"].endswith("<body>2</body></html>")
+    assert coordinator.stats() == {"pending": 0, "requests": 3, "batches": 1}
+
+
+def test_different_sites_are_pushed_separately(github):
+    pushed = []
+
+    def push(artifact, requests):
+        pushed.append(artifact.workspace)
+        return auto_deploy.push_artifact(artifact, "owner/repo")
+
+    coordinator = DeployCoordinator(push, window=0.2, max_delay=2)
+    shop, blog = coordinator.submit(site("shop", "shop")), coordinator.submit(site("blog", "blog"))
+    assert shop.result(5).commit_sha != blog.result(5).commit_sha
+    assert pushed == ["shop", "blog"]
+    assert coordinator.stats()["batches"] == 1
+
+
+def test_unchanged_site_makes_no_commit(github):
+    coordinator = DeployCoordinator(lambda artifact, n: auto_deploy.push_artifact(artifact, "owner/repo"),
+                                    window=0.05)
+    first = coordinator.submit(site("shop", "same")).result(5)
+    second = coordinator.submit(site("shop", "same")).result(5)
+    assert first.changed and not second.changed
+    assert second.commit_sha == first.commit_sha
+
+
+def test_requests_during_a_push_go_into_the_next_batch():
+    started, release, pushed = threading.Event(), threading.Event(), []
+
+    def push(artifact, requests):
+        pushed.append((artifact.workspace, requests))
+        started.set()
+        release.wait(5)
+        return artifact.workspace
+
+    coordinator = DeployCoordinator(push, window=0.05)
+    first = coordinator.submit(site("shop", 1))
+    assert started.wait(5)
+    later = [coordinator.submit(site("shop", n)) for n in (2, 3)]
+    time.sleep(0.1)
+    release.set()
+    assert first.result(5) == "shop" and all(f.result(5) == "shop" for f in later)
+    assert pushed == [("shop", 1), ("shop", 2)]
+
+
+def test_a_failed_push_fails_only_its_workspace():
+    def push(artifact, requests):
+        if artifact.workspace == "broken":
+            raise RuntimeError("push failed")
+        return "ok"
+
+    coordinator = DeployCoordinator(push, window=0.1)
+    broken, fine = coordinator.submit(site("broken", 1)), coordinator.submit(site("fine", 1))
+    with pytest.raises(RuntimeError):
+        broken.result(5)
+    assert fine.result(5) == "ok"
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from hedging import HedgePolicy, ModelStats, hedged, hedged_async
+from mock_servers import FakeChatCompletionsServer
+
+
+def caller(server):
+    def call(cancel=None):
+        resp = requests.post(f"{server.url}/chat/completions", json={"messages": []}, timeout=5)
+        resp.raise_for_status()
+        return resp.json()["choices"][0]["message"]["content"]
+    return call
+
+
+def policy(**kwargs):
+    kwargs.setdefault("default_delay", 0.1)
+    kwargs.setdefault("min_delay", 0.01)
+    return HedgePolicy(ModelStats(min_samples=3), **kwargs)
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server = FakeChatCompletionsServer(**kwargs).start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def test_fast_primary_wins_without_hedging(servers):
+    primary, fallback = servers(content="primary"), servers(content="fallback")
+    assert hedged([("a", caller(primary)), ("b", caller(fallback))], policy(default_delay=2)) == ("a", "primary")
+    assert fallback.requests == []
+
+
+def test_slow_primary_is_hedged_and_loses(servers):
+    primary, fallback = servers(content="primary", delay=1.0), servers(content="fallback")
+    p = policy()
+    started = time.perf_counter()
+    assert hedged([("a", caller(primary)), ("b", caller(fallback))], p) == ("b", "fallback")
+    assert time.perf_counter() - started < 0.8
+    # the loser is recorded as a latency sample, not as a call
+    assert p.stats.snapshot()["a"]["calls"] == 0
+
+
+def test_failure_fires_the_next_call_at_once(servers):
+    primary, fallback = servers(rate_limit=1.0), servers(content="fallback")
+    started = time.perf_counter()
+    assert hedged([("a", caller(primary)), ("b", caller(fallback))], policy(default_delay=5)) == ("b", "fallback")
+    assert time.perf_counter() - started < 2
+
+
+def test_validate_rejects_a_result(servers):
+    primary, fallback = servers(content="not json"), servers(content="{}")
+    p = policy(default_delay=5)
+    assert hedged([("a", caller(primary)), ("b", caller(fallback))], p,
+                  validate=lambda r: r.startswith("{")) == ("b", "{}")
+    assert p.stats.success_rate("a") < 1
+
+
+def test_all_failing(servers):
+    down = servers(rate_limit=1.0)
+    with pytest.raises(requests.HTTPError):
+        hedged([("a", caller(down)), ("b", caller(down))], policy())
+    assert hedged([("a", lambda cancel: None), ("b", lambda cancel: None)], policy()) == (None, None)
+
+
+def test_reorder_puts_the_faster_model_first():
+    p = policy()
+    for _ in range(3):
+        p.stats.record("slow", 2.0, True)
+        p.stats.record("fast", 0.1, True)
+    calls = [("slow", None), ("fast", None)]
+    assert [name for name, _ in p.order(calls)] == ["fast", "slow"]
+    assert [name for name, _ in policy(reorder=False).order(calls)] == ["slow", "fast"]
+
+
+def test_async_hedge_cancels_the_loser(servers):
+    primary, fallback = servers(content="primary", delay=1.0), servers(content="fallback")
+    cancelled = []
+
+    def acaller(server):
+        async def call():
+            try:
+                return await asyncio.to_thread(caller(server))
+            except asyncio.CancelledError:
+                cancelled.append(server)
+                raise
+        return call
+
+    async def main():
+        result = await hedged_async([("a", acaller(primary)), ("b", acaller(fallback))], policy())
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == ("b", "fallback")
+    assert cancelled == [primary]
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+import requests
+
+from json_extract import Field, JsonScanner, conform, parse_object, repair_json
+from mock_servers import FakeChatCompletionsServer
+
+CORPUS = [
+    # (model output, parsed object, fixes)
+    ('{"a": 1}', {"a": 1}, []),
+    ('Sure! ```json\n{"a": [1, 2]}\n``` Hope it helps', {"a": [1, 2]}, []),
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}, ["trailing_comma"]),
+    ("{'name': 'Bob\\'s \"shop\"'}", {"name": "Bob's \"shop\""}, ["single_quotes"]),
+    ('{"ok": True, "no": False, "x": None}', {"ok": True, "no": False, "x": None}, ["python_literal"]),
+    ('{name: "Shop", page_count: 3}', {"name": "Shop", "page_count": 3}, ["unquoted_key"]),
+    ('{"a": 1,, "b": 2}', {"a": 1, "b": 2}, ["stray_comma"]),
+    ('{"title": "Sh', {"title": "Sh"}, ["truncated"]),
+    ('{"a": 1, "b":', {"a": 1, "b": None}, ["truncated"]),
+    ('{"a": 1, "b', {"a": 1}, ["truncated"]),
+    ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}, ["truncated"]),
+    ('{"pages": ["Home", "Lo', {"pages": ["Home"]}, ["truncated"]),
+    ('{"pages": ["Home", "About"', {"pages": ["Home", "About"]}, ["truncated"]),
+    ('{"path": "C:\\\\', {"path": "C:\\"}, ["truncated"]),
+    ('{"path": "C:\\', {"path": "C:"}, ["truncated"]),
+]
+
+
+@pytest.mark.parametrize("text, expected, fixes", CORPUS)
+def test_repair_corpus(text, expected, fixes):
+    assert parse_object(text) == (expected, fixes)
+
+
+def test_no_object():
+    assert parse_object("I cannot help with that.") == (None, [])
+    assert parse_object("") == (None, [])
+
+
+def test_skips_a_brace_that_is_not_an_object():
+    assert parse_object('use {braces} like {"a": 1}') == ({"a": 1}, [])
+
+
+def test_repair_json_reports_what_it_fixed():
+    repaired, fixes = repair_json("{'a': True,}")
+    assert json.loads(repaired) == {"a": True}
+    assert fixes == ["python_literal", "single_quotes", "trailing_comma"]
+
+
+def test_scanner_across_stream_deltas():
+    body = '{"pages": ["Home", "About"], "note": "a } in a string"}'
+    reply = "Here you go: " + body + " and some prose"
+    with FakeChatCompletionsServer(content=reply, chunk_size=5) as server:
+        resp = requests.post(f"{server.url}/chat/completions", json={"stream": True, "messages": []},
+                             stream=True, timeout=5)
+        scanner = JsonScanner()
+        for line in resp.iter_lines():
+            if not line.startswith(b"data: {"):
+                continue
+            delta = json.loads(line[6:])["choices"][0]["delta"].get("content")
+            if scanner.feed(delta):
+                break
+        resp.close()
+    assert scanner.close() == (body, False)
+
+
+def test_truncated_stream_is_repaired():
+    reply = '{"pages": ["Home", "About", "Contact"], "style": "modern"}'
+    with FakeChatCompletionsServer(content=reply) as server:
+        resp = requests.post(f"{server.url}/chat/completions", json={"max_tokens": 6, "messages": []}, timeout=5)
+    choice = resp.json()["choices"][0]
+    assert choice["finish_reason"] == "length"
+    assert parse_object(choice["message"]["content"]) == ({"pages": ["Home"]}, ["truncated"])
+
+
+SCHEMA = {
+    "pages": Field(list, ["Home"], str),
+    "style": Field(str, "modern"),
+    "notes": Field(str),
+}
+
+
+def test_conform_coerces_and_fills_defaults():
+    obj, problems = conform({"pages": "Home, About,", "extra": 1}, SCHEMA)
+    assert obj == {"pages": ["Home", "About"], "style": "modern", "extra": 1}
+    assert problems == ["coerced pages", "missing style"]
+
+    obj, problems = conform({"pages": [{"name": "Home"}, {"title": "Blog"}, 3], "style": 2}, SCHEMA)
+    assert obj == {"pages": ["Home", "Blog", "3"], "style": "2"}
+    assert problems == ["coerced pages", "coerced style"]
+
+
+def test_conform_rejects_what_it_cannot_use():
+    assert conform(["Home"], SCHEMA) == (None, ["not an object"])
+    obj, problems = conform({"pages": 5, "style": "x", "notes": {"a": 1}}, SCHEMA)
+    assert obj == {"pages": ["Home"], "style": "x"}
+    assert problems == ["invalid pages", "invalid notes"]
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+import requests
+
+from llm_scheduler import PRIORITY_HIGH, PRIORITY_NORMAL, LLMScheduler, SchedulerTimeout
+from mock_servers import FakeChatCompletionsServer
+
+
+def make_scheduler(**kwargs):
+    kwargs.setdefault("rpm", 6000)
+    kwargs.setdefault("tpm", 10 ** 7)
+    return LLMScheduler("test", **kwargs)
+
+
+def call(scheduler, server, **slot):
+    with scheduler.slot(**slot) as ticket:
+        resp = requests.post(f"{server.url}/chat/completions", json={"model": "fake", "messages": []}, timeout=5)
+        ticket.report(status=resp.status_code)
+    return resp.status_code
+
+
+def test_initial_limit_defaults_to_max(monkeypatch):
+    for name in ("LLM_INITIAL_CONCURRENCY", "TEST_INITIAL_CONCURRENCY"):
+        monkeypatch.delenv(name, raising=False)
+    assert make_scheduler(max_concurrency=7).limit == 7
+
+
+def test_admission_is_capped_by_limit():
+    scheduler = make_scheduler(initial_concurrency=2, max_concurrency=2)
+    first, second = scheduler.acquire(), scheduler.acquire()
+    third = scheduler.enqueue()
+    assert first.granted and second.granted and not third.granted
+    assert scheduler.stats()["inflight"] == 2
+
+    scheduler.release(first)
+    assert third.granted
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(timeout=0.1)
+
+
+def test_priority_then_fair_share():
+    scheduler = make_scheduler(initial_concurrency=1, max_concurrency=1)
+    running = scheduler.acquire(job="big")
+    big = scheduler.enqueue(job="big")
+    small = scheduler.enqueue(job="small")
+    urgent = scheduler.enqueue(job="big", priority=PRIORITY_HIGH)
+
+    scheduler.release(running)
+    assert urgent.granted and not small.granted
+    scheduler.release(urgent)
+    # equal priority: the job with nothing in flight and the oldest admit goes first
+    assert small.granted and not big.granted
+    assert big.priority == PRIORITY_NORMAL
+
+
+def test_aimd_halves_on_429_down_to_min():
+    scheduler = make_scheduler(initial_concurrency=8, min_concurrency=2, max_concurrency=8)
+    with FakeChatCompletionsServer(rate_limit=1.0) as server:
+        assert call(scheduler, server) == 429
+        assert scheduler.limit == 4
+        call(scheduler, server)
+        call(scheduler, server)
+    assert scheduler.limit == 2
+    assert scheduler.stats()["throttled"] == 3
+
+
+def test_aimd_grows_on_success_and_backs_off_when_slow():
+    scheduler = make_scheduler(initial_concurrency=2, max_concurrency=3, target_latency=0.05)
+    with FakeChatCompletionsServer() as server:
+        assert call(scheduler, server) == 200
+        assert scheduler.limit == pytest.approx(2.5)
+    with FakeChatCompletionsServer(delay=0.1) as server:
+        call(scheduler, server)
+    assert scheduler.limit == pytest.approx(2.25)
+
+
+def test_limit_is_shared_across_threads():
+    scheduler = make_scheduler(initial_concurrency=3, max_concurrency=3)
+    peak, inflight, lock = [0], [0], threading.Lock()
+
+    def worker():
+        with scheduler.slot(job=threading.get_ident()) as ticket:
+            with lock:
+                inflight[0] += 1
+                peak[0] = max(peak[0], inflight[0])
+            requests.post(f"{server.url}/chat/completions", json={"messages": []}, timeout=5)
+            with lock:
+                inflight[0] -= 1
+            ticket.report(status=200)
+
+    with FakeChatCompletionsServer(delay=0.05) as server:
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert peak[0] == 3
+    assert scheduler.stats()["admitted"] == 10
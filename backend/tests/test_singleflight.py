@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+import requests
+
+from mock_servers import FakeChatCompletionsServer
+from singleflight import Group
+
+
+def complete(server):
+    resp = requests.post(f"{server.url}/chat/completions", json={"messages": []}, timeout=5)
+    return resp.json()["choices"][0]["message"]["content"]
+
+
+def run_together(n, target):
+    results, threads = [None] * n, []
+    for i in range(n):
+        def run(i=i):
+            try:
+                results[i] = target()
+            except Exception as e:
+                results[i] = e
+        threads.append(threading.Thread(target=run))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_followers_share_the_leaders_result():
+    group = Group("test-share")
+    with FakeChatCompletionsServer(content="<html>ok</html>", delay=0.2) as server:
+        results = run_together(5, lambda: group.do("prompt", complete, server))
+        assert len(server.requests) == 1
+    assert {content for content, _ in results} == {"<html>ok</html>"}
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert group.inflight() == 0
+
+
+def test_leader_failure_is_shared_then_forgotten():
+    group = Group("test-fail")
+    calls = []
+
+    def failing(server):
+        calls.append(1)
+        resp = requests.post(f"{server.url}/chat/completions", json={"messages": []}, timeout=5)
+        resp.raise_for_status()
+
+    with FakeChatCompletionsServer(rate_limit=1.0, delay=0.2) as server:
+        results = run_together(3, lambda: group.do("prompt", failing, server))
+    assert len(calls) == 1
+    assert all(isinstance(r, requests.HTTPError) for r in results)
+
+    with FakeChatCompletionsServer(content="retry") as server:
+        assert group.do("prompt", complete, server) == ("retry", False)
+
+
+def test_cancelled_leader_hands_over_to_a_follower():
+    group = Group("test-cancel-leader")
+    server = FakeChatCompletionsServer(content="done", delay=0.2).start()
+
+    async def call():
+        return await asyncio.to_thread(complete, server)
+
+    async def main():
+        leader = asyncio.create_task(group.do_async("prompt", call))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(group.do_async("prompt", call))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    try:
+        assert asyncio.run(main()) == ("done", False)
+        assert len(server.requests) == 2
+    finally:
+        server.stop()
+    assert group.inflight() == 0
+
+
+def test_cancelled_follower_leaves_the_flight_running():
+    group = Group("test-cancel-follower")
+    server = FakeChatCompletionsServer(content="done", delay=0.2).start()
+
+    async def call():
+        return await asyncio.to_thread(complete, server)
+
+    async def main():
+        leader = asyncio.create_task(group.do_async("prompt", call))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(group.do_async("prompt", call))
+        await asyncio.sleep(0.05)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    try:
+        assert asyncio.run(main()) == ("done", False)
+        assert len(server.requests) == 1
+    finally:
+        server.stop()
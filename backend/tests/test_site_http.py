@@ -0,0 +1,114 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify, request
+
+from site_artifact import SiteArtifact, remember
+from site_http import file_response, manifest_response, negotiate, parse_accept_encoding, site_artifact
+
+PAGE = "<!DOCTYPE html><html><body>" + "<p>Lorem ipsum dolor sit amet.</p>" * 40 + "</body></html>"
+
+
+@pytest.fixture
+def client():
+    # the /sites routes of main.py, without its LLM clients
+    app = Flask(__name__)
+
+    @app.route("/sites/<site>")
+    def manifest(site):
+        artifact = site_artifact(site)
+        if artifact is None:
+            return jsonify({"error": "Unknown site"}), 404
+        return manifest_response(artifact, site, request.headers)
+
+    @app.route("/sites/<site>/", defaults={"path": ""})
+    @app.route("/sites/<site>/<path:path>")
+    def site_file(site, path):
+        artifact = site_artifact(site)
+        if artifact is None:
+            return jsonify({"error": "Unknown site"}), 404
+        return file_response(artifact, path, request.headers)
+
+    return app.test_client()
+
+
+@pytest.fixture
+def artifact():
+    artifact = SiteArtifact("http-test")
+    artifact.add("index.html", PAGE)
+    artifact.add("tiny.css", "body{}")
+    remember(artifact)
+    return artifact
+
+
+def test_gzip_when_accepted(client, artifact):
+    resp = client.get("/sites/http-test/", headers={"Accept-Encoding": "gzip, deflate"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert resp.headers["ETag"].endswith('-gzip"')
+    assert gzip.decompress(resp.data).decode() == PAGE
+
+
+def test_identity_fallback(client, artifact):
+    for accept in (None, "identity", "gzip;q=0", "br", "*;q=0"):
+        headers = {"Accept-Encoding": accept} if accept else {}
+        resp = client.get("/sites/http-test/index.html", headers=headers)
+        assert "Content-Encoding" not in resp.headers, accept
+        assert resp.data.decode() == PAGE
+    # too small to be worth compressing
+    resp = client.get("/sites/http-test/tiny.css", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["Content-Type"] == "text/css; charset=utf-8"
+
+
+def test_not_modified(client, artifact):
+    first = client.get("/sites/http-test/index.html", headers={"Accept-Encoding": "gzip"})
+    etag = first.headers["ETag"]
+
+    again = client.get("/sites/http-test/index.html", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == etag
+    # the tag of another encoding, a weak tag or a list still match the same content
+    for header in ('W/' + etag, etag.replace("-gzip", ""), f'"other", {etag}', "*"):
+        assert client.get("/sites/http-test/index.html", headers={"If-None-Match": header}).status_code == 304
+
+    artifact.add("index.html", PAGE + "\n")
+    changed = client.get("/sites/http-test/index.html", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+
+def test_manifest_and_its_etag(client, artifact):
+    resp = client.get("/sites/http-test")
+    files = resp.get_json()["files"]
+    assert set(files) == {"index.html", "tiny.css"}
+    assert files["index.html"]["url"] == "/sites/http-test/index.html"
+    assert client.get("/sites/http-test", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+    artifact.add("about.html", PAGE)
+    assert client.get("/sites/http-test", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 200
+
+
+def test_unknown_site_and_file(client, artifact):
+    assert client.get("/sites/no-such-site/index.html").status_code == 404
+    assert client.get("/sites/http-test/missing.html").status_code == 404
+
+
+def test_generation_in_progress_is_served(client):
+    partial = SiteArtifact("http-partial")
+    partial.complete = False
+    partial.add("index.html", PAGE)
+    remember(partial)
+    assert client.get("/sites/http-partial/index.html").status_code == 200
+
+
+def test_negotiate():
+    both = {"br": b"", "gzip": b""}
+    assert parse_accept_encoding("br;q=1.0, gzip;q=0.8, *;q=0") == {"br": 1.0, "gzip": 0.8, "*": 0.0}
+    assert negotiate("gzip, br", both) == "br"          # br first at equal q
+    assert negotiate("br;q=0.5, gzip", both) == "gzip"
+    assert negotiate("br;q=0, gzip;q=0", both) is None
+    assert negotiate("*", both) == "br"
+    assert negotiate("*;q=0.1, br;q=0", both) == "gzip"
+    assert negotiate("gzip;q=bogus", both) is None
+    assert negotiate("gzip", {}) is None
@@ -0,0 +1,156 @@
+"""
+token_budget.py — Learned max_tokens per kind of generation, and continuation helpers.
+
+    max_tokens = BUDGETS.max_tokens("page:login", MAX_TOKENS)
+    ... call the model ...
+    BUDGETS.record("page:login", completion_tokens)
+
+Every finished generation records its completion tokens (continuations included) under
+a key such as "page:login", "fragment:courses" or "layout". Once a key has
+BUDGET_MIN_SAMPLES samples its budget is the BUDGET_PERCENTILE of them times
+BUDGET_HEADROOM, clamped to [BUDGET_FLOOR, the caller's default]. A key without
+enough samples uses its kind's samples ("page:*"), and failing that the default. A
+small page therefore no longer reserves 7999 tokens of scheduler budget and provider
+capacity.
+
+A tight budget sometimes cuts a page short. The model calls notice
+finish_reason == "length" and ask the model to continue (continuation_messages);
+stitch() joins the parts and drops the overlap when the model repeats the end of the
+previous part. The recorded size includes the continuations, so the budget of a key
+grows after it is hit.
+
+Samples are kept in an llm_cache database ("token_budget"), so they survive restarts.
+"""
+
+import os
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from llm_cache import get_cache
+from telemetry import counter, register_collector
+
+BUDGET_ENABLED = os.environ.get("TOKEN_BUDGET", "1") != "0"
+BUDGET_PERCENTILE = float(os.environ.get("TOKEN_BUDGET_PERCENTILE", 0.95))
+BUDGET_HEADROOM = float(os.environ.get("TOKEN_BUDGET_HEADROOM", 1.25))
+BUDGET_FLOOR = int(os.environ.get("TOKEN_BUDGET_FLOOR", 1024))
+BUDGET_MIN_SAMPLES = int(os.environ.get("TOKEN_BUDGET_MIN_SAMPLES", 5))
+BUDGET_WINDOW = int(os.environ.get("TOKEN_BUDGET_WINDOW", 100))
+MAX_CONTINUATIONS = int(os.environ.get("MAX_CONTINUATIONS", 2))
+
+TRUNCATIONS = counter("llm_truncations_total", "Responses cut off by max_tokens (finish_reason=length).",
+                      ("component", "outcome"))
+
+CONTINUE_PROMPT = (
+    "Your previous answer was cut off. Continue exactly where it stopped: output only the "
+    "remaining text, without repeating anything and without any explanation or code fence."
+)
+SEAM_CHARS = 400   # characters compared when stitching
+
+
+class TokenBudgets:
+    """Recent completion sizes per key; thread-safe, persisted in llm_cache."""
+
+    def __init__(self, window: int = BUDGET_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+
+    def _store(self):
+        return get_cache("token_budget", ttl=30 * 24 * 3600, max_entries=5000)
+
+    def _samples_for(self, key: str) -> deque:
+        with self._lock:
+            samples = self._samples.get(key)
+        if samples is None:
+            stored = self._store().get(key) or []
+            with self._lock:
+                samples = self._samples.setdefault(key, deque(stored, maxlen=self.window))
+        return samples
+
+    def record(self, key: str, completion_tokens: int) -> None:
+        if not BUDGET_ENABLED or not key or not completion_tokens:
+            return
+        keys = [key] + ([key.split(":", 1)[0] + ":*"] if ":" in key else [])
+        for k in keys:
+            samples = self._samples_for(k)
+            with self._lock:
+                samples.append(int(completion_tokens))
+                snapshot = list(samples)
+            self._store().set(k, snapshot)
+
+    def predict(self, key: str) -> Optional[int]:
+        """BUDGET_PERCENTILE of the recorded sizes for key (or its kind), or None."""
+        for k in (key, key.split(":", 1)[0] + ":*") if ":" in key else (key,):
+            samples = self._samples_for(k)
+            with self._lock:
+                samples = sorted(samples)
+            if len(samples) >= BUDGET_MIN_SAMPLES:
+                return samples[min(len(samples) - 1, int(BUDGET_PERCENTILE * len(samples)))]
+        return None
+
+    def max_tokens(self, key: str, default: int) -> int:
+        if not BUDGET_ENABLED or not key:
+            return default
+        predicted = self.predict(key)
+        if predicted is None:
+            return default
+        return max(min(BUDGET_FLOOR, default), min(default, int(math.ceil(predicted * BUDGET_HEADROOM))))
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            keys = list(self._samples)
+        return {k: {"samples": len(self._samples[k]), "predicted": self.predict(k)} for k in keys}
+
+
+BUDGETS = TokenBudgets()
+
+
+def continuation_messages(messages: list, partial: str) -> list:
+    """The conversation so far plus a request to continue the cut-off answer."""
+    return list(messages) + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+
+
+def stitch(parts: List[str]) -> str:
+    """Join a response and its continuations, dropping repeated text at each seam."""
+    text = parts[0] if parts else ""
+    for part in parts[1:]:
+        text += seam(text, part)
+    return text
+
+
+def seam(text: str, part: str) -> str:
+    """What of continuation `part` to append to `text` (reopened fence and overlap dropped)."""
+    part = _strip_fence(part)
+    return part[_overlap(text, part):]
+
+
+def _strip_fence(part: str) -> str:
+    # continuations sometimes reopen the code block the answer started with
+    stripped = part.lstrip()
+    if stripped.startswith("```"):
+        newline = stripped.find("\n")
+        return stripped[newline + 1:] if newline != -1 else ""
+    return part
+
+
+def _overlap(text: str, part: str) -> int:
+    """Length of the longest prefix of `part` that is a suffix of `text` (>= 16 characters)."""
+    tail = text[-SEAM_CHARS:]
+    for size in range(min(len(tail), len(part)), 15, -1):
+        if tail.endswith(part[:size]):
+            return size
+    return 0
+
+
+def _budget_gauges():
+    for key, stats in BUDGETS.snapshot().items():
+        if stats["predicted"] is not None:
+            yield "llm_token_budget_predicted", "Predicted completion tokens per generation kind.", {"key": key}, stats["predicted"]
+
+
+register_collector(_budget_gauges)
@@ -4,8 +4,28 @@ website_agent_parallel.py — Parallel page generation using ThreadPoolExecutor
 
 Key changes:
 - generate_website_parallel(...) uses a thread pool to run independent page generations concurrently.
+- iter_website_pages(...) yields each page as soon as its worker finishes (used for streaming).
+- _model_call_stream(...) streams token deltas (`stream: true`) so partial HTML can be forwarded.
+- *_async twins (generate_website_parallel_async, _model_call_async) run every page as a coroutine
+  on one event loop with a pooled HTTP/2 client (see async_engine.py).
+- Every DeepSeek call goes through the shared llm_scheduler (rate limits, adaptive concurrency,
+  index page first, fair sharing between concurrent sites).
 - _model_call now accepts a requests.Session (connection pooling) and includes jittered backoff on 429/connection errors.
 - Concurrency controlled by env var DEEPSEEK_PARALLELISM (default 4).
+- Finished pages are cached per page (llm_cache), so a re-submit only calls the model
+  for pages whose inputs changed.
+- GENERATION_MODE=skeleton generates the shared layout, style.css and script.js once per site
+  and has page workers produce only the <main> fragment, assembled locally (site_layout.py).
+- Model output is cleaned and structurally checked in one pass by html_sanitizer (fed
+  chunk by chunk while streaming); HTML_VALIDATION picks what happens to broken pages.
+- Recurring page types (Login, Signup, Cart, ...) are rendered from a local template
+  library filled by past generations (page_templates.py) instead of calling the model.
+- max_tokens is learned per page type from recorded usage (token_budget.py); a response
+  cut off by max_tokens (finish_reason "length") is continued and stitched back together.
+- Pages and assets are collected in an in-memory SiteArtifact (site_artifact.py), which
+  generate_website_parallel returns; writing it to disk is a write-behind step (SITE_PERSIST).
+- Every generation is journaled per page (generation_journal.py); iter_website_pages(...,
+  resume=generation) / resume_website(generation) regenerate only the pages that failed.
 """
 
 import os
@@ -14,10 +34,25 @@ import json
 import time
 import logging
 import requests
-import shutil
 import random
-from typing import Dict, List, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+from contextlib import closing
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from llm_cache import get_cache, make_key
+from site_artifact import SiteArtifact, persist, recall, remember
+from generation_journal import DONE, FAILED, RUNNING, get_journal
+from workspaces import workspace_path
+from page_templates import SiteTemplates, for_site, page_type
+from token_budget import (BUDGETS, MAX_CONTINUATIONS, SEAM_CHARS, TRUNCATIONS, continuation_messages, seam,
+                          stitch)
+from llm_scheduler import PRIORITY_HIGH, PRIORITY_NORMAL, estimate_tokens, get_scheduler
+from telemetry import PAGE_SECONDS, bind, counter, llm_call, record_retry, span
+from hedging import STATS, HedgePolicy, hedged, hedged_async
+from singleflight import Group
+from html_sanitizer import HtmlSanitizer, check_structure, format_issues, inject_navbar, repair
+from site_layout import (Layout, assemble, default_layout, extract_main, fragment_messages,
+                         layout_messages, parse_layout)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
@@ -28,11 +63,36 @@ DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
 if not DEEPSEEK_API_KEY:
     raise RuntimeError("DEEPSEEK_API_KEY not set in environment")
 
-DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+DEEPSEEK_BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
 CHAT_COMPLETIONS_ENDPOINT = "/chat/completions"
 MODEL_ID = "deepseek-chat"   # adjust if needed
 RETRY = 3
 MAX_TOKENS = 7999
+# "full": every page is a complete document; "skeleton": one shared layout + <main> fragments
+GENERATION_MODE = os.environ.get("GENERATION_MODE", "full").lower()
+# Hedged page calls (hedging.py): a second request (PAGE_HEDGE_MODEL, default the same
+# model) is fired when a page takes longer than that model's usual p90. Off by default:
+# every hedge that fires costs a second generation.
+PAGE_HEDGE = os.environ.get("PAGE_HEDGE", "0") != "0"
+PAGE_HEDGE_MODEL = os.environ.get("PAGE_HEDGE_MODEL", MODEL_ID)
+PAGE_HEDGE_POLICY = HedgePolicy(STATS, reorder=PAGE_HEDGE_MODEL != MODEL_ID)
+# identical page requests in flight at the same time (same prompt) share one model call
+_page_flights = Group("page_calls")
+LAYOUT_MAX_TOKENS = int(os.environ.get("LAYOUT_MAX_TOKENS", 4000))
+FRAGMENT_MAX_TOKENS = int(os.environ.get("FRAGMENT_MAX_TOKENS", 4000))
+# Safety valve for streamed generations: abort once a page grows past this many characters.
+STREAM_MAX_CHARS = int(os.environ.get("DEEPSEEK_STREAM_MAX_CHARS", 60000))
+
+# Bump whenever DEEPSITE_INITIAL_PROMPT or the per-page prompt changes, so cached pages are not reused.
+PROMPT_VERSION = "1"
+PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE", "1") != "0"
+PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 7 * 24 * 3600))
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", 2000))
+
+# What to do with pages that fail the structural check (unclosed tags, missing <head>...):
+# "warn" logs and keeps them, "repair" closes tags left open, "strict" fails the page.
+HTML_VALIDATION = os.environ.get("HTML_VALIDATION", "warn").lower()
+HTML_ISSUES = counter("html_issues_total", "Structural problems found in generated pages.", ("issue",))
 
 # -----------------------------
 # DeepSite-style System Prompt
@@ -52,35 +112,16 @@ DEEPSITE_INITIAL_PROMPT = (
 def _slugify(label: str) -> str:
     return re.sub(r"\W+", "-", label.strip().lower())
 
-def _ensure_dirs() -> Dict[str, str]:
-    site_root = os.path.join("generated_site", "site")
-    if os.path.exists(site_root):
-        shutil.rmtree(site_root)
-    os.makedirs(site_root, exist_ok=True)
-    css = os.path.join(site_root, "css"); os.makedirs(css, exist_ok=True)
-    js = os.path.join(site_root, "js"); os.makedirs(js, exist_ok=True)
-    assets = os.path.join(site_root, "assets"); os.makedirs(assets, exist_ok=True)
-    return {"html": site_root, "css": css, "js": js, "assets": assets}
+def _page_filename(idx: int, page: str) -> str:
+    return "index.html" if idx == 0 else _slugify(page) + ".html"
 
 def sanitize_ai_html(raw: str) -> str:
+    """Strip marker lines and code fences from a model response (see html_sanitizer)."""
     if not raw:
         return ""
-
-    s = raw
-
-    s = re.sub(r"<<+.*?END_TITLE.*?\n", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"<<+.*?START_TITLE.*?\n", "", s, flags=re.IGNORECASE)
-
-    fenced = re.findall(r"```(?:html)?\s*([\s\S]*?)```", s, flags=re.IGNORECASE)
-    if fenced:
-        cleaned = "\n\n".join(block.strip() for block in fenced)
-        return cleaned.strip()
-
-    s = re.sub(r"```(?:html)?", "", s, flags=re.IGNORECASE)
-    s = s.replace("```", "")
-    s = re.sub(r"^\s*html\s*", "", s, flags=re.IGNORECASE)
-    s = re.sub(r"\s*html\s*$", "", s, flags=re.IGNORECASE)
-    return s.strip()
+    sanitizer = HtmlSanitizer()
+    sanitizer.feed(raw)
+    return sanitizer.close(check=False).html
 
 def _build_navbar(pages: List[str]) -> str:
     links = []
@@ -102,60 +143,301 @@ def _build_navbar(pages: List[str]) -> str:
         links.append(f"<a href='{slug}' class='px-3 py-2 hover:text-blue-400'>{display}</a>")
     return "<nav class='bg-gray-900 text-white p-4 flex space-x-4'>" + "".join(links) + "</nav>"
 
+def _page_cache():
+    return get_cache("pages", ttl=PAGE_CACHE_TTL, max_entries=PAGE_CACHE_MAX_ENTRIES)
+
+def _page_cache_key(project_title: str, page: str, features_list: List[str], notes: str, *kind: str) -> str:
+    # The navbar is deliberately not part of the key: adding a page changes the navbar of
+    # every page, so it is stored alongside the HTML and swapped in by _cached_page_html().
+    return make_key(project_title, page, list(features_list), notes, MODEL_ID, PROMPT_VERSION, *kind)
+
+def _template_version() -> str:
+    # templates made with another model or prompt are not reused
+    return f"{MODEL_ID}:{PROMPT_VERSION}"
+
+def _cached_page_html(entry: dict, navbar_html: str):
+    """Return cached HTML rebased onto navbar_html, or None if the navbar cannot be swapped safely."""
+    html = entry.get("html")
+    old_navbar = entry.get("navbar")
+    if not html or old_navbar is None:
+        return None
+    if old_navbar == navbar_html:
+        return html
+    if html.count(old_navbar) == 1:
+        return html.replace(old_navbar, navbar_html)
+    return None
+
 # -----------------------------
 # HTTP / Model call (thread-friendly)
 # -----------------------------
-def _model_call(messages: list, session: requests.Session, max_tokens: int = MAX_TOKENS) -> str:
+def _backoff(wait: float, cancel=None) -> None:
+    """Sleep before a retry; cut short once `cancel` (a hedge race lost) is set."""
+    if cancel is None:
+        time.sleep(wait)
+    else:
+        cancel.wait(wait)
+
+def _model_call(messages: list, session: requests.Session, max_tokens: int = MAX_TOKENS,
+                job=None, priority: int = PRIORITY_NORMAL, model: str = MODEL_ID, cancel=None,
+                budget_key: str = None) -> str:
+    """
+    Call DeepSeek with retries; once `cancel` is set (hedge lost) no further attempt is made.
+    A response cut off by max_tokens is continued up to MAX_CONTINUATIONS times; the
+    completion size is recorded under `budget_key` (see token_budget).
+    """
+    parts: List[str] = []
+    tokens = 0
+    convo = messages
+    for n in range(MAX_CONTINUATIONS + 1):
+        content, finish_reason, completion = _chat_completion(convo, session, max_tokens, job, priority,
+                                                              model, cancel)
+        parts.append(content)
+        tokens += completion
+        if finish_reason != "length" or not _continue_after_length(n):
+            break
+        convo = continuation_messages(messages, stitch(parts))
+    BUDGETS.record(budget_key, tokens)
+    return stitch(parts)
+
+def _continue_after_length(n: int) -> bool:
+    """Count a truncated response; False once MAX_CONTINUATIONS are used up."""
+    if n >= MAX_CONTINUATIONS:
+        TRUNCATIONS.inc(component="website_agent", outcome="gave_up")
+        logging.warning("Response still cut off by max_tokens after %d continuations", n)
+        return False
+    TRUNCATIONS.inc(component="website_agent", outcome="continued")
+    logging.info("Response cut off by max_tokens; requesting continuation %d", n + 1)
+    return True
+
+def _completion_parts(j: dict) -> Tuple[str, str, int]:
+    """(content, finish_reason, completion_tokens) of a chat completion response."""
+    try:
+        choice = j["choices"][0]
+        content = choice["message"]["content"] or ""
+    except Exception:
+        return str(j), None, 0
+    usage = j.get("usage") or {}
+    return content, choice.get("finish_reason"), usage.get("completion_tokens") or len(content) // 4
+
+def _chat_completion(messages: list, session: requests.Session, max_tokens: int, job, priority: int,
+                     model: str, cancel=None) -> Tuple[str, str, int]:
+    """One chat completion with retries; returns (content, finish_reason, completion_tokens)."""
     headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
-    payload = {"model": MODEL_ID, "messages": messages, "temperature": 0.25, "max_tokens": max_tokens}
+    payload = {"model": model, "messages": messages, "temperature": 0.25, "max_tokens": max_tokens}
     url = DEEPSEEK_BASE_URL + CHAT_COMPLETIONS_ENDPOINT
+    scheduler = get_scheduler("deepseek")
+    est_tokens = estimate_tokens(messages, max_tokens)
 
     for attempt in range(RETRY):
+        if cancel is not None and cancel.is_set():
+            raise GenerationCancelled("hedged call lost the race")
         try:
-            resp = session.post(url, headers=headers, json=payload, timeout=120)
+            # every attempt waits for a process-wide slot (rate limits, AIMD, fairness)
+            with scheduler.slot(job=job, priority=priority, est_tokens=est_tokens) as ticket, \
+                    llm_call("deepseek", model, attempt=attempt + 1) as call:
+                resp = session.post(url, headers=headers, json=payload, timeout=120)
+                j = resp.json() if resp.ok else None
+                usage = (j or {}).get("usage") or {}
+                ticket.report(status=resp.status_code, tokens=usage.get("total_tokens"))
+                call.finish(resp.status_code, usage)
         except Exception as e:
             wait = (2 ** attempt) + random.uniform(0, 0.5)
             logging.warning("Request attempt %d failed (exception): %s — backing off %.2fs", attempt + 1, e, wait)
-            time.sleep(wait)
+            record_retry("website_agent", "network", wait)
+            _backoff(wait, cancel)
             continue
 
         # Rate-limited: retry with backoff + jitter
         if resp.status_code == 429:
             wait = (2 ** attempt) + random.uniform(0, 1)
             logging.warning("Rate limited (429). Retrying after %.2fs (attempt %d)...", wait, attempt + 1)
-            time.sleep(wait)
+            record_retry("website_agent", "429", wait)
+            _backoff(wait, cancel)
             continue
 
         if not resp.ok:
             raise RuntimeError(f"DeepSeek error {resp.status_code}: {resp.text}")
 
-        j = resp.json()
+        return _completion_parts(j)
+
+    raise RuntimeError("DeepSeek model call failed after retries")
+
+class GenerationCancelled(Exception):
+    """Raised (e.g. from an on_delta callback) to abort a streamed generation early."""
+
+def _page_call_key(messages: list, max_tokens: int = MAX_TOKENS, **_) -> str:
+    return make_key(MODEL_ID, PAGE_HEDGE_MODEL if PAGE_HEDGE else None, messages, max_tokens)
+
+def _page_model_call(messages: list, session: requests.Session, **kw) -> str:
+    """_model_call for a page, coalesced with identical calls in flight (see _page_flights)."""
+    return _page_flights.do(_page_call_key(messages, **kw), _page_model_call_once, messages, session, **kw)[0]
+
+def _page_model_call_once(messages: list, session: requests.Session, **kw) -> str:
+    """Raced against a second request when PAGE_HEDGE is on."""
+    if not PAGE_HEDGE:
+        return _model_call(messages, session=session, **kw)
+    calls = [(model, lambda cancel, m=model: _model_call(messages, session=session, model=m, cancel=cancel, **kw))
+             for model in (MODEL_ID, PAGE_HEDGE_MODEL)]
+    return hedged(calls, PAGE_HEDGE_POLICY, validate=str.strip, component="website_agent")[1]
+
+def _iter_sse_deltas(resp: requests.Response, state: dict = None) -> Iterator[str]:
+    """
+    Yield content deltas from an OpenAI-style `stream: true` chat completions response;
+    the finish_reason, once sent, is stored in state["finish_reason"].
+    """
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
         try:
-            return j["choices"][0]["message"]["content"]
+            chunk = json.loads(data)
+            choice = chunk["choices"][0]
+            delta = choice.get("delta", {}).get("content")
         except Exception:
-            return str(j)
+            logging.warning("Skipping malformed stream chunk: %.200s", data)
+            continue
+        if state is not None and choice.get("finish_reason"):
+            state["finish_reason"] = choice["finish_reason"]
+        if delta:
+            yield delta
+
+def _model_call_stream(messages: list, session: requests.Session, max_tokens: int = MAX_TOKENS,
+                       max_chars: int = STREAM_MAX_CHARS, job=None,
+                       priority: int = PRIORITY_NORMAL, budget_key: str = None) -> Iterator[str]:
+    """
+    Streaming twin of _model_call: yields content deltas as DeepSeek produces them.
+    Retries (429 / connection errors) only happen before the first delta is yielded.
+    Closing the generator closes the HTTP response, which stops the generation upstream.
+    A stream cut off by max_tokens is continued by another stream; the start of each
+    continuation is held back until its overlap with the text so far is known.
+    """
+    text = ""
+    convo = messages
+    for n in range(MAX_CONTINUATIONS + 1):
+        state = {}
+        remaining = max(1, max_chars - len(text)) if max_chars else 0
+        with closing(_stream_completion(convo, session, max_tokens, remaining, job, priority, state)) as deltas:
+            yield from _stitched(deltas, text if n else None, state)
+        text = state["text"]
+        if state.get("finish_reason") != "length" or not _continue_after_length(n):
+            break
+        convo = continuation_messages(messages, text)
+    # streams carry no usage; ~4 characters per token
+    BUDGETS.record(budget_key, len(text) // 4)
+
+def _stitched(deltas: Iterator[str], text: str, state: dict) -> Iterator[str]:
+    """
+    Pass deltas through; for a continuation (text is the answer so far) hold back its
+    start until the overlap with text is known. The joined text ends up in state["text"].
+    """
+    if text is None:
+        text = ""
+        for delta in deltas:
+            text += delta
+            yield delta
+        state["text"] = text
+        return
+    head, stitched = "", False
+    for delta in deltas:
+        if not stitched:
+            head += delta
+            if len(head) < 2 * SEAM_CHARS:   # room for the overlap plus a reopened fence
+                continue
+            delta, stitched = seam(text, head), True
+        text += delta
+        yield delta
+    if not stitched and head:
+        delta = seam(text, head)
+        text += delta
+        yield delta
+    state["text"] = text
+
+def _stream_completion(messages: list, session: requests.Session, max_tokens: int, max_chars: int,
+                       job, priority: int, state: dict) -> Iterator[str]:
+    """One streamed chat completion with retries; sets state["finish_reason"]."""
+    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
+    payload = {"model": MODEL_ID, "messages": messages, "temperature": 0.25, "max_tokens": max_tokens, "stream": True}
+    url = DEEPSEEK_BASE_URL + CHAT_COMPLETIONS_ENDPOINT
+    scheduler = get_scheduler("deepseek")
+    est_tokens = estimate_tokens(messages, max_tokens)
+
+    for attempt in range(RETRY):
+        # the slot is held for the whole stream, not just until the headers arrive
+        ticket = scheduler.acquire(job=job, priority=priority, est_tokens=est_tokens)
+        try:
+            with llm_call("deepseek", MODEL_ID, attempt=attempt + 1, stream=True) as call:
+                try:
+                    resp = session.post(url, headers=headers, json=payload, timeout=120, stream=True)
+                except Exception as e:
+                    wait = (2 ** attempt) + random.uniform(0, 0.5)
+                    logging.warning("Stream attempt %d failed (exception): %s — backing off %.2fs", attempt + 1, e, wait)
+                    record_retry("website_agent", "network", wait)
+                    scheduler.release(ticket)
+                    ticket = None
+                    time.sleep(wait)
+                    continue
+
+                ticket.report(status=resp.status_code)
+                if resp.status_code == 429:
+                    call.finish(resp.status_code)
+                    resp.close()
+                    scheduler.release(ticket)
+                    ticket = None
+                    wait = (2 ** attempt) + random.uniform(0, 1)
+                    logging.warning("Rate limited (429). Retrying after %.2fs (attempt %d)...", wait, attempt + 1)
+                    record_retry("website_agent", "429", wait)
+                    time.sleep(wait)
+                    continue
+
+                if not resp.ok:
+                    call.finish(resp.status_code)
+                    try:
+                        raise RuntimeError(f"DeepSeek error {resp.status_code}: {resp.text}")
+                    finally:
+                        resp.close()
+
+                produced = 0
+                try:
+                    for delta in _iter_sse_deltas(resp, state):
+                        produced += len(delta)
+                        if max_chars and produced > max_chars:
+                            raise GenerationCancelled(f"stream exceeded {max_chars} characters")
+                        yield delta
+                finally:
+                    resp.close()
+                call.finish(resp.status_code)
+                return
+        finally:
+            if ticket is not None:
+                scheduler.release(ticket)
 
     raise RuntimeError("DeepSeek model call failed after retries")
 
 # -----------------------------
 # Per-page worker
 # -----------------------------
-def _generate_page_task(
-    idx: int,
-    page: str,
-    project_title: str,
-    features_list: List[str],
-    notes: str,
-    navbar_html: str,
-    paths: Dict[str, str],
-    session: requests.Session,
-) -> Tuple[int, str]:
-    """
-    Generate one page, write to disk, return (index, out_path).
-    Designed to be safe to run concurrently (pure functions + local I/O).
-    """
-    filename = "index.html" if idx == 0 else _slugify(page) + ".html"
+def _lookup_cached_page(project_title: str, page: str, features_list: List[str], notes: str,
+                        navbar_html: str) -> Tuple[str, str]:
+    """Return (cache_key, cached_html_or_None); cache_key is None when the page cache is off."""
+    if not PAGE_CACHE_ENABLED:
+        return None, None
+    cache_key = _page_cache_key(project_title, page, features_list, notes)
+    entry = _page_cache().get(cache_key)
+    return cache_key, (_cached_page_html(entry, navbar_html) if entry else None)
+
+def _lookup_cached_fragment(project_title: str, page: str, features_list: List[str],
+                            notes: str) -> Tuple[str, str]:
+    """Skeleton-mode twin of _lookup_cached_page: fragments do not contain the navbar."""
+    if not PAGE_CACHE_ENABLED:
+        return None, None
+    cache_key = _page_cache_key(project_title, page, features_list, notes, "fragment")
+    entry = _page_cache().get(cache_key)
+    return cache_key, (entry.get("fragment") if entry else None)
 
+def _page_messages(page: str, project_title: str, features_list: List[str], notes: str,
+                   navbar_html: str) -> list:
     user_prompt = (
         f"Project: {project_title}\n"
         f"Page: {page}\n"
@@ -169,54 +451,201 @@ def _generate_page_task(
         "Return only the page HTML (no extra commentary)."
     )
 
-    messages = [
+    return [
         {"role": "system", "content": DEEPSITE_INITIAL_PROMPT},
         {"role": "user", "content": user_prompt},
     ]
 
-    logging.info("Worker: generating page '%s' (idx=%d)", page, idx)
-    raw_html = _model_call(messages, session=session)
-    clean_html = sanitize_ai_html(raw_html)
+def _finalize_page(raw_html: str, project_title: str, page: str, navbar_html: str,
+                   sanitizer: HtmlSanitizer = None) -> str:
+    """
+    Sanitize and check the model output and wrap it in a full document if it is only a
+    fragment. A streamed page passes the sanitizer it has been feeding instead of raw_html.
+    """
+    with span("website.sanitize", page=page) as sanitize_span:
+        if sanitizer is None:
+            sanitizer = HtmlSanitizer()
+            sanitizer.feed(raw_html)
+        result = sanitizer.close()
+        if result.issues:
+            sanitize_span.set(issues=format_issues(result.issues))
+    return _checked_page(result, project_title, page, navbar_html)
+
+def _page_fragment(raw_html: str, page: str, sanitizer: HtmlSanitizer = None) -> str:
+    """Skeleton mode: the cleaned inner HTML of <main> from the model output."""
+    with span("website.sanitize", page=page):
+        if sanitizer is None:
+            sanitizer = HtmlSanitizer()
+            sanitizer.feed(raw_html)
+        return extract_main(sanitizer.close(check=False).html)
 
-    # Wrap if not full document
-    if "<!doctype" not in clean_html.lower():
-        wrapped = (
-            "<!DOCTYPE html>\n"
-            "<html lang='en'>\n"
-            "<head>\n"
-            f"  <title>{project_title} — {page}</title>\n"
-            "  <meta charset='utf-8'>\n"
-            "  <meta name='viewport' content='width=device-width, initial-scale=1'>\n"
-            "  <script src='https://cdn.tailwindcss.com'></script>\n"
-            "  <link href='css/style.css' rel='stylesheet'>\n"
-            "</head>\n"
-            "<body>\n"
-            f"{navbar_html}\n\n{clean_html}\n"
-            "<script src='js/script.js'></script>\n"
-            "</body>\n"
-            "</html>\n"
-        )
-        to_write = wrapped
+def _assemble_page(fragment: str, layout: Layout, project_title: str, page: str, navbar_html: str) -> str:
+    """Skeleton mode: put a fragment into the shared layout and check the result."""
+    html = assemble(layout, f"{project_title} — {page}", navbar_html, fragment)
+    return _checked_page(check_structure(html, True), project_title, page, navbar_html)
+
+def _checked_page(result, project_title: str, page: str, navbar_html: str) -> str:
+    """Apply HTML_VALIDATION to a SanitizeResult and return the page to write."""
+    if result.issues:
+        for code, _ in result.issues:
+            HTML_ISSUES.inc(issue=code)
+        message = format_issues(result.issues)
+        if HTML_VALIDATION == "strict":
+            raise RuntimeError(f"Generated HTML for '{page}' failed validation: {message}")
+        logging.warning("Page '%s' has HTML issues: %s", page, message)
+
+    if result.has_doctype:
+        clean_html = inject_navbar(result, navbar_html)
     else:
-        to_write = clean_html
+        clean_html = result.html
+    if HTML_VALIDATION == "repair":
+        clean_html = repair(result, clean_html)
 
-    out_path = os.path.join(paths["html"], filename)
-    with open(out_path, "w", encoding="utf-8") as fh:
-        fh.write(to_write)
+    # Wrap if not full document
+    if not result.has_doctype:
+        return assemble(default_layout(), f"{project_title} — {page}", navbar_html, clean_html)
+    return clean_html
 
-    logging.info("Worker: finished page '%s' -> %s", page, out_path)
-    return (idx, out_path)
+def _generate_page_task(
+    idx: int,
+    page: str,
+    project_title: str,
+    features_list: List[str],
+    notes: str,
+    navbar_html: str,
+    artifact: SiteArtifact,
+    session: requests.Session,
+    on_delta: Callable[[int, str, str], None] = None,
+    job: str = None,
+    layout: Future = None,
+    templates: SiteTemplates = None,
+) -> Tuple[int, str, str]:
+    """
+    Generate one page, add it to `artifact`, return (index, filename, html).
+    Designed to be safe to run concurrently (pure functions, no disk I/O).
+    If on_delta is given the page is streamed and on_delta(idx, page, chunk) is called
+    with each raw chunk; it may raise GenerationCancelled to stop the page early.
+    In skeleton mode `layout` is a future of the site's Layout and only the <main>
+    fragment is generated. With `templates` a recurring page type is rendered from the
+    template library when it has one, and generated pages are offered to it.
+    """
+    started = time.perf_counter()
+    with span("website.page", page=page, index=idx, job=job) as page_span:
+        filename = _page_filename(idx, page)
+
+        if layout is not None:
+            cache_key, cached = _lookup_cached_fragment(project_title, page, features_list, notes)
+            if cached is not None:
+                cached = _assemble_page(cached, layout.result(), project_title, page, navbar_html)
+        else:
+            cache_key, cached = _lookup_cached_page(project_title, page, features_list, notes, navbar_html)
+        source = "cache"
+        if cached is None and templates is not None:
+            cached = templates.render(page, navbar_html if layout is None else "")
+            if cached is not None:
+                source = "template"
+                if layout is not None:
+                    cached = _assemble_page(cached, layout.result(), project_title, page, navbar_html)
+        if cached is not None:
+            artifact.add(filename, cached)
+            logging.info("Worker: reused %s page '%s' -> %s", source, page, filename)
+            page_span.set(source=source)
+            PAGE_SECONDS.observe(time.perf_counter() - started, page=page, source=source)
+            return (idx, filename, cached)
+
+        if layout is not None:
+            messages = fragment_messages(page, project_title, features_list, notes)
+            budget_key = f"fragment:{page_type(page)}"
+            max_tokens = BUDGETS.max_tokens(budget_key, FRAGMENT_MAX_TOKENS)
+        else:
+            messages = _page_messages(page, project_title, features_list, notes, navbar_html)
+            budget_key = f"page:{page_type(page)}"
+            max_tokens = BUDGETS.max_tokens(budget_key, MAX_TOKENS)
+
+        logging.info("Worker: generating page '%s' (idx=%d)", page, idx)
+        priority = PRIORITY_HIGH if idx == 0 else PRIORITY_NORMAL
+        raw_html, sanitizer = None, None
+        if on_delta is None:
+            raw_html = _page_model_call(messages, session, max_tokens=max_tokens, job=job, priority=priority,
+                                        budget_key=budget_key)
+        else:
+            # sanitize while streaming instead of joining the deltas afterwards
+            sanitizer = HtmlSanitizer()
+            with closing(_model_call_stream(messages, session=session, max_tokens=max_tokens,
+                                            job=job, priority=priority, budget_key=budget_key)) as stream:
+                for chunk in stream:
+                    sanitizer.feed(chunk)
+                    on_delta(idx, page, chunk)
+        if layout is not None:
+            fragment = _page_fragment(raw_html, page, sanitizer)
+            to_write = _assemble_page(fragment, layout.result(), project_title, page, navbar_html)
+            cache_entry = {"fragment": fragment}
+        else:
+            to_write = _finalize_page(raw_html, project_title, page, navbar_html, sanitizer=sanitizer)
+            cache_entry = {"html": to_write, "navbar": navbar_html}
+
+        _store_page(artifact, filename, to_write, cache_key, cache_entry, templates, page,
+                    fragment if layout is not None else None, navbar_html)
+
+        logging.info("Worker: finished page '%s' -> %s", page, filename)
+        page_span.set(source="model", bytes=len(to_write))
+        PAGE_SECONDS.observe(time.perf_counter() - started, page=page, source="model")
+        return (idx, filename, to_write)
+
+# -----------------------------
+# Shared layout (skeleton mode)
+# -----------------------------
+def _layout_cache_key(project_title: str, features_list: List[str], notes: str) -> str:
+    if not PAGE_CACHE_ENABLED:
+        return None
+    return make_key(project_title, list(features_list), notes, MODEL_ID, PROMPT_VERSION, "layout")
+
+def _cached_layout(cache_key: str):
+    entry = _page_cache().get(cache_key) if cache_key else None
+    return Layout(entry["html"], entry["css"], entry["js"], True) if entry else None
+
+def _accept_layout(raw: str, cache_key: str) -> Layout:
+    """Parse the model's layout; fall back to the default document if it is unusable."""
+    layout = parse_layout(raw)
+    if layout is None:
+        logging.warning("Layout response unusable; using the default layout")
+        return default_layout()
+    if cache_key:
+        _page_cache().set(cache_key, {"html": layout.html, "css": layout.css, "js": layout.js})
+    return layout
+
+def _site_layout(project_title: str, features_list: List[str], notes: str,
+                 session: requests.Session, job: str = None) -> Layout:
+    """Generate (or reuse) the shared layout of a site; never raises."""
+    with span("website.layout", job=job) as layout_span:
+        cache_key = _layout_cache_key(project_title, features_list, notes)
+        layout = _cached_layout(cache_key)
+        if layout is not None:
+            layout_span.set(source="cache")
+            return layout
+        try:
+            raw = _model_call(layout_messages(project_title, features_list, notes), session=session,
+                              max_tokens=BUDGETS.max_tokens("layout", LAYOUT_MAX_TOKENS), job=job,
+                              priority=PRIORITY_HIGH, budget_key="layout")
+        except Exception as e:
+            logging.warning("Layout generation failed (%s); using the default layout", e)
+            return default_layout()
+        layout = _accept_layout(raw, cache_key)
+        layout_span.set(source="model", generated=layout.generated)
+        return layout
 
 # -----------------------------
 # Main (parallel) generator
 # -----------------------------
-def generate_website_parallel(enhanced_req: dict, max_workers: int = None) -> List[str]:
-    """
-    Parallel page generation. Returns list of saved file paths (HTML + created assets).
-    """
-    paths = _ensure_dirs()
-    saved_files: List[str] = []
+def _add_shared_assets(artifact: SiteArtifact, layout: Layout = None) -> List[str]:
+    """Add css/style.css and js/script.js: a generated layout's real assets, otherwise stubs."""
+    layout = layout or default_layout()
+    artifact.add("css/style.css", layout.css)
+    artifact.add("js/script.js", layout.js)
+    return ["css/style.css", "js/script.js"]
 
+def _site_plan(enhanced_req: dict) -> Tuple[str, List[str], List[str], str, str]:
+    """Pull (project_title, pages_list, features_list, notes, navbar_html) out of the requirements."""
     project_title = (
         enhanced_req.get("project")
         if isinstance(enhanced_req.get("project"), str)
@@ -232,6 +661,94 @@ def generate_website_parallel(enhanced_req: dict, max_workers: int = None) -> Li
     pages_list.insert(0, "Home")
 
     navbar_html = _build_navbar(pages_list)
+    return project_title, pages_list, features_list, notes, navbar_html
+
+def _journal_record(generation: str) -> dict:
+    record = get_journal().get(generation)
+    if record is None:
+        raise KeyError(f"Unknown generation '{generation}'")
+    return record
+
+def _previous_artifact(generation: str, workspace: str):
+    """The site a resumed generation builds on: still in memory, or as persisted."""
+    artifact = recall(workspace)
+    if artifact is not None and artifact.id == generation:
+        return artifact
+    root = workspace_path(workspace)
+    return SiteArtifact.from_directory(root, workspace) if os.path.isdir(root) else None
+
+def _store_page(artifact: SiteArtifact, filename: str, html: str, cache_key: str, cache_entry: dict,
+                templates: SiteTemplates, page: str, fragment: str = None, navbar_html: str = "") -> None:
+    """Add a generated page to the artifact, the page cache and the template library (blocking)."""
+    artifact.add(filename, html)
+    if cache_key:
+        _page_cache().set(cache_key, cache_entry)
+    if templates is not None:
+        if fragment is not None:
+            templates.learn(page, fragment)
+        else:
+            templates.learn(page, html, navbar_html)
+
+def _remember_open(artifact: SiteArtifact) -> SiteArtifact:
+    """Register an in-progress artifact, so /sites/<site>/<page> serves each page once it is added."""
+    artifact.complete = False
+    remember(artifact)
+    return artifact
+
+def _open_site(enhanced_req: dict, workspace: str, resume: str = None) -> Tuple[SiteArtifact, List[dict], List[int]]:
+    """
+    Journal a new generation, or reopen generation `resume`. Returns (artifact, reused, todo):
+    "page" events for the pages kept from the earlier run (done, and the file still has
+    the journaled hash) and the indices of the pages still to generate.
+    """
+    project_title, pages_list, features_list, notes, _ = _site_plan(enhanced_req)
+    journal = get_journal()
+    if resume is None:
+        artifact = _remember_open(SiteArtifact(workspace))
+        journal.start(artifact.id, workspace, enhanced_req, [
+            (page, _page_filename(idx, page),
+             _page_cache_key(project_title, page, features_list, notes, GENERATION_MODE))
+            for idx, page in enumerate(pages_list)
+        ])
+        return artifact, [], list(range(len(pages_list)))
+
+    record = _journal_record(resume)
+    artifact = SiteArtifact(workspace, artifact_id=resume)
+    previous = _previous_artifact(resume, workspace)
+    reused = []
+    for entry in record["pages"]:
+        kept = previous.get(entry["filename"]) if previous is not None and entry["state"] == DONE else None
+        if kept is None or kept.etag != entry["output"]:
+            continue
+        artifact.add(kept.path, kept.data)
+        reused.append({"type": "page", "index": entry["index"], "page": entry["page"],
+                       "filename": kept.path, "html": kept.data.decode("utf-8")})
+    _remember_open(artifact)
+    done = {event["index"] for event in reused}
+    todo = [idx for idx in range(len(pages_list)) if idx not in done]
+    journal.reopen(resume, todo)
+    logging.info("Resuming %s: %d pages kept, %d to generate", resume, len(reused), len(todo))
+    return artifact, reused, todo
+
+def iter_website_pages(enhanced_req: dict, max_workers: int = None,
+                       on_delta: Callable[[int, str, str], None] = None,
+                       workspace: str = "site", resume: str = None) -> Iterator[dict]:
+    """
+    Parallel page generation that yields events as soon as they happen:
+      {"type": "page", "index", "page", "filename", "html"}  — once per finished page
+      {"type": "error", "index", "page", "error"}            — once per failed page
+      {"type": "done", "workspace", "site_dir", "files", "artifact", "generation", "failed"}
+                                                             — last; files in page order + assets
+    Pages are collected in memory; only a finished site is persisted (write-behind, see
+    site_artifact.persist) and published as generated_site/<workspace>, so a failed or
+    abandoned generation leaves nothing behind.
+    on_delta is forwarded to the page workers (streamed generation, called from worker threads).
+    Each page's state is journaled under the done event's "generation". Passing that as
+    `resume` (with the journaled requirements and workspace, see resume_website) emits
+    the pages that were done as they are and generates only the others.
+    """
+    artifact, reused, todo = _open_site(enhanced_req, workspace, resume)
+    project_title, pages_list, features_list, notes, navbar_html = _site_plan(enhanced_req)
 
     # concurrency settings
     env_workers = os.environ.get("DEEPSEEK_PARALLELISM")
@@ -241,65 +758,365 @@ def generate_website_parallel(enhanced_req: dict, max_workers: int = None) -> Li
         except Exception:
             max_workers = 4
 #    max_workers = max(1, min(max_workers, len(pages_list)))  # sensible bounds
-    
-    max_workers = len(pages_list)
 
-    logging.info("Generating %d pages with %d workers", len(pages_list), max_workers)
+    # One thread per page; how many of them actually talk to DeepSeek at once (across all
+    # concurrent sites) is decided by llm_scheduler, which also lets index.html go first.
+    skeleton = GENERATION_MODE == "skeleton"
+    max_workers = max(1, len(todo) + (1 if skeleton else 0))
+
+    logging.info("Generating %d pages with %d workers", len(todo), max_workers)
 
     # Create a single session for connection pooling (requests.Session is commonly used across threads).
     session = requests.Session()
 
-    # Submit tasks
-    tasks = []
-    with ThreadPoolExecutor(max_workers=max_workers) as exe:
-        futures = []
-        for idx, page in enumerate(pages_list):
+    results_by_idx = {}
+    job = artifact.id
+    journal = get_journal()
+    for event in reused:
+        results_by_idx[event["index"]] = event["filename"]
+        yield event
+    layout = None
+    templates = for_site(enhanced_req, project_title, "fragment" if skeleton else "page", _template_version())
+    exe = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        if skeleton:
+            # submitted first so it always has a thread; pages only wait for it to assemble
+            layout = exe.submit(bind(_site_layout), project_title, features_list, notes, session, job)
+        futures = {}
+        for idx in todo:
+            page = pages_list[idx]
+            journal.mark(job, idx, RUNNING)
+            # bind() carries the caller's span into the worker thread
             fut = exe.submit(
-                _generate_page_task,
+                bind(_generate_page_task),
                 idx,
                 page,
                 project_title,
                 features_list,
                 notes,
                 navbar_html,
-                paths,
+                artifact,
                 session,
+                on_delta,
+                job,
+                layout,
+                templates,
             )
-            futures.append(fut)
+            futures[fut] = (idx, page)
 
-        # collect results; preserve ordering by idx
-        results_by_idx = {}
+        # hand each page to the caller the moment its worker finishes
         for fut in as_completed(futures):
+            idx, page = futures[fut]
             try:
-                idx_out, path_out = fut.result()
-                results_by_idx[idx_out] = path_out
+                idx_out, filename, html = fut.result()
             except Exception as e:
                 logging.exception("A worker failed: %s", e)
-                # decide: continue with other pages, or raise
-                # Here we continue so other pages still generate
+                journal.mark(job, idx, FAILED, error=str(e))
+                # continue so other pages still generate
+                yield {"type": "error", "index": idx, "page": page, "error": str(e)}
                 continue
+            journal.mark(job, idx_out, DONE, output=artifact.get(filename).etag)
+            results_by_idx[idx_out] = filename
+            yield {
+                "type": "page",
+                "index": idx_out,
+                "page": page,
+                "filename": filename,
+                "html": html,
+            }
+    finally:
+        # If the consumer stops early (e.g. client disconnected) don't start queued pages.
+        exe.shutdown(wait=True, cancel_futures=True)
+
+    yield _finish_site(artifact, len(pages_list), results_by_idx, layout.result() if layout else None)
 
-    # Compose list of saved HTML paths in original page order
-    for i in range(len(pages_list)):
+def _finish_site(artifact: SiteArtifact, page_count: int, results_by_idx: Dict[int, str],
+                 layout: Layout = None) -> dict:
+    """Add shared assets, hand the artifact to persistence and return the final "done" event."""
+    files: List[str] = []
+    failed: List[int] = []
+
+    # Compose list of page filenames in original page order
+    for i in range(page_count):
         if i in results_by_idx:
-            saved_files.append(results_by_idx[i])
+            files.append(results_by_idx[i])
         else:
-            logging.warning("Page index %d missing due to earlier error", i)
+            failed.append(i)
+            logging.warning("Page index %d missing due to earlier error (resume %s to retry it)", i, artifact.id)
+
+    files.extend(_add_shared_assets(artifact, layout))
+    artifact.reorder(files)
+    artifact.complete = True
+    remember(artifact)
+    site_dir = persist(artifact)
+
+    get_journal().finish(artifact.id)
+
+    logging.info("Generated %d pages + assets for %s (%d bytes)", len(files), artifact.workspace, artifact.size())
+    return {"type": "done", "workspace": artifact.workspace, "site_dir": site_dir, "files": files,
+            "artifact": artifact, "generation": artifact.id, "failed": failed}
+
+def generate_website_parallel(enhanced_req: dict, max_workers: int = None, workspace: str = "site") -> SiteArtifact:
+    """
+    Parallel page generation. Returns the SiteArtifact (HTML pages + shared assets).
+    """
+    artifact = None
+    for event in iter_website_pages(enhanced_req, max_workers=max_workers, workspace=workspace):
+        if event["type"] == "done":
+            artifact = event["artifact"]
+    return artifact
+
+def resume_website(generation: str, max_workers: int = None) -> SiteArtifact:
+    """Regenerate the pages of an earlier generation that are not done; returns the completed SiteArtifact."""
+    record = _journal_record(generation)
+    artifact = None
+    for event in iter_website_pages(record["request"], max_workers=max_workers, workspace=record["workspace"],
+                                    resume=generation):
+        if event["type"] == "done":
+            artifact = event["artifact"]
+    return artifact
+
+# -----------------------------
+# asyncio engine (event loop + pooled HTTP/2 client live in async_engine.py)
+# -----------------------------
+async def _model_call_async(messages: list, client, max_tokens: int = MAX_TOKENS,
+                            job=None, priority: int = PRIORITY_NORMAL, model: str = MODEL_ID,
+                            budget_key: str = None) -> str:
+    """Async twin of _model_call using a shared httpx.AsyncClient."""
+    parts: List[str] = []
+    tokens = 0
+    convo = messages
+    for n in range(MAX_CONTINUATIONS + 1):
+        content, finish_reason, completion = await _chat_completion_async(convo, client, max_tokens, job,
+                                                                          priority, model)
+        parts.append(content)
+        tokens += completion
+        if finish_reason != "length" or not _continue_after_length(n):
+            break
+        convo = continuation_messages(messages, stitch(parts))
+    BUDGETS.record(budget_key, tokens)
+    return stitch(parts)
+
+async def _chat_completion_async(messages: list, client, max_tokens: int, job, priority: int,
+                                 model: str) -> Tuple[str, str, int]:
+    """Async twin of _chat_completion."""
+    headers = {"Authorization": f"Bearer {DEEPSEEK_API_KEY}", "Content-Type": "application/json"}
+    payload = {"model": model, "messages": messages, "temperature": 0.25, "max_tokens": max_tokens}
+    url = DEEPSEEK_BASE_URL + CHAT_COMPLETIONS_ENDPOINT
+    scheduler = get_scheduler("deepseek")
+    est_tokens = estimate_tokens(messages, max_tokens)
+
+    for attempt in range(RETRY):
+        try:
+            async with scheduler.slot_async(job=job, priority=priority, est_tokens=est_tokens) as ticket:
+                with llm_call("deepseek", model, attempt=attempt + 1) as call:
+                    resp = await client.post(url, headers=headers, json=payload, timeout=120)
+                    j = resp.json() if resp.is_success else None
+                    usage = (j or {}).get("usage") or {}
+                    ticket.report(status=resp.status_code, tokens=usage.get("total_tokens"))
+                    call.finish(resp.status_code, usage)
+        except Exception as e:
+            wait = (2 ** attempt) + random.uniform(0, 0.5)
+            logging.warning("Request attempt %d failed (exception): %s — backing off %.2fs", attempt + 1, e, wait)
+            record_retry("website_agent", "network", wait)
+            await asyncio.sleep(wait)
+            continue
+
+        # Rate-limited: retry with backoff + jitter
+        if resp.status_code == 429:
+            wait = (2 ** attempt) + random.uniform(0, 1)
+            logging.warning("Rate limited (429). Retrying after %.2fs (attempt %d)...", wait, attempt + 1)
+            record_retry("website_agent", "429", wait)
+            await asyncio.sleep(wait)
+            continue
+
+        if not resp.is_success:
+            raise RuntimeError(f"DeepSeek error {resp.status_code}: {resp.text}")
+
+        return _completion_parts(j)
+
+    raise RuntimeError("DeepSeek model call failed after retries")
+
+async def _page_model_call_async(messages: list, client, **kw) -> str:
+    """Coroutine twin of _page_model_call."""
+    return (await _page_flights.do_async(_page_call_key(messages, **kw), _page_model_call_once_async,
+                                         messages, client, **kw))[0]
+
+async def _page_model_call_once_async(messages: list, client, **kw) -> str:
+    """Coroutine twin of _page_model_call_once; the losing request is cancelled."""
+    if not PAGE_HEDGE:
+        return await _model_call_async(messages, client, **kw)
+    calls = [(model, lambda m=model: _model_call_async(messages, client, model=m, **kw))
+             for model in (MODEL_ID, PAGE_HEDGE_MODEL)]
+    return (await hedged_async(calls, PAGE_HEDGE_POLICY, validate=str.strip, component="website_agent"))[1]
+
+async def _site_layout_async(project_title: str, features_list: List[str], notes: str,
+                             client, job: str = None) -> Layout:
+    """Coroutine twin of _site_layout."""
+    with span("website.layout", job=job) as layout_span:
+        cache_key = _layout_cache_key(project_title, features_list, notes)
+        layout = await asyncio.to_thread(_cached_layout, cache_key)
+        if layout is not None:
+            layout_span.set(source="cache")
+            return layout
+        try:
+            raw = await _model_call_async(layout_messages(project_title, features_list, notes), client,
+                                          max_tokens=BUDGETS.max_tokens("layout", LAYOUT_MAX_TOKENS), job=job,
+                                          priority=PRIORITY_HIGH, budget_key="layout")
+        except Exception as e:
+            logging.warning("Layout generation failed (%s); using the default layout", e)
+            return default_layout()
+        layout = await asyncio.to_thread(_accept_layout, raw, cache_key)
+        layout_span.set(source="model", generated=layout.generated)
+        return layout
+
+async def _generate_page_task_async(
+    idx: int,
+    page: str,
+    project_title: str,
+    features_list: List[str],
+    notes: str,
+    navbar_html: str,
+    artifact: SiteArtifact,
+    client,
+    job: str = None,
+    layout: "asyncio.Future" = None,
+    templates: SiteTemplates = None,
+) -> Tuple[int, str, str]:
+    """Coroutine twin of _generate_page_task; return (index, filename, html)."""
+    started = time.perf_counter()
+    with span("website.page", page=page, index=idx, job=job) as page_span:
+        filename = _page_filename(idx, page)
+
+        # SQLite lookups and stores and the compression in artifact.add run off the loop
+        if layout is not None:
+            cache_key, cached = await asyncio.to_thread(_lookup_cached_fragment, project_title, page,
+                                                        features_list, notes)
+            if cached is not None:
+                cached = _assemble_page(cached, await layout, project_title, page, navbar_html)
+        else:
+            cache_key, cached = await asyncio.to_thread(_lookup_cached_page, project_title, page,
+                                                        features_list, notes, navbar_html)
+        source = "cache"
+        if cached is None and templates is not None:
+            cached = await asyncio.to_thread(templates.render, page, navbar_html if layout is None else "")
+            if cached is not None:
+                source = "template"
+                if layout is not None:
+                    cached = _assemble_page(cached, await layout, project_title, page, navbar_html)
+        if cached is not None:
+            await asyncio.to_thread(artifact.add, filename, cached)
+            logging.info("Worker: reused %s page '%s' -> %s", source, page, filename)
+            page_span.set(source=source)
+            PAGE_SECONDS.observe(time.perf_counter() - started, page=page, source=source)
+            return (idx, filename, cached)
+
+        if layout is not None:
+            messages = fragment_messages(page, project_title, features_list, notes)
+            budget_key = f"fragment:{page_type(page)}"
+            max_tokens = BUDGETS.max_tokens(budget_key, FRAGMENT_MAX_TOKENS)
+        else:
+            messages = _page_messages(page, project_title, features_list, notes, navbar_html)
+            budget_key = f"page:{page_type(page)}"
+            max_tokens = BUDGETS.max_tokens(budget_key, MAX_TOKENS)
+
+        logging.info("Worker: generating page '%s' (idx=%d)", page, idx)
+        priority = PRIORITY_HIGH if idx == 0 else PRIORITY_NORMAL
+        raw_html = await _page_model_call_async(messages, client, max_tokens=max_tokens, job=job, priority=priority,
+                                                budget_key=budget_key)
+        if layout is not None:
+            fragment = _page_fragment(raw_html, page)
+            to_write = _assemble_page(fragment, await layout, project_title, page, navbar_html)
+            cache_entry = {"fragment": fragment}
+        else:
+            to_write = _finalize_page(raw_html, project_title, page, navbar_html)
+            cache_entry = {"html": to_write, "navbar": navbar_html}
+
+        await asyncio.to_thread(_store_page, artifact, filename, to_write, cache_key, cache_entry, templates,
+                                page, fragment if layout is not None else None, navbar_html)
+
+        logging.info("Worker: finished page '%s' -> %s", page, filename)
+        page_span.set(source="model", bytes=len(to_write))
+        PAGE_SECONDS.observe(time.perf_counter() - started, page=page, source="model")
+        return (idx, filename, to_write)
+
+async def iter_website_pages_async(enhanced_req: dict, client, workspace: str = "site",
+                                   resume: str = None) -> AsyncIterator[dict]:
+    """
+    Async twin of iter_website_pages: one coroutine per page on the caller's event loop,
+    same events, same artifact/persist/journal behaviour. Journal writes, persistence and
+    compression run on worker threads (asyncio.to_thread) so they never stall the loop.
+    """
+    artifact, reused, todo = await asyncio.to_thread(_open_site, enhanced_req, workspace, resume)
+    project_title, pages_list, features_list, notes, navbar_html = _site_plan(enhanced_req)
+    job = artifact.id
+    journal = get_journal()
+
+    logging.info("Generating %d pages as coroutines", len(todo))
+
+    results_by_idx = {}
+    for event in reused:
+        results_by_idx[event["index"]] = event["filename"]
+        yield event
+    layout = None
+    skeleton = GENERATION_MODE == "skeleton"
+    templates = for_site(enhanced_req, project_title, "fragment" if skeleton else "page", _template_version())
+    if skeleton:
+        layout = asyncio.ensure_future(_site_layout_async(project_title, features_list, notes, client, job))
+    tasks = {}
+    for idx in todo:
+        page = pages_list[idx]
+        await asyncio.to_thread(journal.mark, job, idx, RUNNING)
+        task = asyncio.ensure_future(_generate_page_task_async(
+            idx, page, project_title, features_list, notes, navbar_html, artifact, client, job, layout, templates,
+        ))
+        tasks[task] = (idx, page)
 
-    # Create shared css/js if missing
-    css_path = os.path.join(paths["css"], "style.css")
-    if not os.path.exists(css_path):
-        with open(css_path, "w", encoding="utf-8") as fh:
-            fh.write("/* Custom styles */\n")
-        saved_files.append(css_path)
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx, page = tasks[task]
+                try:
+                    idx_out, filename, html = task.result()
+                except Exception as e:
+                    logging.exception("A worker failed: %s", e)
+                    await asyncio.to_thread(journal.mark, job, idx, FAILED, error=str(e))
+                    yield {"type": "error", "index": idx, "page": page, "error": str(e)}
+                    continue
+                await asyncio.to_thread(journal.mark, job, idx_out, DONE, output=artifact.get(filename).etag)
+                results_by_idx[idx_out] = filename
+                yield {
+                    "type": "page",
+                    "index": idx_out,
+                    "page": page,
+                    "filename": filename,
+                    "html": html,
+                }
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending and layout is not None:
+            layout.cancel()
 
-    js_path = os.path.join(paths["js"], "script.js")
-    if not os.path.exists(js_path):
-        with open(js_path, "w", encoding="utf-8") as fh:
-            fh.write("// Custom JS\n")
-        saved_files.append(js_path)
+    yield await asyncio.to_thread(_finish_site, artifact, len(pages_list), results_by_idx,
+                                  await layout if layout is not None else None)
 
-    logging.info("Generated %d pages + assets in %s", len(saved_files), paths["html"])
-    return saved_files
+async def generate_website_parallel_async(enhanced_req: dict, client, workspace: str = "site") -> SiteArtifact:
+    """Async twin of generate_website_parallel."""
+    artifact = None
+    async for event in iter_website_pages_async(enhanced_req, client, workspace=workspace):
+        if event["type"] == "done":
+            artifact = event["artifact"]
+    return artifact
 
- 
\ No newline at end of file
+async def resume_website_async(generation: str, client) -> SiteArtifact:
+    """Async twin of resume_website."""
+    record = await asyncio.to_thread(_journal_record, generation)
+    artifact = None
+    async for event in iter_website_pages_async(record["request"], client, workspace=record["workspace"],
+                                                resume=generation):
+        if event["type"] == "done":
+            artifact = event["artifact"]
+    return artifact
@@ -0,0 +1,122 @@
+"""
+workspaces.py — Isolated, atomically published output directories for generated sites.
+
+Layout under GENERATED_SITE_ROOT (default "generated_site"):
+    <name>/                  published site for a job or project (what deploy() pushes)
+    .staging/<name>-<rand>/  in-progress generation; never read by anyone else
+    .trash/<name>-<rand>/    previous version of <name>, removed right after a republish
+
+Generation writes into a staging directory and publish() renames it into place, so
+concurrent generations never see (or wipe) each other's files. gc_workspaces() drops
+published sites past their retention and staging leftovers from crashed workers.
+"""
+
+import os
+import re
+import time
+import uuid
+import shutil
+import logging
+import threading
+from typing import List, Optional
+
+GENERATED_SITE_ROOT = os.environ.get("GENERATED_SITE_ROOT", "generated_site")
+WORKSPACE_RETENTION = int(os.environ.get("WORKSPACE_RETENTION", 7 * 24 * 3600))
+WORKSPACE_KEEP = int(os.environ.get("WORKSPACE_KEEP", 20))
+STAGING_MAX_AGE = int(os.environ.get("WORKSPACE_STAGING_MAX_AGE", 3600))
+
+STAGING_DIR = ".staging"
+TRASH_DIR = ".trash"
+
+# Serializes the swap step of publish() within this process; the rename itself is what
+# keeps separate processes from seeing half-written sites.
+_publish_lock = threading.Lock()
+
+
+def safe_name(name: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9_\-\.]+", "_", str(name).strip()).strip(".")
+    return name[:80] or "site"
+
+
+def workspace_path(name: str) -> str:
+    return os.path.join(GENERATED_SITE_ROOT, safe_name(name))
+
+
+def create_staging(name: str) -> str:
+    """Create and return a fresh, private staging directory for workspace `name`."""
+    staging = os.path.join(GENERATED_SITE_ROOT, STAGING_DIR, f"{safe_name(name)}-{uuid.uuid4().hex[:12]}")
+    os.makedirs(staging)
+    return staging
+
+
+def publish(staging: str, name: str) -> str:
+    """
+    Move a finished staging directory into place as workspace `name` and return its path.
+    A brand-new workspace is a single rename; replacing an existing one renames the old
+    copy aside first and deletes it afterwards.
+    """
+    target = workspace_path(name)
+    trash = None
+    with _publish_lock:
+        if os.path.exists(target):
+            trash = os.path.join(GENERATED_SITE_ROOT, TRASH_DIR, f"{safe_name(name)}-{uuid.uuid4().hex[:12]}")
+            os.makedirs(os.path.dirname(trash), exist_ok=True)
+            os.rename(target, trash)
+        os.rename(staging, target)
+    if trash:
+        shutil.rmtree(trash, ignore_errors=True)
+    return target
+
+
+def discard(staging: str) -> None:
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def list_workspaces() -> List[str]:
+    """Published workspace names, newest first."""
+    if not os.path.isdir(GENERATED_SITE_ROOT):
+        return []
+    entries = []
+    for name in os.listdir(GENERATED_SITE_ROOT):
+        path = os.path.join(GENERATED_SITE_ROOT, name)
+        if name.startswith(".") or not os.path.isdir(path):
+            continue
+        entries.append((os.path.getmtime(path), name))
+    return [name for _, name in sorted(entries, reverse=True)]
+
+
+def latest_workspace() -> Optional[str]:
+    names = list_workspaces()
+    return workspace_path(names[0]) if names else None
+
+
+def gc_workspaces(retention: int = WORKSPACE_RETENTION, keep: int = WORKSPACE_KEEP) -> List[str]:
+    """
+    Delete published workspaces older than `retention` seconds (always keeping the `keep`
+    newest) plus staging/trash directories abandoned for longer than STAGING_MAX_AGE.
+    Returns the removed paths.
+    """
+    now = time.time()
+    removed = []
+    for name in list_workspaces()[keep:]:
+        path = workspace_path(name)
+        try:
+            if now - os.path.getmtime(path) > retention:
+                shutil.rmtree(path)
+                removed.append(path)
+        except OSError as e:
+            logging.warning("Workspace GC could not remove %s: %s", path, e)
+
+    for sub in (STAGING_DIR, TRASH_DIR):
+        root = os.path.join(GENERATED_SITE_ROOT, sub)
+        if not os.path.isdir(root):
+            continue
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            try:
+                if now - os.path.getmtime(path) > STAGING_MAX_AGE:
+                    shutil.rmtree(path)
+                    removed.append(path)
+            except OSError as e:
+                logging.warning("Workspace GC could not remove %s: %s", path, e)
+    return removed
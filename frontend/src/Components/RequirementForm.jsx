@@ -42,7 +42,7 @@ const RequirementForm = () => {
 	
 	
 	try {
-      const res = await fetch("http://127.0.0.1:5000/submit", {
+      const res = await fetch("http://127.0.0.1:5000/submit?inline=0", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -36,6 +36,7 @@ export default function App() {
   const [allFilesTyped, setAllFilesTyped] = useState(false);
 
   const [deployUrl, setDeployUrl] = useState(null); // ✅ store deploy URL
+  const [siteName, setSiteName] = useState(null); // workspace returned by the backend
 
   const iframeRef = useRef(null);
   const editorRef = useRef(null);
@@ -101,6 +102,71 @@ export default function App() {
     }, intervalMs);
   };
 
+  // /submit/stream reports each page as soon as it is generated; its HTML is fetched from
+  // /sites/<site>/<file> right away and typed out in arrival order.
+  const typingQueueRef = useRef([]);
+  const isTypingRef = useRef(false);
+  const streamDoneRef = useRef(false);
+  const receivedCountRef = useRef(0);
+  const pageChainRef = useRef(Promise.resolve());
+
+  // url -> { etag, body }: files are revalidated with If-None-Match, unchanged ones cost a 304
+  const siteCacheRef = useRef(new Map());
+
+  const fetchSiteFile = async (url) => {
+    const cached = siteCacheRef.current.get(url);
+    const response = await fetch(`http://localhost:5000${url}`, {
+      headers: cached ? { "If-None-Match": cached.etag } : {},
+    });
+    if (response.status === 304 && cached) return cached.body;
+    if (!response.ok) throw new Error(`Fetching ${url} failed: ${response.status}`);
+    const body = await response.text();
+    const etag = response.headers.get("ETag");
+    if (etag) siteCacheRef.current.set(url, { etag, body });
+    return body;
+  };
+
+  // Fetches start in parallel; pages are queued for typing in the order they were reported.
+  const loadPage = (filename, url) => {
+    const body = fetchSiteFile(url);
+    pageChainRef.current = pageChainRef.current
+      .then(() => body)
+      .then((html) => {
+        setGeneratedFiles((prev) => ({ ...prev, [filename]: html }));
+        typingQueueRef.current.push({ filename, content: html });
+        typeNextFile();
+      })
+      .catch((err) => console.warn(`Could not load ${filename}:`, err));
+  };
+
+  const typeNextFile = () => {
+    if (isTypingRef.current) return;
+    const next = typingQueueRef.current.shift();
+    if (next) {
+      isTypingRef.current = true;
+      typeCode(next.filename, next.content, () => {
+        isTypingRef.current = false;
+        typeNextFile();
+      });
+    } else if (streamDoneRef.current) {
+      setIsGenerating(false);
+      setAllFilesTyped(true);
+    }
+  };
+
+  const handleStreamEvent = (event, data) => {
+    if (event === "page") {
+      receivedCountRef.current += 1;
+      loadPage(data.filename, data.url);
+    } else if (event === "done") {
+      setSiteName(data.site);
+    } else if (event === "page_error") {
+      console.warn(`Page "${data.page}" failed:`, data.error);
+    } else if (event === "error") {
+      throw new Error(data.error);
+    }
+  };
+
   const handleRequirement = async () => {
     try {
       if (!requirements.trim()) return;
@@ -113,8 +179,15 @@ export default function App() {
       setNavbarFiles([]);
       setCurrentFile(null);
       setDeployUrl(null); // ✅ clear old deploy link
+      setSiteName(null);
 
-      const response = await fetch("http://localhost:5000/submit", {
+      typingQueueRef.current = [];
+      isTypingRef.current = false;
+      streamDoneRef.current = false;
+      receivedCountRef.current = 0;
+      pageChainRef.current = Promise.resolve();
+
+      const response = await fetch("http://localhost:5000/submit/stream?inline=0", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ requirement: requirements }),
@@ -125,55 +198,53 @@ export default function App() {
         throw new Error(`Server error ${response.status}: ${text}`);
       }
 
-      const data = await response.json();
-      const files =
-        data && typeof data === "object" && data.files && typeof data.files === "object"
-          ? data.files
-          : {};
-
-      setRequirements(""); // clear only after response
-      setGeneratedFiles(files);
+      setRequirements(""); // clear once the server accepted the request
+
+      // Parse Server-Sent Events ("event: x\ndata: {...}\n\n") as they arrive
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+          const raw = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          let event = "message";
+          let data = "";
+          for (const line of raw.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          }
+          handleStreamEvent(event, data ? JSON.parse(data) : null);
+        }
+      }
 
-      const fileNames = Object.keys(files || {});
-      if (fileNames.length === 0) {
+      await pageChainRef.current;
+      streamDoneRef.current = true;
+      if (receivedCountRef.current === 0) {
         console.warn("No files received from backend.");
         setIsGenerating(false);
         return;
       }
-
-      const sortedFiles = fileNames.sort((a, b) => {
-        if (a === "index.html") return -1;
-        if (b === "index.html") return 1;
-        return a.localeCompare(b);
-      });
-
-      const firstFile = sortedFiles[0];
-      const firstContent = files[firstFile];
-      typeCode(firstFile, firstContent, () => handleFileComplete(1, sortedFiles, files));
+      typeNextFile();
     } catch (err) {
       console.error("Error in handleRequirement:", err);
+      streamDoneRef.current = true;
+      typingQueueRef.current = [];
       setIsGenerating(false);
     }
   };
 
-  const handleFileComplete = (nextIndex, sortedFiles, files) => {
-    if (nextIndex < sortedFiles.length) {
-      const nextFile = sortedFiles[nextIndex];
-      const nextContent = files[nextFile];
-      typeCode(nextFile, nextContent, () =>
-        handleFileComplete(nextIndex + 1, sortedFiles, files)
-      );
-    } else {
-      setIsGenerating(false);
-      setAllFilesTyped(true);
-    }
-  };
-
   const handleDeploy = async () => {
     try {
       const response = await fetch("http://localhost:5000/deploy", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ site: siteName }),
       });
 
       if (!response.ok) {
@@ -211,9 +282,19 @@ export default function App() {
           {navbarFiles.map((file) => (
             <button
               key={file}
-              onClick={() => {
+              onClick={async () => {
                 setCode(generatedFiles[file]);
                 setCurrentFile(file);
+                if (!siteName) return;
+                try {
+                  const html = await fetchSiteFile(`/sites/${siteName}/${file}`);
+                  if (html !== generatedFiles[file]) {
+                    setGeneratedFiles((prev) => ({ ...prev, [file]: html }));
+                    setCode(html);
+                  }
+                } catch (err) {
+                  console.warn(`Could not revalidate ${file}:`, err);
+                }
               }}
               className={currentFile === file ? "active" : ""}
             >